@@ -0,0 +1,258 @@
+# benchmarks/run_benchmarks.py
+"""端到端性能基准：合成语料 → 分阶段入库吞吐 → 检索延迟分位数，结果写为 JSON
+
+用法（在项目根目录）:
+  python -m benchmarks.run_benchmarks --papers 50 --images 200 --queries 200
+  python -m benchmarks.run_benchmarks --papers 500 --skip-images --output results/large.json
+
+数据库、清单、向量缓存都放在独立的工作目录中，不会影响 data/ 下的正式数据。
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import config
+from benchmarks import synthetic
+
+class StageTimer:
+    """累计各阶段耗时与处理条数"""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.stages.setdefault(name, {"seconds": 0.0, "items": 0})
+            entry["seconds"] += time.perf_counter() - start
+            entry["items"] += items
+
+    def add_items(self, name: str, items: int):
+        self.stages.setdefault(name, {"seconds": 0.0, "items": 0})["items"] += items
+
+    def report(self, unit: str) -> Dict[str, dict]:
+        result = {}
+        for name, entry in self.stages.items():
+            seconds = entry["seconds"]
+            result[name] = {
+                "seconds": round(seconds, 4),
+                "items": int(entry["items"]),
+                f"{unit}_per_second": round(entry["items"] / seconds, 2) if seconds > 0 else None
+            }
+        return result
+
+def latency_summary(latencies: List[float]) -> dict:
+    """延迟分位数（毫秒）"""
+    values = np.asarray(latencies) * 1000.0
+    return {
+        "count": int(len(values)),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3)
+    }
+
+def isolate_storage(workdir: Path, use_cache: bool):
+    """把数据库/清单/索引/缓存路径指向工作目录"""
+    config.DB_DIR = workdir / "chroma_db"
+    config.MANIFEST_PATH = workdir / "manifest.db"
+    config.FLAT_INDEX_DIR = workdir / "image_index"
+    config.EMBEDDING_CACHE_PATH = workdir / "embedding_cache.db"
+    # 默认关闭向量缓存，编码阶段测的是真实计算而不是缓存命中
+    config.EMBEDDING_CACHE_ENABLED = use_cache
+    config.DB_DIR.mkdir(parents=True, exist_ok=True)
+
+def bench_papers(pdf_paths: List[str], text_processor, vector_db) -> dict:
+    """论文入库分阶段计时：提取 → 切块 → 编码 → 写库"""
+    from modules.file_utils import FileUtils
+
+    timer = StageTimer()
+    total_chars = 0
+    for path in pdf_paths:
+        with timer.stage("extract", 1):
+            pages = list(FileUtils.iter_pdf_pages(path))
+        total_chars += sum(len(page) for page in pages)
+
+        with timer.stage("chunk"):
+            pieces = list(text_processor.iter_chunks(pages))
+        timer.add_items("chunk", len(pieces))
+        if not pieces:
+            continue
+
+        chunks = [chunk for chunk, _ in pieces]
+        metadatas = [metadata for _, metadata in pieces]
+        content_hash = FileUtils.compute_file_hash(path)
+        written = 0
+        for start in range(0, len(chunks), config.EMBED_BATCH_CHUNKS):
+            batch = chunks[start:start + config.EMBED_BATCH_CHUNKS]
+            with timer.stage("encode", len(batch)):
+                embeddings = text_processor.encode_texts(batch)
+            with timer.stage("db_write", len(batch)):
+                vector_db.add_paper_chunks(path, batch, embeddings, {"topic": "bench"},
+                                           content_hash, start_index=start,
+                                           chunk_metadatas=metadatas[start:start + len(batch)])
+            written += len(batch)
+        with timer.stage("db_write"):
+            vector_db.mark_paper_indexed(content_hash, path, written)
+
+    stages = timer.report("items")
+    stages["extract"]["chars"] = total_chars
+    return stages
+
+def bench_images(image_paths: List[str], image_processor, vector_db) -> dict:
+    """图片入库分阶段计时：解码 → 编码 → 写库"""
+    from modules.file_utils import FileUtils
+    from modules.ingest import image_metadata
+
+    timer = StageTimer()
+    with ThreadPoolExecutor(max_workers=config.IMAGE_DECODE_WORKERS) as pool:
+        for start in range(0, len(image_paths), config.BATCH_SIZE):
+            batch = image_paths[start:start + config.BATCH_SIZE]
+            with timer.stage("decode", len(batch)):
+                decoded = list(pool.map(image_processor.preprocess_image, batch))
+            ok = [(path, pixels) for path, (pixels, error) in zip(batch, decoded) if error is None]
+            if not ok:
+                continue
+            paths = [path for path, _ in ok]
+            with timer.stage("encode", len(ok)):
+                embeddings = image_processor.encode_pixel_batch(
+                    np.stack([pixels for _, pixels in ok]))
+            with timer.stage("db_write", len(ok)):
+                vector_db.add_images(paths, embeddings, [image_metadata(p) for p in paths],
+                                     [FileUtils.compute_file_hash(p) for p in paths])
+    return timer.report("items")
+
+def bench_search(queries: List[str], encode, search, warmup: int = 5) -> dict:
+    """检索延迟：分别统计查询编码、向量检索与两者合计"""
+    for query in queries[:warmup]:
+        search(encode(query))
+
+    encode_times, search_times, total_times = [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        embedding = encode(query)
+        encoded = time.perf_counter()
+        search(embedding)
+        done = time.perf_counter()
+        encode_times.append(encoded - start)
+        search_times.append(done - encoded)
+        total_times.append(done - start)
+    return {
+        "encode": latency_summary(encode_times),
+        "search": latency_summary(search_times),
+        "end_to_end": latency_summary(total_times)
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end ingestion and search benchmark")
+    parser.add_argument("--papers", type=int, default=20, help="Number of synthetic PDFs")
+    parser.add_argument("--pages", type=int, default=8, help="Pages per synthetic PDF")
+    parser.add_argument("--images", type=int, default=100, help="Number of synthetic images")
+    parser.add_argument("--image-size", type=int, default=640, help="Synthetic image edge length")
+    parser.add_argument("--queries", type=int, default=100, help="Search queries per search type")
+    parser.add_argument("-k", type=int, default=config.SEARCH_TOP_K, help="Top-k for searches")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the corpus")
+    parser.add_argument("--skip-papers", action="store_true", help="Skip paper ingestion/search")
+    parser.add_argument("--skip-images", action="store_true", help="Skip image ingestion/search")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the embedding cache enabled")
+    parser.add_argument("--workdir", help="Working directory (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/<time>.json)")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="assistant-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    isolate_storage(workdir, args.with_cache)
+
+    from modules.vector_db import VectorDB
+
+    result = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "inference_backend": config.INFERENCE_BACKEND,
+            "image_index_backend": config.IMAGE_INDEX_BACKEND,
+            "flat_index_dtype": config.FLAT_INDEX_DTYPE,
+            "paper_search_mode": config.PAPER_SEARCH_MODE,
+            "embedding_cache": args.with_cache
+        },
+        "parameters": vars(args),
+        "ingest": {},
+        "search": {}
+    }
+
+    try:
+        vector_db = VectorDB()
+
+        if not args.skip_papers and args.papers > 0:
+            from modules.text_processor import TextProcessor
+            print(f"📄 生成 {args.papers} 篇合成论文（每篇 {args.pages} 页）...")
+            pdf_paths = synthetic.generate_pdfs(workdir / "papers", args.papers, args.pages, args.seed)
+            text_processor = TextProcessor()
+            print("⏱️  论文入库...")
+            result["ingest"]["papers"] = bench_papers(pdf_paths, text_processor, vector_db)
+            print("⏱️  论文检索...")
+            result["search"]["search_text"] = bench_search(
+                synthetic.generate_queries(args.queries, args.seed),
+                text_processor.encode_text,
+                lambda embedding: vector_db.search_text(embedding, k=args.k))
+
+        if not args.skip_images and args.images > 0:
+            from modules.image_processor import ImageProcessor
+            print(f"🖼️  生成 {args.images} 张合成图片...")
+            image_paths = synthetic.generate_images(workdir / "images", args.images,
+                                                    args.image_size, args.seed)
+            image_processor = ImageProcessor()
+            print("⏱️  图片入库...")
+            result["ingest"]["images"] = bench_images(image_paths, image_processor, vector_db)
+            print("⏱️  图片检索...")
+            result["search"]["search_images"] = bench_search(
+                synthetic.generate_image_queries(args.queries, args.seed),
+                image_processor.encode_text_for_image_search,
+                lambda embedding: vector_db.search_images(embedding, k=args.k))
+
+        result["corpus"] = vector_db.get_collection_stats()
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = Path(args.output) if args.output else (
+        ROOT / "benchmarks" / "results" / f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, ensure_ascii=False, indent=2, default=str))
+    print(f"✅ 结果已写入: {output}")
+    print(json.dumps({"ingest": result["ingest"], "search": result["search"]},
+                     ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# benchmarks/synthetic.py
+"""生成合成测试语料：PDF 论文（PyMuPDF）、图片（Pillow）与查询
+
+所有内容由随机种子决定，同样的参数每次生成完全相同的语料，便于跨版本对比。
+"""
+import random
+from pathlib import Path
+from typing import List
+
+# 按主题划分的词表，让生成的论文带有可区分的主题
+TOPIC_WORDS = {
+    "CV": ["image", "convolution", "segmentation", "detection", "pixel", "vision",
+           "feature", "backbone", "augmentation", "resolution", "camera", "object"],
+    "NLP": ["language", "token", "transformer", "translation", "sentence", "corpus",
+            "embedding", "attention", "syntax", "dialogue", "summarization", "text"],
+    "RL": ["policy", "reward", "agent", "environment", "value", "exploration",
+           "trajectory", "q-learning", "actor", "critic", "episode", "return"],
+    "ML": ["gradient", "optimization", "regularization", "kernel", "bayesian",
+           "generalization", "loss", "dataset", "variance", "bias", "sampling", "model"],
+    "Robotics": ["robot", "manipulation", "grasp", "kinematics", "sensor", "control",
+                 "locomotion", "planning", "actuator", "navigation", "slam", "joint"],
+}
+COMMON_WORDS = ["the", "of", "and", "we", "propose", "method", "results", "show",
+                "that", "our", "approach", "in", "with", "for", "a", "is", "on",
+                "experiments", "performance", "baseline", "improves", "significantly"]
+
+def _sentence(rng: random.Random, topic: str, length: int) -> str:
+    words = [rng.choice(TOPIC_WORDS[topic]) if rng.random() < 0.35 else rng.choice(COMMON_WORDS)
+             for _ in range(length)]
+    return " ".join(words).capitalize() + "."
+
+def _paragraph(rng: random.Random, topic: str, sentences: int) -> str:
+    return " ".join(_sentence(rng, topic, rng.randint(8, 20)) for _ in range(sentences))
+
+def generate_pdfs(folder: str, count: int, pages: int = 8, seed: int = 0) -> List[str]:
+    """生成 count 篇每篇 pages 页的合成论文，返回文件路径"""
+    import fitz
+
+    rng = random.Random(seed)
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    topics = list(TOPIC_WORDS)
+    paths = []
+    for i in range(count):
+        topic = topics[i % len(topics)]
+        path = folder / f"paper_{i:05d}_{topic}.pdf"
+        doc = fitz.open()
+        for page_no in range(pages):
+            page = doc.new_page()
+            if page_no == 0:
+                title = f"A Study of {rng.choice(TOPIC_WORDS[topic]).title()} " \
+                        f"{rng.choice(TOPIC_WORDS[topic]).title()} ({i})"
+                page.insert_text((72, 72), title, fontsize=16)
+            # 一页约 3000 字符，与常见论文的文字密度接近
+            page.insert_textbox(fitz.Rect(72, 100, 540, 770),
+                                _paragraph(rng, topic, 24), fontsize=9)
+        doc.save(str(path))
+        doc.close()
+        paths.append(str(path))
+    return paths
+
+def generate_images(folder: str, count: int, size: int = 640, seed: int = 0) -> List[str]:
+    """生成 count 张随机几何图形图片（JPEG 与 PNG 各半），返回文件路径"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        background = tuple(rng.randint(0, 255) for _ in range(3))
+        image = Image.new("RGB", (size, size), background)
+        draw = ImageDraw.Draw(image)
+        for _ in range(rng.randint(3, 12)):
+            x0, x1 = sorted(rng.randint(0, size) for _ in range(2))
+            y0, y1 = sorted(rng.randint(0, size) for _ in range(2))
+            shape = [x0, y0, x1, y1]
+            color = tuple(rng.randint(0, 255) for _ in range(3))
+            if rng.random() < 0.5:
+                draw.ellipse(shape, fill=color)
+            else:
+                draw.rectangle(shape, fill=color)
+        suffix = ".jpg" if i % 2 == 0 else ".png"
+        path = folder / f"image_{i:05d}{suffix}"
+        image.save(str(path))
+        paths.append(str(path))
+    return paths
+
+def generate_queries(count: int, seed: int = 0) -> List[str]:
+    """生成 count 条论文检索查询（同一主题的词组合）"""
+    rng = random.Random(seed)
+    topics = list(TOPIC_WORDS)
+    return [" ".join(rng.sample(TOPIC_WORDS[topics[i % len(topics)]], 3)) for i in range(count)]
+
+COLORS = ["red", "blue", "green", "yellow", "purple", "orange", "black", "white"]
+SHAPES = ["circle", "rectangle", "ellipse", "square", "shapes", "pattern"]
+
+def generate_image_queries(count: int, seed: int = 0) -> List[str]:
+    """生成 count 条以文搜图查询（颜色 + 形状）"""
+    rng = random.Random(seed)
+    return [f"a {rng.choice(COLORS)} {rng.choice(SHAPES)}" for _ in range(count)]
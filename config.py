@@ -15,6 +15,11 @@ PAPERS_DIR = DATA_DIR / "papers"
 IMAGES_DIR = DATA_DIR / "images"
 DB_DIR = DATA_DIR / "chroma_db"
 
+# 已入库内容清单（按内容哈希去重）
+MANIFEST_PATH = DATA_DIR / "manifest.db"
+# 批量入库任务日志（add_images / organize 中断后可用 resume 继续）
+JOB_JOURNAL_PATH = DATA_DIR / "jobs.db"
+
 # 创建目录
 for dir_path in [DATA_DIR, PAPERS_DIR, IMAGES_DIR, DB_DIR]:
     dir_path.mkdir(parents=True, exist_ok=True)
@@ -31,15 +36,102 @@ for topic in TOPICS:
     topic_dir = PAPERS_DIR / topic
     topic_dir.mkdir(exist_ok=True)
 
+# 推理后端: "torch"（PyTorch）或 "onnx"（ONNX Runtime，CPU）
+# 首次使用 onnx 时自动导出到 ONNX_DIR，并与 PyTorch 输出做一致性校验，不通过则退回 PyTorch
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+ONNX_DIR = DATA_DIR / "onnx"
+# 导出后是否做动态 int8 量化（权重 int8，体积约为 1/4）
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "1") == "1"
+# 单个推理会话的线程数（0 表示由 ONNX Runtime 决定）
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+ONNX_OPSET = 17
+# 一致性校验：ONNX 与 PyTorch 输出的最小余弦相似度
+ONNX_PARITY_MIN_COSINE = 0.98
+
 # 模型参数
 EMBEDDING_DIM = 384
 IMAGE_EMBEDDING_DIM = 512
 BATCH_SIZE = 32
+# 向量库单次写入的最大条数
+DB_WRITE_BATCH_SIZE = 512
+# 图片解码/预处理线程数
+IMAGE_DECODE_WORKERS = min(8, os.cpu_count() or 1)
 CHUNK_SIZE = 1000
+# 切块策略: "tokens" 按嵌入模型的词元数切块（填满模型序列上限）；"chars" 按 CHUNK_SIZE 字符切块
+CHUNK_STRATEGY = "tokens"
+# 每个chunk的最大词元数，None 表示使用模型上限（all-MiniLM-L6-v2 为 256 - 2）
+CHUNK_MAX_TOKENS = None
+# 相邻chunk之间重叠的词元数
+CHUNK_OVERLAP_TOKENS = 32
+# 流式入库时每批编码/写入的chunk数（决定论文入库的峰值内存）
+EMBED_BATCH_CHUNKS = 256
+# 分类时使用的文档开头字符数
+CLASSIFY_MAX_CHARS = 2000
+# organize 命令的并行进程数（1 表示串行）
+ORGANIZE_WORKERS = os.cpu_count() or 1
+
+# 图片索引后端: "chroma" 或 "flat"（NumPy 平面索引，内存映射文件，精确检索）
+IMAGE_INDEX_BACKEND = os.getenv("IMAGE_INDEX_BACKEND", "chroma")
+FLAT_INDEX_DIR = DATA_DIR / "image_index"
+# 平面索引的存储精度: "float32"、"float16" 或 "int8"（逐向量缩放）；修改后已有索引会自动转换
+FLAT_INDEX_DTYPE = os.getenv("FLAT_INDEX_DTYPE", "float32")
+
+# 向量缓存（内存 LRU + 磁盘），按 模型名+规范化文本 寻址
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_PATH = DATA_DIR / "embedding_cache.db"
+EMBEDDING_CACHE_MEMORY_ITEMS = 10000
+EMBEDDING_CACHE_DISK_ITEMS = 200000
 
 # 搜索参数
 SEARCH_TOP_K = 5
 SIMILARITY_THRESHOLD = 0.5
+# 论文级检索：论文得分聚合方式 "max" / "mean" / "topm"
+PAPER_SCORE_AGGREGATE = "max"
+PAPER_TOP_M = 3
+# 论文级检索最多考察的chunk数
+PAPER_MAX_CANDIDATES = 1000
+# 论文检索模式："hierarchical" 先用论文中心向量粗筛、再只对入选论文的chunk精排；"flat" 扫描全部chunk
+PAPER_SEARCH_MODE = "hierarchical"
+# 粗筛保留的论文数 = k * PAPER_SHORTLIST_FACTOR
+PAPER_SHORTLIST_FACTOR = 4
+# 批量查询（--queries-file）每次编码/检索的查询条数
+QUERY_BATCH_SIZE = 256
+# Web 应用的查询合并：并发到达的查询最多等待 QUERY_BATCH_WAIT_MS 毫秒、凑满
+# QUERY_BATCH_MAX_SIZE 条后做一次批量前向计算
+QUERY_MICRO_BATCHING = os.getenv("QUERY_MICRO_BATCHING", "1") == "1"
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "3"))
+QUERY_BATCH_MAX_SIZE = 32
+
+
+# Web 界面启动时是否开启分阶段计时（结果显示在“系统状态”页，可在页面上关闭）
+WEB_PROFILING_ENABLED = os.getenv("WEB_PROFILING_ENABLED", "1") == "1"
+
+# Prometheus 指标（Web 应用启动时在独立端口提供 /metrics，默认只监听本机）
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+# Web 上传的后台入库队列
+INGEST_UPLOAD_DIR = DATA_DIR / "uploads"
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+# 上传文件按块流式复制的块大小（字节）
+INGEST_COPY_CHUNK_BYTES = 1024 * 1024
+# 有检索请求时，后台任务在批次之间最多暂停的秒数
+INGEST_YIELD_MAX_S = 5.0
+# 后台工作线程的 nice 值（仅 Linux 按线程生效，0 表示不调整）
+INGEST_NICE = int(os.getenv("INGEST_NICE", "10"))
+# 保留的任务记录条数与页面刷新间隔（秒）
+INGEST_JOB_HISTORY = 50
+INGEST_POLL_SECONDS = 2.0
+
+
+# 常驻守护进程（python main.py serve），CLI 命令会自动转发给它
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = int(os.getenv("ASSISTANT_DAEMON_PORT", "8765"))
+DAEMON_TOKEN_PATH = DATA_DIR / "daemon.json"
+DAEMON_CONNECT_TIMEOUT = 0.2
+# 转发命令时两次输出之间的最长等待（秒）；开始执行前超时则改为本地执行
+DAEMON_READ_TIMEOUT = float(os.getenv("ASSISTANT_DAEMON_READ_TIMEOUT", "300"))
 
 
 # 删除所有 ChromaDB 相关配置！
@@ -6,17 +6,107 @@ Local Multimodal AI Assistant - 完整修复版
 """
 
 import argparse
+import json
+import os
 import sys
+import time
+from functools import cached_property
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Dict, List, Optional
 
-from modules.text_processor import TextProcessor
-from modules.image_processor import ImageProcessor
-from modules.vector_db import VectorDB
-from modules.classifier import Classifier
+# 只导入轻量模块；模型相关模块（torch/transformers/chromadb）在用到时才导入
 from modules.file_utils import FileUtils
+from modules.ingest import ingest_images, ingest_paper
+from modules.job_journal import JobJournal
+from modules.folder_sync import SYNC_EXTENSIONS, sync_folder
+from modules.manifest import IngestManifest
+from modules import profiling
 import config
 
+if TYPE_CHECKING:
+    from modules.text_processor import TextProcessor
+    from modules.image_processor import ImageProcessor
+    from modules.vector_db import VectorDB
+    from modules.classifier import Classifier
+
+class Components:
+    """按需构建的组件容器：每个命令只加载自己用到的模型"""
+    
+    @cached_property
+    def text_processor(self) -> "TextProcessor":
+        from modules.text_processor import TextProcessor
+        return TextProcessor()
+    
+    @cached_property
+    def image_processor(self) -> "ImageProcessor":
+        from modules.image_processor import ImageProcessor
+        return ImageProcessor()
+    
+    @cached_property
+    def vector_db(self) -> "VectorDB":
+        from modules.vector_db import VectorDB
+        return VectorDB()
+    
+    @cached_property
+    def classifier(self) -> "Classifier":
+        from modules.classifier import Classifier
+        return Classifier()
+    
+    @property
+    def components(self) -> "Components":
+        """容器本身：供运行时才知道需要哪些组件的命令（如 sync）按需加载"""
+        return self
+
+def add_batch_query_arguments(parser: argparse.ArgumentParser):
+    """为搜索命令添加批量查询参数"""
+    parser.add_argument("--queries-file",
+                        help="Run every query in this file (one per line, plain text or "
+                             "JSON with a \"query\" field) and write JSON lines")
+    parser.add_argument("--output", default="-",
+                        help="Where to write JSON-lines results for --queries-file (default: stdout)")
+
+def read_queries(path: str) -> List[dict]:
+    """读取批量查询文件：每行一个查询，纯文本或带 "query" 字段的 JSON"""
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = None
+            if line.startswith("{"):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+            if not isinstance(record, dict) or not record.get("query"):
+                record = {"query": line}
+            record.setdefault("id", line_no)
+            queries.append(record)
+    return queries
+
+def run_batch_queries(args, encode_batch, search_batch, format_hit):
+    """分批编码并检索查询文件中的全部查询，逐行输出 JSON 结果
+    
+    encode_batch(查询文本列表) → 向量矩阵；search_batch(向量矩阵) → 每条查询的命中列表；
+    format_hit(命中) → 可序列化的 dict。
+    """
+    queries = read_queries(args.queries_file)
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        for start in range(0, len(queries), config.QUERY_BATCH_SIZE):
+            batch = queries[start:start + config.QUERY_BATCH_SIZE]
+            embeddings = encode_batch([record["query"] for record in batch])
+            for record, hits in zip(batch, search_batch(embeddings)):
+                line = dict(record, results=[format_hit(hit) for hit in hits])
+                out.write(json.dumps(line, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if out is not sys.stdout:
+        print(f"✅ 已完成 {len(queries)} 条查询，结果写入: {args.output}")
+
 def setup_argparse() -> argparse.ArgumentParser:
     """设置命令行参数解析"""
     parser = argparse.ArgumentParser(
@@ -30,11 +120,25 @@ Examples:
   python main.py search_image "sunset by the sea"
   python main.py organize "path/to/papers_folder"
   python main.py list_papers
+  python main.py similar_papers "path/to/paper.pdf"
+  python main.py search_paper --queries-file queries.txt --output results.jsonl
   python main.py list_images
   python main.py add_image "path/to/image.jpg"
   python main.py add_images "path/to/images_folder"
+  python main.py sync "path/to/folder"   # 只处理新增、修改和删除的文件
+  python main.py resume             # 继续上次中断的 add_images / organize
+  python main.py jobs
+  python main.py --profile add_paper "path/to/paper.pdf"
+  python main.py serve              # 常驻后台，后续命令自动转发
+  python main.py serve --stop
         """
     )
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="Run in this process even if a daemon is running")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print a per-stage timing breakdown after the command")
+    parser.add_argument("--profile-out", metavar="FILE",
+                        help="Also write a cProfile/pstats dump to FILE (implies --profile)")
     
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
     
@@ -45,18 +149,35 @@ Examples:
     
     # 搜索论文命令
     search_paper = subparsers.add_parser("search_paper", help="Search papers semantically")
-    search_paper.add_argument("query", help="Search query")
+    search_paper.add_argument("query", nargs="?", help="Search query")
     search_paper.add_argument("-k", type=int, default=5, help="Number of results")
+    search_paper.add_argument("--aggregate", choices=["max", "mean", "topm"],
+                              default=config.PAPER_SCORE_AGGREGATE,
+                              help="How chunk scores are combined into a paper score")
+    search_paper.add_argument("--max-candidates", type=int, default=config.PAPER_MAX_CANDIDATES,
+                              help="Maximum number of chunks examined")
+    search_paper.add_argument("--mode", choices=["hierarchical", "flat"],
+                              default=config.PAPER_SEARCH_MODE,
+                              help="Shortlist papers by centroid first, or scan all chunks")
+    add_batch_query_arguments(search_paper)
+    
+    # 相似论文
+    similar_papers = subparsers.add_parser("similar_papers", help="List papers similar to a paper")
+    similar_papers.add_argument("path", help="Path of an indexed PDF")
+    similar_papers.add_argument("-k", type=int, default=5, help="Number of results")
     
     # 搜索图片命令
     search_image = subparsers.add_parser("search_image", help="Search images by text")
-    search_image.add_argument("query", help="Image search query")
+    search_image.add_argument("query", nargs="?", help="Image search query")
     search_image.add_argument("-k", type=int, default=5, help="Number of results")
+    add_batch_query_arguments(search_image)
     
     # 整理文件夹命令
     organize = subparsers.add_parser("organize", help="Organize all papers in folder")
     organize.add_argument("folder", help="Folder to organize")
     organize.add_argument("--topics", help="Comma-separated topics")
+    organize.add_argument("--workers", type=int, default=config.ORGANIZE_WORKERS,
+                          help="Number of worker processes for extraction/classification")
     
     # 添加图片命令
     add_image = subparsers.add_parser("add_image", help="Add an image to database")
@@ -66,6 +187,27 @@ Examples:
     add_images = subparsers.add_parser("add_images", help="Add all images in folder")
     add_images.add_argument("folder", help="Folder containing images")
     
+    # 增量同步文件夹
+    sync = subparsers.add_parser("sync", help="Incrementally sync a folder (new/changed/deleted files)")
+    sync.add_argument("folder", help="Folder to keep in sync (papers are indexed in place)")
+    sync.add_argument("--kind", choices=["all", "papers", "images"], default="all",
+                      help="Which files to sync")
+    sync.add_argument("--topics", help="Comma-separated topics for classifying new papers")
+    sync.add_argument("--dry-run", action="store_true", help="Only show what would change")
+    
+    # 继续中断的批量任务
+    resume = subparsers.add_parser("resume", help="Resume an interrupted add_images/organize job")
+    resume.add_argument("job_id", nargs="?", type=int,
+                        help="Job id (default: the most recent unfinished job)")
+    resume.add_argument("--retry-failed", action="store_true",
+                        help="Also retry files that failed last time")
+    resume.add_argument("--force", action="store_true",
+                        help="Resume even if the job's recorded process still appears to be running")
+    
+    # 批量任务列表
+    jobs = subparsers.add_parser("jobs", help="List bulk ingestion jobs and their progress")
+    jobs.add_argument("-n", type=int, default=10, help="Number of jobs to show")
+    
     # 列出所有论文
     list_papers = subparsers.add_parser("list_papers", help="List all indexed papers")
     
@@ -76,10 +218,31 @@ Examples:
     clear_db = subparsers.add_parser("clear_db", help="Clear vector database")
     clear_db.add_argument("--confirm", action="store_true", help="Confirm deletion")
     
+    # 量化存储精度报告
+    quant_report = subparsers.add_parser("quant_report",
+                                         help="Compare float16/int8 storage against float32 top-k")
+    quant_report.add_argument("--kind", choices=["papers", "images"], default="papers",
+                              help="Which embeddings to evaluate")
+    quant_report.add_argument("-k", type=int, default=10, help="Top-k used for overlap")
+    quant_report.add_argument("--queries", type=int, default=200,
+                              help="Number of stored vectors sampled as queries")
+    
+    # ONNX 后端一致性校验结果
+    onnx_check = subparsers.add_parser("onnx_check",
+                                       help="Show ONNX vs PyTorch parity of exported models")
+    
+    # 重建论文中心向量
+    rebuild_centroids = subparsers.add_parser("rebuild_centroids",
+                                              help="Recompute per-paper centroid vectors")
+    
+    # 常驻守护进程
+    serve = subparsers.add_parser("serve", help="Keep models warm and serve CLI commands")
+    serve.add_argument("--stop", action="store_true", help="Stop the running daemon")
+    
     return parser
 
-def handle_add_paper(args, text_processor: TextProcessor, 
-                     vector_db: VectorDB, classifier: Classifier):
+def handle_add_paper(args, text_processor: "TextProcessor", 
+                     vector_db: "VectorDB", classifier: "Classifier"):
     """处理添加论文命令"""
     pdf_path = Path(args.path)
     if not pdf_path.exists():
@@ -88,44 +251,48 @@ def handle_add_paper(args, text_processor: TextProcessor,
     
     print(f"📄 处理论文: {pdf_path.name}")
     
-    # 提取文本和生成向量
-    chunks, embeddings = text_processor.process_pdf(str(pdf_path))
+    # PDF 只解析一次，切块编码与分类共享解析结果
+    topics = args.topics.split(",") if args.topics else None
+    result = ingest_paper(str(pdf_path), text_processor, vector_db, classifier, topics)
     
-    if not chunks:
+    if result["status"] == "skipped":
+        print("⏭️  该论文内容已入库，跳过")
+        return
+    if result["status"] == "empty":
         print("❌ 错误：无法从PDF提取文本")
         return
     
-    # 分类
-    topics = args.topics.split(",") if args.topics else None
-    topic = classifier.classify_pdf(str(pdf_path), topics)
+    topic = result["topic"]
     print(f"🏷️  分类为: {topic}")
-    
-    # 整理文件
-    target_path = FileUtils.organize_file(str(pdf_path), topic)
-    
-    # 添加到数据库
-    metadata = {
-        "title": pdf_path.stem,
-        "topic": topic,
-        "original_path": str(pdf_path),
-        "organized_path": target_path
-    }
-    
-    success = vector_db.add_paper(target_path, chunks, embeddings, metadata)
-    if success:
+    if result["status"] == "added":
         print(f"✅ 论文添加成功，分类: {topic}")
     else:
         print("❌ 添加到数据库失败")
 
-def handle_search_paper(args, text_processor: TextProcessor, vector_db: VectorDB):
+def handle_search_paper(args, text_processor: "TextProcessor", vector_db: "VectorDB"):
     """处理搜索论文命令"""
+    if args.queries_file:
+        run_batch_queries(
+            args, text_processor.encode_texts,
+            lambda embeddings: vector_db.search_papers_batch(
+                embeddings, k=args.k, aggregate=args.aggregate,
+                max_candidates=args.max_candidates, mode=args.mode),
+            lambda hit: {"score": round(hit[0], 4), "source": hit[2].get('source'),
+                         "topic": hit[2].get('topic'), "preview": hit[1][:150]}
+        )
+        return
+    if not args.query:
+        print("❌ 错误：请提供查询文本或 --queries-file")
+        return
+    
     print(f"🔍 搜索: '{args.query}'")
     
     # 编码查询文本
     query_embedding = text_processor.encode_text(args.query)
     
     # 在数据库中搜索
-    results = vector_db.search_text(query_embedding, k=args.k)
+    results = vector_db.search_papers(query_embedding, k=args.k, aggregate=args.aggregate,
+                                      max_candidates=args.max_candidates, mode=args.mode)
     
     if not results:
         print("没有找到结果")
@@ -139,8 +306,33 @@ def handle_search_paper(args, text_processor: TextProcessor, vector_db: VectorDB
         print(f"   来源: {source}")
         print(f"   预览: {document[:150]}...\n")
 
-def handle_search_image(args, image_processor: ImageProcessor, vector_db: VectorDB):
+def handle_similar_papers(args, vector_db: "VectorDB"):
+    """处理相似论文命令"""
+    results = vector_db.find_similar_papers(args.path, k=args.k)
+    if not results:
+        print("没有找到相似论文（论文未入库时可先运行 rebuild_centroids）")
+        return
+    
+    print(f"\n与 {Path(args.path).name} 相似的论文:\n")
+    for i, (score, metadata) in enumerate(results, 1):
+        source = metadata.get('source', 'Unknown')
+        topic = metadata.get('topic', 'Unknown')
+        print(f"{i}. [{topic}] {Path(source).name} (相似度: {score:.3f})")
+        print(f"   来源: {source}")
+
+def handle_search_image(args, image_processor: "ImageProcessor", vector_db: "VectorDB"):
     """处理搜索图片命令"""
+    if args.queries_file:
+        run_batch_queries(
+            args, image_processor.encode_texts_for_image_search,
+            lambda embeddings: vector_db.search_images_batch(embeddings, k=args.k),
+            lambda hit: {"score": round(hit[0], 4), "path": hit[1]}
+        )
+        return
+    if not args.query:
+        print("❌ 错误：请提供查询文本或 --queries-file")
+        return
+    
     print(f"🔍 搜索图片: '{args.query}'")
     
     # 编码查询文本
@@ -165,7 +357,7 @@ def handle_search_image(args, image_processor: ImageProcessor, vector_db: Vector
             print(f"   格式: {metadata['format']}")
         print()
 
-def handle_add_image(args, image_processor: ImageProcessor, vector_db: VectorDB):
+def handle_add_image(args, image_processor: "ImageProcessor", vector_db: "VectorDB"):
     """处理添加单张图片命令"""
     image_path = Path(args.path)
     if not image_path.exists():
@@ -175,6 +367,11 @@ def handle_add_image(args, image_processor: ImageProcessor, vector_db: VectorDB)
     print(f"📸 添加图片: {image_path.name}")
     
     try:
+        content_hash = FileUtils.compute_file_hash(str(image_path))
+        if vector_db.is_image_indexed(content_hash):
+            print("⏭️  该图片内容已入库，跳过")
+            return
+        
         # 编码图片
         embedding = image_processor.encode_image(str(image_path))
         print(f"   编码完成，向量维度: {embedding.shape}")
@@ -187,7 +384,8 @@ def handle_add_image(args, image_processor: ImageProcessor, vector_db: VectorDB)
             "format": image_path.suffix[1:].upper()
         }
         
-        success = vector_db.add_image(str(image_path), embedding, metadata)
+        success = vector_db.add_image(str(image_path), embedding, metadata,
+                                      content_hash=content_hash)
         if success:
             print(f"✅ 图片添加成功: {image_path.name}")
         else:
@@ -198,7 +396,7 @@ def handle_add_image(args, image_processor: ImageProcessor, vector_db: VectorDB)
         import traceback
         traceback.print_exc()
 
-def handle_add_images(args, image_processor: ImageProcessor, vector_db: VectorDB):
+def handle_add_images(args, image_processor: "ImageProcessor", vector_db: "VectorDB"):
     """处理批量添加图片命令"""
     folder_path = Path(args.folder)
     if not folder_path.exists():
@@ -214,33 +412,55 @@ def handle_add_images(args, image_processor: ImageProcessor, vector_db: VectorDB
     
     print(f"找到 {len(image_files)} 张图片，正在添加...\n")
     
-    added_count = 0
-    for img_file in image_files:
-        try:
-            img_path = Path(img_file)
-            print(f"处理: {img_path.name}", end=" ")
-            
-            embedding = image_processor.encode_image(str(img_path))
-            
-            metadata = {
-                "filename": img_path.name,
-                "path": str(img_path),
-                "size": f"{img_path.stat().st_size} bytes",
-                "format": img_path.suffix[1:].upper()
-            }
-            
-            if vector_db.add_image(str(img_path), embedding, metadata):
-                added_count += 1
-                print("✅")
-            else:
-                print("❌")
-                
-        except Exception as e:
-            print(f"❌ 错误: {e}")
-    
-    print(f"\n📊 完成: 成功添加 {added_count}/{len(image_files)} 张图片")
+    # 登记任务日志，中断后可用 resume 继续
+    journal = JobJournal()
+    job_id = journal.create_job("add_images", str(folder_path), image_files)
+    run_image_job(journal, job_id, image_files, image_processor, vector_db)
+
+def run_image_job(journal: JobJournal, job_id: int, image_files: List[str],
+                  image_processor: "ImageProcessor", vector_db: "VectorDB"):
+    """执行（或继续）图片入库任务，每批处理完后提交一次文件状态
+
+    只有写入向量库的图片才标记为 written；已编码但尚未写库的图片保持 pending，
+    中断后重新编码。
+    """
+    icons = {"added": "✅", "skipped": "⏭️", "failed": "❌"}
+    updates = []
+    
+    def on_result(path, status, message):
+        line = f"处理: {Path(path).name} {icons[status]}"
+        if status == "failed":
+            line += f" 错误: {message}"
+        print(line)
+        updates.append((path, "failed" if status == "failed" else "written", message))
+    
+    def commit():
+        journal.mark_many(job_id, updates)
+        updates.clear()
+    
+    # 分批解码+编码，已入库内容按哈希跳过
+    try:
+        summary = ingest_images(image_files, image_processor, vector_db, on_result=on_result,
+                                on_progress=lambda processed: commit())
+    except KeyboardInterrupt:
+        commit()
+        journal.set_job_status(job_id, "interrupted")
+        print(f"\n⏸️  已中断，进度保存在任务 #{job_id}，运行 python main.py resume {job_id} 继续")
+        return
+    except Exception:
+        # 进程（例如守护进程）仍在运行，任务不能停留在 running，否则无法 resume
+        commit()
+        journal.set_job_status(job_id, "interrupted")
+        raise
+    commit()
+    journal.set_job_status(job_id, "done")
+    
+    print(f"\n📊 完成: 成功添加 {summary['added']}/{summary['total']} 张图片"
+          f"，跳过已入库 {summary['skipped']} 张")
+    if summary["failed"]:
+        print(f"❌ 失败 {summary['failed']} 张，可运行 python main.py resume {job_id} --retry-failed 重试")
 
-def handle_organize(args, classifier: Classifier):
+def handle_organize(args, classifier: "Classifier"):
     """处理整理文件夹命令"""
     folder_path = Path(args.folder)
     if not folder_path.exists():
@@ -257,20 +477,165 @@ def handle_organize(args, classifier: Classifier):
     print(f"找到 {len(pdf_files)} 个PDF文件，正在整理...\n")
     
     topics = args.topics.split(",") if args.topics else None
-    
-    for pdf_file in pdf_files:
+    journal = JobJournal()
+    job_id = journal.create_job("organize", str(folder_path), pdf_files,
+                                {"topics": topics, "workers": args.workers})
+    run_organize_job(journal, job_id, pdf_files, {}, topics, args.workers, classifier)
+
+def run_organize_job(journal: JobJournal, job_id: int, pdf_files: List[str],
+                     classified: Dict[str, str], topics, workers: int, classifier: "Classifier"):
+    """执行（或继续）整理任务
+
+    classified 为上次已分类但未移动的文件 {路径: 主题}，直接移动、不再分类。
+    """
+    def organize(pdf_file, topic):
         try:
-            # 分类
-            topic = classifier.classify_pdf(pdf_file, topics)
-            
-            # 整理文件
             target_path = FileUtils.organize_file(pdf_file, topic)
-            
+            journal.mark_many(job_id, [(pdf_file, "written", target_path)])
             print(f"✅ {Path(pdf_file).name} → {topic}/")
         except Exception as e:
+            journal.mark_many(job_id, [(pdf_file, "failed", str(e))])
             print(f"❌ 处理失败 {pdf_file}: {e}")
+    
+    try:
+        for pdf_file, topic in classified.items():
+            organize(pdf_file, topic)
+        
+        # 提取和分类在进程池中并行；文件移动只在当前进程串行执行
+        for pdf_file, topic, error in classifier.classify_pdfs(pdf_files, topics, workers):
+            if error is not None:
+                journal.mark_many(job_id, [(pdf_file, "failed", error)])
+                print(f"❌ 处理失败 {pdf_file}: {error}")
+                continue
+            # 先记下分类结果（分类是最耗时的一步），再移动文件
+            journal.mark_many(job_id, [(pdf_file, "encoded", topic)])
+            organize(pdf_file, topic)
+    except KeyboardInterrupt:
+        journal.set_job_status(job_id, "interrupted")
+        print(f"\n⏸️  已中断，进度保存在任务 #{job_id}，运行 python main.py resume {job_id} 继续")
+        return
+    except Exception:
+        journal.set_job_status(job_id, "interrupted")
+        raise
+    journal.set_job_status(job_id, "done")
+    
+    counts = journal.counts(job_id)
+    print(f"\n📊 完成: 整理 {counts['written']} 个，失败 {counts['failed']} 个")
+
+def handle_sync(args, components: Components):
+    """处理增量同步命令"""
+    folder_path = Path(args.folder)
+    if not folder_path.is_dir():
+        print(f"❌ 错误：文件夹不存在: {args.folder}")
+        return
+    
+    root = os.path.abspath(folder_path)
+    kinds = {"all": ["paper", "image"], "papers": ["paper"], "images": ["image"]}[args.kind]
+    topics = args.topics.split(",") if args.topics else None
+    start = time.perf_counter()
+    
+    # 一次遍历同时收集论文和图片，只 stat 不读内容
+    extensions = set().union(*(SYNC_EXTENSIONS[kind] for kind in kinds))
+    with profiling.span("sync.scan"):
+        scanned = FileUtils.scan_files(root, extensions)
+    print(f"📂 扫描 {root}: {len(scanned)} 个文件（{time.perf_counter() - start:.2f}s）\n")
+    
+    icons = {"added": "➕", "updated": "🔄", "modified": "🔄", "removed": "🗑️", "deleted": "🗑️",
+             "skipped": "⏭️", "failed": "❌"}
+    
+    def on_result(path, status, message):
+        line = f"{icons.get(status, '')} {status}: {os.path.relpath(path, root)}"
+        if status == "failed":
+            line += f" 错误: {message}"
+        print(line)
+    
+    # 组件只在确实有文件需要入库或删除时才加载
+    load = lambda name: getattr(components, name)
+    manifest = IngestManifest()
+    names = {"paper": "论文", "image": "图片"}
+    for kind in kinds:
+        files = {path: stat for path, stat in scanned.items()
+                 if os.path.splitext(path)[1].lower() in SYNC_EXTENSIONS[kind]}
+        summary = sync_folder(root, kind, manifest, load, topics, args.dry_run,
+                              scanned=files, on_result=on_result)
+        print(f"📊 {names[kind]}: 共 {summary['scanned']}，未变化 {summary['unchanged']}，"
+              f"新增 {summary['added']}，更新 {summary['updated']}，删除 {summary['removed']}，"
+              f"仅时间变化 {summary['touched']}，失败 {summary['failed']}")
+    
+    if args.dry_run:
+        print("\n（--dry-run：未做任何修改）")
+    print(f"\n✅ 同步完成，用时 {time.perf_counter() - start:.2f}s")
+
+def find_resume_job(args) -> Optional[dict]:
+    """resume 的目标任务：指定编号，或最近一个未完成的任务"""
+    journal = JobJournal()
+    if args.job_id is not None:
+        return journal.get_job(args.job_id)
+    return journal.latest_resumable()
+
+def resume_components(args) -> tuple:
+    """resume 需要的组件取决于任务类型"""
+    job = find_resume_job(args)
+    if job is None:
+        return ()
+    return RESUMABLE_COMMANDS.get(job["kind"], ())
 
-def handle_list_papers(vector_db: VectorDB):
+def handle_resume(args, *dependencies):
+    """处理继续批量任务命令"""
+    job = find_resume_job(args)
+    if job is None:
+        print("没有可继续的任务" if args.job_id is None else f"❌ 任务不存在: #{args.job_id}")
+        return
+    
+    journal = JobJournal()
+    job_id = job["job_id"]
+    # 同一任务不能被两个进程同时执行
+    if not journal.claim(job_id, force=args.force):
+        print(f"❌ 任务 #{job_id} 正在由进程 {job['owner_pid']} 执行；"
+              f"确认该进程已退出后可加 --force 继续")
+        return
+    remaining = journal.remaining(job_id, include_failed=args.retry_failed)
+    counts = journal.counts(job_id)
+    print(f"▶️  继续任务 #{job_id} {job['kind']} {job['source']}：已完成 {counts['written']}，"
+          f"剩余 {len(remaining)}\n")
+    if not remaining:
+        journal.set_job_status(job_id, "done")
+        print("✅ 没有需要处理的文件")
+        return
+    
+    if job["kind"] == "add_images":
+        image_processor, vector_db = dependencies
+        run_image_job(journal, job_id, [path for path, _, _ in remaining],
+                      image_processor, vector_db)
+    elif job["kind"] == "organize":
+        classifier, = dependencies
+        options = job["options"]
+        # 已分类但未移动的文件直接移动
+        classified = {path: detail for path, status, detail in remaining
+                      if status == "encoded" and detail}
+        pending = [path for path, _, _ in remaining if path not in classified]
+        run_organize_job(journal, job_id, pending, classified, options.get("topics"),
+                         options.get("workers") or config.ORGANIZE_WORKERS, classifier)
+
+def handle_jobs(args):
+    """处理批量任务列表命令"""
+    jobs = JobJournal().list_jobs(args.n)
+    if not jobs:
+        print("还没有批量任务记录")
+        return
+    icons = {"running": "⚙️", "interrupted": "⏸️", "done": "✅"}
+    print(f"{'#':>5}  {'类型':<12}{'状态':<14}{'已完成':>8}{'失败':>6}{'剩余':>6}  来源")
+    for job in jobs:
+        counts = job["counts"]
+        remaining = counts["pending"] + counts["encoded"]
+        status = f"{icons.get(job['status'], '')} {job['status']}"
+        if job["status"] == "running" and not job["live"]:
+            status = "💥 exited"
+        print(f"{job['job_id']:>5}  {job['kind']:<12}{status:<14}{counts['written']:>8}"
+              f"{counts['failed']:>6}{remaining:>6}  {job['source']}")
+    print("\n（exited 表示进程异常退出；exited / interrupted 的任务可用 python main.py resume <编号> 继续）")
+
+def handle_list_papers(args, vector_db: "VectorDB"):
     """处理列出所有论文命令"""
     papers = vector_db.get_all_papers()
     
@@ -300,14 +665,14 @@ def handle_list_papers(vector_db: VectorDB):
         total_count += len(topic_papers)
         print()
 
-def handle_list_images(vector_db: VectorDB):
+def handle_list_images(args, vector_db: "VectorDB"):
     """处理列出所有图片命令"""
     try:
         # 直接查询数据库
-        results = vector_db.image_collection.get()
-        if results['metadatas']:
+        all_metadatas = vector_db.get_all_images()
+        if all_metadatas:
             images = []
-            for metadata in results['metadatas']:
+            for metadata in all_metadatas:
                 if 'path' in metadata:
                     images.append(metadata['path'])
                 elif 'source' in metadata:
@@ -322,7 +687,7 @@ def handle_list_images(vector_db: VectorDB):
                 print(f"   路径: {img_path}")
                 
                 # 显示元数据
-                for metadata in results['metadatas']:
+                for metadata in all_metadatas:
                     path = metadata.get('path') or metadata.get('source')
                     if path == img_path:
                         if 'size' in metadata:
@@ -336,72 +701,199 @@ def handle_list_images(vector_db: VectorDB):
     except Exception as e:
         print(f"❌ 列出图片时出错: {e}")
 
-def main():
-    """主函数"""
-    parser = setup_argparse()
+def handle_clear_db(args, vector_db: "VectorDB"):
+    """处理清除数据库命令"""
+    if args.confirm:
+        print("正在清除数据库...")
+        if hasattr(vector_db, 'clear_database'):
+            if vector_db.clear_database():
+                print("✅ 数据库已清空")
+            else:
+                print("❌ 清空数据库失败")
+        else:
+            print("❌ clear_database 方法未实现")
+    else:
+        print("⚠️  警告：这将删除所有索引数据！")
+        print("使用 --confirm 参数确认操作")
+
+def handle_quant_report(args, vector_db: "VectorDB"):
+    """处理量化存储精度报告命令"""
+    print(f"📏 正在估算 {args.kind} 向量压缩存储的检索精度（top-{args.k}，{args.queries} 条抽样查询）...")
+    report = vector_db.quantization_report(args.kind, k=args.k, n_queries=args.queries)
+    if not report:
+        print("向量数量不足，无法评估")
+        return
     
-    # 如果没有参数，显示帮助
-    if len(sys.argv) == 1:
-        parser.print_help()
-        sys.exit(0)
+    print(f"\n{'格式':<10}{'字节/向量':>10}{'索引(MB)':>10}{'压缩比':>8}"
+          f"{'平均重合':>10}{'最差重合':>10}{'最大得分误差':>14}")
+    for row in report:
+        print(f"{row['dtype']:<10}{row['bytes_per_vector']:>10}{row['index_mb']:>10.2f}"
+              f"{row['compression']:>8.2f}{row['overlap_mean']:>10.3f}"
+              f"{row['overlap_min']:>10.3f}{row['max_score_error']:>14.5f}")
+    if args.kind == "images" and config.IMAGE_INDEX_BACKEND == "flat":
+        print(f"\n平面索引当前格式: {config.FLAT_INDEX_DTYPE}（设置 FLAT_INDEX_DTYPE 切换）")
+    else:
+        print("\n以上为估算：该集合存放在 Chroma 中，始终以 float32 存储，不会被压缩")
+
+def handle_onnx_check(args, text_processor: "TextProcessor", image_processor: "ImageProcessor"):
+    """处理 ONNX 一致性校验命令（组件加载时会按需导出模型）"""
+    from modules import onnx_backend
+    
+    print(f"推理后端: {config.INFERENCE_BACKEND}（int8 量化: {config.ONNX_QUANTIZE}，"
+          f"线程数: {config.ONNX_INTRA_OP_THREADS or '自动'}）")
+    report = onnx_backend.parity_report()
+    if not report:
+        print("尚未导出 ONNX 模型（设置 INFERENCE_BACKEND=onnx 后运行任意命令即可导出）")
+        return
+    for row in report:
+        status = "✅" if row["min_cosine"] >= config.ONNX_PARITY_MIN_COSINE else "❌"
+        print(f"{status} {row['model']} [{row['part']}] "
+              f"min cosine {row['min_cosine']:.5f}, max abs error {row['max_abs_error']:.5f}")
+
+def handle_rebuild_centroids(args, vector_db: "VectorDB"):
+    """处理重建论文中心向量命令"""
+    print("正在根据已入库的文本块重建论文中心向量...")
+    vector_db.rebuild_paper_centroids()
+
+# 可用 resume 继续的任务类型 → 需要的组件
+RESUMABLE_COMMANDS = {
+    "add_images": ("image_processor", "vector_db"),
+    "organize": ("classifier",),
+}
+
+# 命令 → (处理函数, 需要的组件)；组件按此列表懒加载，也可以是按参数决定组件的函数
+COMMANDS = {
+    "add_paper": (handle_add_paper, ("text_processor", "vector_db", "classifier")),
+    "search_paper": (handle_search_paper, ("text_processor", "vector_db")),
+    "similar_papers": (handle_similar_papers, ("vector_db",)),
+    "search_image": (handle_search_image, ("image_processor", "vector_db")),
+    "add_image": (handle_add_image, ("image_processor", "vector_db")),
+    "add_images": (handle_add_images, ("image_processor", "vector_db")),
+    "organize": (handle_organize, ("classifier",)),
+    "sync": (handle_sync, ("components",)),
+    "resume": (handle_resume, resume_components),
+    "jobs": (handle_jobs, ()),
+    "list_papers": (handle_list_papers, ("vector_db",)),
+    "list_images": (handle_list_images, ("vector_db",)),
+    "clear_db": (handle_clear_db, ("vector_db",)),
+    "rebuild_centroids": (handle_rebuild_centroids, ("vector_db",)),
+    "quant_report": (handle_quant_report, ("vector_db",)),
+    "onnx_check": (handle_onnx_check, ("text_processor", "image_processor")),
+}
+
+def run_command(args, components: Components) -> int:
+    """构建命令需要的组件并执行，返回退出码"""
+    handler, required = COMMANDS[args.command]
+    if callable(required):
+        required = required(args)
+    profile = args.profile or bool(args.profile_out)
+    if not profile:
+        try:
+            dependencies = [getattr(components, name) for name in required]
+        except Exception as e:
+            print(f"❌ 初始化组件失败: {e}")
+            return 1
+        handler(args, *dependencies)
+        return 0
     
-    args = parser.parse_args()
+    import cProfile
     
-    # 初始化组件
-    print("=" * 60)
-    print("Local Multimodal AI Assistant")
-    print("=" * 60)
+    profiling.reset()
+    profiling.enable()
+    profiler = cProfile.Profile() if args.profile_out else None
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        try:
+            with profiling.span("startup.load_components"):
+                dependencies = [getattr(components, name) for name in required]
+        except Exception as e:
+            print(f"❌ 初始化组件失败: {e}")
+            return 1
+        handler(args, *dependencies)
+        return 0
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        profiling.enable(False)
+        print("\n⏱️  阶段耗时:")
+        print(profiling.format_report(time.perf_counter() - start))
+        if profiler is not None:
+            profiler.dump_stats(args.profile_out)
+            print(f"📈 cProfile 数据已写入: {args.profile_out}"
+                  f"（python -m pstats {args.profile_out} 查看）")
+
+def handle_serve(args):
+    """处理常驻守护进程命令"""
+    from modules import daemon
+    
+    if args.stop:
+        if daemon.shutdown():
+            print("✅ 已请求守护进程退出")
+        else:
+            print("守护进程未运行")
+        return
     
+    # 预先加载全部组件，之后的命令直接复用
+    components = Components()
     try:
-        text_processor = TextProcessor()
-        image_processor = ImageProcessor()
-        vector_db = VectorDB()
-        classifier = Classifier()
+        for name in ("text_processor", "image_processor", "vector_db", "classifier"):
+            getattr(components, name)
     except Exception as e:
         print(f"❌ 初始化组件失败: {e}")
         sys.exit(1)
     
-    # 根据命令执行相应操作
-    if args.command == "add_paper":
-        handle_add_paper(args, text_processor, vector_db, classifier)
+    parser = setup_argparse()
     
-    elif args.command == "search_paper":
-        handle_search_paper(args, text_processor, vector_db)
+    def dispatch(argv):
+        command_args = parser.parse_args(argv)
+        if command_args.command not in COMMANDS:
+            print(f"❌ 守护进程不支持该命令: {command_args.command}")
+            return 1
+        return run_command(command_args, components)
     
-    elif args.command == "search_image":
-        handle_search_image(args, image_processor, vector_db)
+    server = daemon.DaemonServer(dispatch)
+    host, port = server.server_address[:2]
+    print(f"🚀 守护进程已启动: {host}:{port}（Ctrl+C 退出）")
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        print("\n守护进程已退出")
+
+def main():
+    """主函数"""
+    parser = setup_argparse()
     
-    elif args.command == "add_image":
-        handle_add_image(args, image_processor, vector_db)
+    # 如果没有参数，显示帮助
+    if len(sys.argv) == 1:
+        parser.print_help()
+        sys.exit(0)
     
-    elif args.command == "add_images":
-        handle_add_images(args, image_processor, vector_db)
+    args = parser.parse_args()
     
-    elif args.command == "organize":
-        handle_organize(args, classifier)
+    if args.command == "serve":
+        handle_serve(args)
+        return
     
-    elif args.command == "list_papers":
-        handle_list_papers(vector_db)
+    if args.command not in COMMANDS:
+        parser.print_help()
+        return
     
-    elif args.command == "list_images":
-        handle_list_images(vector_db)
+    # 守护进程在运行时直接转发，省去导入和加载模型的开销
+    if not args.no_daemon:
+        from modules import daemon
+        exit_code = daemon.forward(sys.argv[1:])
+        if exit_code is not None:
+            sys.exit(exit_code)
     
-    elif args.command == "clear_db":
-        if args.confirm:
-            print("正在清除数据库...")
-            if hasattr(vector_db, 'clear_database'):
-                if vector_db.clear_database():
-                    print("✅ 数据库已清空")
-                else:
-                    print("❌ 清空数据库失败")
-            else:
-                print("❌ clear_database 方法未实现")
-        else:
-            print("⚠️  警告：这将删除所有索引数据！")
-            print("使用 --confirm 参数确认操作")
+    # 初始化组件（只构建当前命令需要的部分）
+    print("=" * 60)
+    print("Local Multimodal AI Assistant")
+    print("=" * 60)
     
-    else:
-        parser.print_help()
+    if run_command(args, Components()) != 0:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -2,17 +2,37 @@
 Local Multimodal AI Assistant Modules
 """
 
-from .text_processor import TextProcessor
-from .image_processor import ImageProcessor
-from .vector_db import VectorDB
-from .classifier import Classifier
-from .file_utils import FileUtils
+import importlib
+
+# 按需导入：访问 modules.TextProcessor 时才加载对应子模块，
+# 避免 `import modules.file_utils` 之类的轻量导入连带加载 torch/transformers/chromadb
+_LAZY_EXPORTS = {
+    "TextProcessor": ".text_processor",
+    "ImageProcessor": ".image_processor",
+    "VectorDB": ".vector_db",
+    "Classifier": ".classifier",
+    "FileUtils": ".file_utils",
+    "ParsedDocument": ".file_utils",
+    "StreamingDocument": ".file_utils",
+    "IngestManifest": ".manifest",
+}
 
 __version__ = "1.0.0"
 __all__ = [
     "TextProcessor",
-    "ImageProcessor", 
+    "ImageProcessor",
     "VectorDB",
     "Classifier",
-    "FileUtils"
-]
\ No newline at end of file
+    "FileUtils",
+    "ParsedDocument",
+    "StreamingDocument",
+    "IngestManifest"
+]
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        module = importlib.import_module(_LAZY_EXPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,91 @@
+# batcher.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Sequence
+import config
+
+class MicroBatcher:
+    """请求合并器：把并发到达的单条请求合并成一批，一次调用 batch_fn 后再分发结果
+
+    第一条请求到达后最多再等待 max_wait_ms 收集后续请求（满 max_batch_size 立即执行）；
+    前一批计算期间到达的请求会在下一轮一起处理，因此负载越高批次越大。
+    batch_fn(items) 必须按输入顺序返回等长的结果序列。
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], Sequence[Any]],
+                 max_batch_size: int = None, max_wait_ms: float = None,
+                 name: str = "micro-batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size or config.QUERY_BATCH_MAX_SIZE
+        self.max_wait = (config.QUERY_BATCH_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self.name = name
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item: Any) -> Any:
+        """提交单条请求并阻塞等待其结果（batch_fn 抛出的异常会原样抛给每个调用方）"""
+        return self.submit_async(item).result()
+
+    def submit_async(self, item: Any) -> Future:
+        """提交单条请求，返回 Future"""
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._worker.start()
+
+    def _collect(self) -> List[tuple]:
+        """阻塞取第一条，再在等待窗口内凑批"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # 先取走已经排队的请求，不额外等待
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name}: 批处理返回 {len(results)} 条结果，应为 {len(items)} 条")
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(items)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        """累计批次数与平均批大小"""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0
+        }
@@ -1,21 +1,32 @@
 # classifier.py
-from typing import List, Dict, Tuple
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Dict, Optional, Tuple
 import numpy as np
 from sklearn.cluster import KMeans
 from sklearn.feature_extraction.text import TfidfVectorizer
 import config
-from .text_processor import TextProcessor
+from . import profiling
 
 class Classifier:
     """分类器模块"""
     
     def __init__(self):
-        self.text_processor = TextProcessor()
+        self._text_processor = None
         self.vectorizer = TfidfVectorizer(
             max_features=1000,
             stop_words='english'
         )
     
+    @property
+    def text_processor(self):
+        """按需创建文本处理器（关键词分类用不到；模型由注册表共享，不会重复加载）"""
+        if self._text_processor is None:
+            from .text_processor import TextProcessor
+            self._text_processor = TextProcessor()
+        return self._text_processor
+    
+    @profiling.timed("classify")
     def classify_by_keywords(self, text: str, topics: List[str] = None) -> str:
         """基于关键词分类"""
         if topics is None:
@@ -55,14 +66,57 @@ class Classifier:
         """分类PDF文件"""
         from .file_utils import FileUtils
         
-        text = FileUtils.extract_text_from_pdf(pdf_path)
-        if not text:
+        # 只需解析到分类所需的开头部分
+        document = FileUtils.parse_pdf(pdf_path, max_chars=config.CLASSIFY_MAX_CHARS)
+        return self.classify_document(document, topics)
+    
+    def classify_document(self, document, topics: List[str] = None) -> str:
+        """分类已解析的文档（复用 ParsedDocument，不再重复提取PDF）"""
+        # 获取摘要进行分类
+        summary = document.head(config.CLASSIFY_MAX_CHARS)
+        if not summary:
             return "Other"
         
-        # 获取摘要进行分类
-        summary = text[:2000]  # 使用前2000字符
         topic = self.classify_by_keywords(summary, topics)
         
-        return topic 
-
+        return topic
+    
+    def classify_pdfs(self, pdf_paths: List[str], topics: List[str] = None,
+                      workers: int = None) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+        """批量分类PDF，按输入顺序产出 (路径, 主题, 错误信息)
+        
+        workers > 1 时把PDF提取和分类分散到进程池；调用方在主进程中
+        串行应用文件移动，保证重名处理不会产生竞争。
+        工作进程用 spawn 方式启动：守护进程与 Web 应用是多线程的，fork 会复制
+        其它线程持有的锁与被重定向的 stdout。
+        """
+        workers = workers or config.ORGANIZE_WORKERS
+        tasks = [(path, topics) for path in pdf_paths]
+        
+        if workers <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                yield _classify_task(task, self)
+            return
         
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            # chunksize 减少进程间通信次数
+            chunksize = max(1, min(32, len(tasks) // (workers * 4)))
+            yield from executor.map(_classify_task, tasks, chunksize=chunksize)
+
+# 工作进程内复用的分类器实例
+_worker_classifier: Optional[Classifier] = None
+
+def _classify_task(task: Tuple[str, Optional[List[str]]],
+                   classifier: Optional[Classifier] = None) -> Tuple[str, Optional[str], Optional[str]]:
+    """分类单个PDF（可在工作进程中执行），异常转为错误信息返回"""
+    global _worker_classifier
+    pdf_path, topics = task
+    if classifier is None:
+        if _worker_classifier is None:
+            _worker_classifier = Classifier()
+        classifier = _worker_classifier
+    try:
+        return pdf_path, classifier.classify_pdf(pdf_path, topics), None
+    except Exception as e:
+        return pdf_path, None, str(e)
@@ -0,0 +1,187 @@
+# daemon.py
+import json
+import os
+import secrets
+import select
+import socket
+import socketserver
+import threading
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import Callable, List, Optional
+import config
+
+# 常驻服务：模型与 VectorDB 保持加载状态，CLI 子命令通过本地 TCP 转发执行。
+# 协议为逐行 JSON：
+#   请求  {"token": ..., "argv": [...], "cwd": ...}  或  {"token": ..., "op": "shutdown"}
+#   响应  {"started": true}（开始执行），若干 {"out": "..."}，最后一行 {"exit": 退出码}
+
+Dispatcher = Callable[[List[str]], int]
+
+class _SocketWriter:
+    """把命令输出实时转发给客户端的类文件对象"""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.closed = False
+
+    def write(self, text: str) -> int:
+        if text and not self.closed:
+            try:
+                self.wfile.write((json.dumps({"out": text}, ensure_ascii=False) + "\n").encode("utf-8"))
+                self.wfile.flush()
+            except OSError:
+                # 客户端读取超时已断开：命令照常执行完，输出丢弃
+                self.closed = True
+        return len(text)
+
+    def flush(self):
+        self.wfile.flush()
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server: "DaemonServer" = self.server
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+        except ValueError:
+            return
+        if not secrets.compare_digest(str(request.get("token", "")), server.token):
+            self._send({"out": "❌ 守护进程令牌不匹配\n"})
+            self._send({"exit": 1})
+            return
+
+        if request.get("op") == "shutdown":
+            self._send({"out": "守护进程正在退出\n"})
+            self._send({"exit": 0})
+            threading.Thread(target=server.shutdown, daemon=True).start()
+            return
+
+        writer = _SocketWriter(self.wfile)
+        exit_code = 0
+        # 重定向 stdout 和切换工作目录都是进程级操作，命令逐个串行执行
+        with server.command_lock:
+            # 排队期间客户端可能已超时并改为本地执行，此时不能再执行一遍
+            if self._client_gone():
+                return
+            self._send({"started": True})
+            previous_cwd = os.getcwd()
+            try:
+                if request.get("cwd"):
+                    os.chdir(request["cwd"])
+                with redirect_stdout(writer), redirect_stderr(writer):
+                    exit_code = server.dispatcher(request.get("argv", [])) or 0
+            except SystemExit as e:
+                # 与解释器一致：None 为 0，整数原样返回，其它值（如 sys.exit("消息")）输出后返回 1
+                if e.code is None or isinstance(e.code, int):
+                    exit_code = e.code or 0
+                else:
+                    writer.write(f"{e.code}\n")
+                    exit_code = 1
+            except Exception:
+                writer.write(traceback.format_exc())
+                exit_code = 1
+            finally:
+                os.chdir(previous_cwd)
+        if not writer.closed:
+            self._send({"exit": exit_code})
+
+    def _client_gone(self) -> bool:
+        """客户端是否已断开（连接可读且读到 EOF）"""
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            return bool(readable) and self.connection.recv(1, socket.MSG_PEEK) == b""
+        except OSError:
+            return True
+
+    def _send(self, message: dict):
+        self.wfile.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+class DaemonServer(socketserver.ThreadingTCPServer):
+    """常驻后台服务（仅监听本机地址）"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, dispatcher: Dispatcher, host: str = None, port: int = None):
+        super().__init__((host or config.DAEMON_HOST, port or config.DAEMON_PORT),
+                         _RequestHandler)
+        self.dispatcher = dispatcher
+        self.command_lock = threading.Lock()
+        self.token = secrets.token_hex(16)
+
+    def serve(self):
+        """写入令牌文件并开始服务，退出时清理令牌文件"""
+        token_path = Path(config.DAEMON_TOKEN_PATH)
+        # 创建时即为 0600，令牌不会有短暂的可读窗口；旧文件先删除（O_TRUNC 不会修改已有权限）
+        if token_path.exists():
+            token_path.unlink()
+        fd = os.open(token_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(json.dumps({
+                "port": self.server_address[1],
+                "token": self.token,
+                "pid": os.getpid()
+            }))
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            if token_path.exists():
+                token_path.unlink()
+
+def _read_token() -> Optional[dict]:
+    """读取令牌文件；不存在说明守护进程未运行"""
+    try:
+        return json.loads(Path(config.DAEMON_TOKEN_PATH).read_text())
+    except (OSError, ValueError):
+        return None
+
+def _request(message: dict) -> Optional[int]:
+    """发送请求并把输出转写到本地 stdout；守护进程不可用时返回 None
+
+    每次读取最多等待 DAEMON_READ_TIMEOUT 秒：命令开始执行前超时视为守护进程不可用
+    （返回 None，由调用方在本地执行）；开始执行后超时则报错退出。
+    """
+    info = _read_token()
+    if info is None:
+        return None
+    message["token"] = info.get("token", "")
+    try:
+        sock = socket.create_connection((config.DAEMON_HOST, info.get("port", config.DAEMON_PORT)),
+                                        timeout=config.DAEMON_CONNECT_TIMEOUT)
+    except OSError:
+        return None
+
+    started = False
+    with sock:
+        sock.settimeout(config.DAEMON_READ_TIMEOUT)
+        stream = sock.makefile("rwb")
+        try:
+            stream.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+            stream.flush()
+            for line in stream:
+                reply = json.loads(line.decode("utf-8"))
+                if reply.get("started"):
+                    started = True
+                if "out" in reply:
+                    started = True
+                    print(reply["out"], end="", flush=True)
+                if "exit" in reply:
+                    return int(reply["exit"])
+        except (socket.timeout, OSError) as e:
+            if not started:
+                print(f"⚠️  守护进程无响应（{e}），改为在当前进程执行")
+                return None
+            print(f"\n❌ 守护进程 {config.DAEMON_READ_TIMEOUT:g} 秒内没有输出，已断开（{e}）")
+            return 1
+    return 1
+
+def forward(argv: List[str]) -> Optional[int]:
+    """把命令转发给运行中的守护进程，返回退出码；未运行时返回 None"""
+    return _request({"argv": list(argv), "cwd": os.getcwd()})
+
+def shutdown() -> bool:
+    """请求守护进程退出"""
+    return _request({"op": "shutdown"}) is not None
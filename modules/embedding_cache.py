@@ -0,0 +1,207 @@
+# embedding_cache.py
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import config
+
+class EmbeddingCache:
+    """两级向量缓存：内存 LRU + 磁盘存储（SQLite，按 模型名+规范化文本 的哈希寻址）
+
+    调用方传入的模型名包含推理后端（如 "...MiniLM-L6-v2@onnx-int8"），不同后端的向量互不复用。
+
+    查询先查内存，再查磁盘；两级都有容量上限，超出后淘汰最久未使用的条目。
+    """
+
+    def __init__(self, db_path: Optional[str] = None, memory_items: int = None,
+                 disk_items: int = None, persistent: bool = True):
+        self.memory_items = memory_items or config.EMBEDDING_CACHE_MEMORY_ITEMS
+        self.disk_items = disk_items or config.EMBEDDING_CACHE_DISK_ITEMS
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._conn = None
+        if persistent:
+            path = Path(db_path or config.EMBEDDING_CACHE_PATH)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), check_same_thread=False)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """规范化文本：Unicode NFC + 合并空白"""
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    @classmethod
+    def make_key(cls, model_name: str, text: str) -> str:
+        """缓存键：sha256(模型名 + 规范化文本)"""
+        payload = f"{model_name}\0{cls.normalize(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """查询单条"""
+        return self.get_many(model_name, [text])[0]
+
+    def get_many(self, model_name: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """批量查询，未命中的位置为 None"""
+        keys = [self.make_key(model_name, text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        disk_lookup: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    results[i] = vector
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+
+            if disk_lookup and self._conn is not None:
+                found = {}
+                lookup_keys = list(disk_lookup)
+                for start in range(0, len(lookup_keys), 500):
+                    part = lookup_keys[start:start + 500]
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                        part
+                    ).fetchall()
+                    found.update(rows)
+                if found:
+                    now = time.time()
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(now, key) for key in found]
+                    )
+                    self._conn.commit()
+                for key, blob in found.items():
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, vector)
+                    for i in disk_lookup[key]:
+                        results[i] = vector
+                    self.disk_hits += len(disk_lookup[key])
+
+            self.misses += sum(1 for vector in results if vector is None)
+        return results
+
+    def put(self, model_name: str, text: str, vector: np.ndarray):
+        """写入单条"""
+        self.put_many(model_name, [text], [vector])
+
+    def put_many(self, model_name: str, texts: Sequence[str], vectors):
+        """批量写入（内存与磁盘同时写）"""
+        entries = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.make_key(model_name, text)
+                vector = np.ascontiguousarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                entries.append((key, vector.tobytes()))
+
+            if self._conn is not None and entries:
+                now = time.time()
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    [(key, blob, now) for key, blob in entries]
+                )
+                self._conn.commit()
+                self._writes_since_trim += len(entries)
+                # 摊销淘汰成本：累计写入一定数量后再检查磁盘容量
+                if self._writes_since_trim >= max(1, self.disk_items // 100):
+                    self._trim_disk()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        """放入内存 LRU（调用方持锁）"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _trim_disk(self):
+        """磁盘条目超出上限时淘汰最久未使用的（调用方持锁）"""
+        self._writes_since_trim = 0
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.disk_items
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """命中统计"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            disk_count = (self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                          if self._conn is not None else 0)
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "disk_items": disk_count
+            }
+
+    def clear(self):
+        """清空两级缓存"""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM embeddings")
+                self._conn.commit()
+
+def cached_encode(cache: Optional[EmbeddingCache], model_name: str,
+                  texts: Sequence[str], encode_fn) -> np.ndarray:
+    """先查缓存，只对未命中的文本调用一次 encode_fn(批量)，结果写回缓存"""
+    if cache is None:
+        return np.asarray(encode_fn(list(texts)))
+    cached = cache.get_many(model_name, texts)
+    missing = [i for i, vector in enumerate(cached) if vector is None]
+    if missing:
+        # 同一批中的重复文本只编码一次
+        unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+        encoded = np.asarray(encode_fn(unique_texts), dtype=np.float32)
+        cache.put_many(model_name, unique_texts, encoded)
+        by_text = dict(zip(unique_texts, encoded))
+        for i in missing:
+            cached[i] = by_text[texts[i]]
+    return np.stack(cached) if cached else np.empty((0, 0), dtype=np.float32)
+
+# 进程级默认缓存
+_default_cache: Optional[EmbeddingCache] = None
+_default_lock = threading.Lock()
+
+def get_default_cache() -> Optional[EmbeddingCache]:
+    """获取进程共享的缓存实例；配置关闭时返回 None"""
+    global _default_cache
+    if not config.EMBEDDING_CACHE_ENABLED:
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+        return _default_cache
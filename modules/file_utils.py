@@ -1,11 +1,97 @@
 import os
+import hashlib
 import shutil
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import fitz  # PyMuPDF
 import pdfplumber
 from tqdm import tqdm
 import config
+from . import profiling
+
+# 支持的图片扩展名
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff'}
+
+class ParsedDocument:
+    """解析一次的PDF文档：全文、分页文本与分类用的开头片段，供切块/编码与分类共享"""
+    
+    def __init__(self, path: str, pages: List[str]):
+        self.path = path
+        self.pages = pages
+        self._text = None
+    
+    @property
+    def text(self) -> str:
+        """全文（按需拼接一次并缓存）"""
+        if self._text is None:
+            self._text = "".join(self.pages)
+        return self._text
+    
+    def head(self, max_chars: int = config.CLASSIFY_MAX_CHARS) -> str:
+        """文档开头的前N个字符（只拼接需要的页）"""
+        parts = []
+        remaining = max_chars
+        for page in self.pages:
+            if remaining <= 0:
+                break
+            parts.append(page[:remaining])
+            remaining -= len(parts[-1])
+        return "".join(parts)
+    
+    def iter_pages(self) -> Iterator[str]:
+        """逐页产出文本"""
+        return iter(self.pages)
+
+class StreamingDocument:
+    """流式读取的PDF文档：与 ParsedDocument 接口一致，但只缓存分类所需的开头几页
+    
+    其余页面在 iter_pages() 时逐页提取，峰值内存与文档大小无关。
+    需在 with 语句中使用，退出时关闭底层文档。
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._doc = None
+        self._head_pages: List[str] = []
+        self._head_chars = 0
+    
+    def __enter__(self) -> "StreamingDocument":
+        try:
+            self._doc = fitz.open(self.path)
+        except Exception as e:
+            print(f"Error extracting text from {self.path}: {e}")
+            self._doc = None
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def close(self):
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+    
+    @property
+    def page_count(self) -> int:
+        return self._doc.page_count if self._doc is not None else 0
+    
+    def _page_text(self, index: int) -> str:
+        with profiling.span("pdf.extract"):
+            return self._doc[index].get_text()
+    
+    def head(self, max_chars: int = config.CLASSIFY_MAX_CHARS) -> str:
+        """文档开头的前N个字符（读取过的页会被缓存，供 iter_pages 复用）"""
+        while self._head_chars < max_chars and len(self._head_pages) < self.page_count:
+            page = self._page_text(len(self._head_pages))
+            self._head_pages.append(page)
+            self._head_chars += len(page)
+        return ParsedDocument(self.path, self._head_pages).head(max_chars)
+    
+    def iter_pages(self) -> Iterator[str]:
+        """逐页产出文本：先复用已缓存的开头页，再继续从文档读取"""
+        yield from self._head_pages
+        for index in range(len(self._head_pages), self.page_count):
+            yield self._page_text(index)
 
 class FileUtils:
     """文件处理工具类"""
@@ -15,23 +101,61 @@ class FileUtils:
         """从PDF提取文本"""
         try:
             if method == "fitz":
-                # 使用PyMuPDF
-                doc = fitz.open(pdf_path)
-                text = ""
-                for page in doc:
-                    text += page.get_text()
-                return text
+                # 使用PyMuPDF（一次性拼接，避免逐页 += 的二次复杂度）
+                return "".join(FileUtils.iter_pdf_pages(pdf_path))
             elif method == "pdfplumber":
                 # 使用pdfplumber（保持布局）
                 with pdfplumber.open(pdf_path) as pdf:
-                    text = ""
-                    for page in pdf.pages:
-                        text += page.extract_text() or ""
-                    return text
+                    return "".join(page.extract_text() or "" for page in pdf.pages)
         except Exception as e:
             print(f"Error extracting text from {pdf_path}: {e}")
             return ""
     
+    @staticmethod
+    def iter_pdf_pages(pdf_path: str) -> Iterator[str]:
+        """逐页产出PDF文本，读取完毕后关闭文档"""
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                with profiling.span("pdf.extract"):
+                    text = page.get_text()
+                yield text
+    
+    @staticmethod
+    def open_pdf(pdf_path: str) -> StreamingDocument:
+        """以流式方式打开PDF（用于大文档入库）"""
+        return StreamingDocument(pdf_path)
+    
+    @staticmethod
+    @profiling.timed("pdf.extract")
+    def parse_pdf(pdf_path: str, max_chars: Optional[int] = None) -> ParsedDocument:
+        """解析PDF为 ParsedDocument（每页文本只提取一次）
+        
+        指定 max_chars 时提取到累计字符数足够即停止（分类只需要文档开头）。
+        """
+        try:
+            with fitz.open(pdf_path) as doc:
+                pages = []
+                total = 0
+                for page in doc:
+                    pages.append(page.get_text())
+                    total += len(pages[-1])
+                    if max_chars is not None and total >= max_chars:
+                        break
+        except Exception as e:
+            print(f"Error extracting text from {pdf_path}: {e}")
+            pages = []
+        return ParsedDocument(pdf_path, pages)
+    
+    @staticmethod
+    @profiling.timed("file.hash")
+    def compute_file_hash(file_path: str, block_size: int = 1 << 20) -> str:
+        """计算文件内容哈希（SHA-256），用于内容寻址的ID和去重"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
     @staticmethod
     def get_all_pdfs(folder_path: str) -> List[str]:
         """获取文件夹中所有PDF文件"""
@@ -45,50 +169,103 @@ class FileUtils:
     @staticmethod
     def get_all_images(folder_path: str) -> List[str]:
         """获取文件夹中所有图片文件"""
-        image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff'}
         image_files = []
         for root, _, files in os.walk(folder_path):
             for file in files:
-                if Path(file).suffix.lower() in image_extensions:
+                if Path(file).suffix.lower() in IMAGE_EXTENSIONS:
                     image_files.append(os.path.join(root, file))
         return image_files
     
     @staticmethod
-    def organize_file(source_path: str, target_topic: str) -> str:
-        """将文件整理到对应的主题文件夹"""
+    def scan_files(folder_path: str, extensions) -> Dict[str, Tuple[int, int]]:
+        """递归列出指定扩展名的文件 {路径: (大小, 修改时间ns)}
+
+        用 os.scandir 遍历，每个文件只做一次 stat，不读取内容。
+        """
+        files = {}
+        stack = [folder_path]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in extensions and entry.is_file():
+                            stat = entry.stat()
+                            files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError as e:
+                print(f"⚠️  无法读取目录 {directory}: {e}")
+        return files
+    
+    @staticmethod
+    def organize_file(source_path: str, target_topic: str,
+                      target_path: Optional[str] = None) -> str:
+        """将文件整理到对应的主题文件夹（可传入事先占位的目标路径）"""
+        if target_path is None:
+            target_path = FileUtils.resolve_target_path(source_path, target_topic)
+        
+        # 移动文件（覆盖占位文件）；失败时释放占位，源文件保持原样
+        try:
+            with profiling.span("file.move"):
+                shutil.move(source_path, target_path)
+        except Exception:
+            FileUtils.release_target_path(target_path)
+            raise
+        return target_path
+    
+    @staticmethod
+    def resolve_target_path(source_path: str, target_topic: str) -> str:
+        """计算整理后的目标路径，并以空文件原子占位（不移动文件）
+        
+        用 O_CREAT|O_EXCL 创建占位文件，同名论文并发入库时不会得到同一路径；
+        不再移动时需调用 release_target_path 删除占位。
+        """
         filename = os.path.basename(source_path)
+        name, ext = os.path.splitext(filename)
         target_dir = config.PAPERS_DIR / target_topic
+        target_dir.mkdir(parents=True, exist_ok=True)
         target_path = target_dir / filename
         
         # 如果目标文件已存在，添加序号
         counter = 1
-        while target_path.exists():
-            name, ext = os.path.splitext(filename)
-            target_path = target_dir / f"{name}_{counter}{ext}"
-            counter += 1
-        
-        # 移动文件
-        shutil.move(source_path, target_path)
-        return str(target_path)
+        while True:
+            try:
+                os.close(os.open(target_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return str(target_path)
+            except FileExistsError:
+                target_path = target_dir / f"{name}_{counter}{ext}"
+                counter += 1
+    
+    @staticmethod
+    def release_target_path(target_path: str):
+        """删除 resolve_target_path 创建的占位文件（已被真实文件覆盖时不删除）"""
+        try:
+            if os.path.getsize(target_path) == 0:
+                os.remove(target_path)
+        except OSError:
+            pass
     
     @staticmethod
     def split_text(text: str, chunk_size: int = config.CHUNK_SIZE) -> List[str]:
         """将长文本分割为chunks"""
-        words = text.split()
-        chunks = []
+        return list(FileUtils.iter_text_chunks([text], chunk_size))
+    
+    @staticmethod
+    def iter_text_chunks(pages: Iterable[str], chunk_size: int = config.CHUNK_SIZE) -> Iterator[str]:
+        """逐页读取文本并增量产出chunks（只在内存中保留当前chunk）"""
         current_chunk = []
         current_length = 0
         
-        for word in words:
-            current_chunk.append(word)
-            current_length += len(word) + 1  # +1 for space
-            
-            if current_length >= chunk_size:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = []
-                current_length = 0
+        for page in pages:
+            for word in page.split():
+                current_chunk.append(word)
+                current_length += len(word) + 1  # +1 for space
+                
+                if current_length >= chunk_size:
+                    yield " ".join(current_chunk)
+                    current_chunk = []
+                    current_length = 0
         
         if current_chunk:
-            chunks.append(" ".join(current_chunk))
-        
-        return chunks
\ No newline at end of file
+            yield " ".join(current_chunk)
\ No newline at end of file
@@ -0,0 +1,383 @@
+# flat_index.py
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from .quantization import SUPPORTED_DTYPES, dequantize_int8, quantize_int8
+
+class FlatIndex:
+    """精确最近邻平面索引（适用于已 L2 归一化的向量）
+
+    向量保存在一个连续矩阵中（.npy 内存映射文件），旁边是逐行对应的
+    ID/元数据。查询只需一次矩阵-向量乘法加 argpartition；打开索引时
+    只映射文件、不读取数据，冷启动几乎没有开销。
+
+    目录结构:
+        vectors.npy   (capacity, dim) 向量矩阵
+        alive.npy     (capacity,) 行是否有效（删除只做标记）
+        offsets.npy   (capacity,) 每行元数据在 meta.jsonl 中的字节偏移
+        meta.jsonl    每行一条 {"id": ..., "metadata": {...}}
+        scales.npy    (capacity,) int8 存储时每行的缩放系数
+        state.json    {"count", "capacity", "dim", "dtype", "alive"}
+
+    dtype 可选 float32 / float16 / int8（逐向量缩放），压缩后按 2x / 约 4x 节省内存与磁盘。
+    """
+
+    INITIAL_CAPACITY = 1024
+    # 查询时按块计算得分并维护 top-k，临时得分矩阵不超过 查询数 × SCORE_BLOCK_ROWS
+    SCORE_BLOCK_ROWS = 65536
+    # float16/int8 转为 float32 做乘法时每次转换的行数，临时副本不超过 CAST_BLOCK_ROWS × dim
+    CAST_BLOCK_ROWS = 4096
+
+    def __init__(self, directory: str, dim: int, dtype: str = "float32"):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"不支持的向量存储格式: {dtype}")
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.scales = None
+        self._lock = threading.RLock()
+        self._id_to_row: Optional[Dict[str, int]] = None
+        self._open()
+        # 已有索引的存储格式与配置不一致时就地转换
+        if self.dtype != np.dtype(dtype):
+            print(f"🔄 平面索引存储格式 {self.dtype.name} → {dtype}，正在转换...")
+            self.convert(dtype)
+
+    # ---------- 存储 ----------
+
+    def _path(self, name: str) -> Path:
+        return self.directory / name
+
+    def _open(self):
+        """打开（或创建）索引文件"""
+        state_path = self._path("state.json")
+        if state_path.exists():
+            state = json.loads(state_path.read_text())
+            if state["dim"] != self.dim:
+                raise ValueError(f"平面索引 {self.directory} 的向量维度为 {state['dim']}，"
+                                 f"与当前模型的 {self.dim} 不一致，请清空索引后重新入库")
+            self.count = state["count"]
+            self.capacity = state["capacity"]
+            self.alive_count = state.get("alive", self.count)
+            self.dtype = np.dtype(state["dtype"])
+            self.vectors = np.load(self._path("vectors.npy"), mmap_mode="r+")
+            self.alive = np.load(self._path("alive.npy"), mmap_mode="r+")
+            self.offsets = np.load(self._path("offsets.npy"), mmap_mode="r+")
+            if self.quantized:
+                self.scales = np.load(self._path("scales.npy"), mmap_mode="r+")
+        else:
+            self.count = 0
+            self.alive_count = 0
+            self.capacity = 0
+            self._allocate(self.INITIAL_CAPACITY)
+            self._save_state()
+
+    @property
+    def quantized(self) -> bool:
+        """是否为 int8 量化存储"""
+        return self.dtype == np.int8
+
+    def _array_names(self) -> Tuple[str, ...]:
+        return ("vectors.npy", "alive.npy", "offsets.npy") + (
+            ("scales.npy",) if self.quantized else ())
+
+    def _arrays(self) -> list:
+        return [self.vectors, self.alive, self.offsets] + (
+            [self.scales] if self.quantized else [])
+
+    def _allocate(self, capacity: int):
+        """分配（或扩容到）指定容量，已有数据复制到新文件"""
+        new_vectors = np.lib.format.open_memmap(
+            self._path("vectors.npy.tmp"), mode="w+", dtype=self.dtype,
+            shape=(capacity, self.dim))
+        new_alive = np.lib.format.open_memmap(
+            self._path("alive.npy.tmp"), mode="w+", dtype=np.bool_, shape=(capacity,))
+        new_offsets = np.lib.format.open_memmap(
+            self._path("offsets.npy.tmp"), mode="w+", dtype=np.int64, shape=(capacity,))
+        new_arrays = [new_vectors, new_alive, new_offsets]
+        if self.quantized:
+            new_arrays.append(np.lib.format.open_memmap(
+                self._path("scales.npy.tmp"), mode="w+", dtype=np.float32, shape=(capacity,)))
+        if self.count:
+            for new_array, old_array in zip(new_arrays, self._arrays()):
+                new_array[:self.count] = old_array[:self.count]
+        for array in new_arrays:
+            array.flush()
+        del new_vectors, new_alive, new_offsets, new_arrays
+
+        # 先释放旧映射再替换文件（Windows 不允许替换已映射的文件）
+        self.vectors = self.alive = self.offsets = self.scales = None
+        for name in self._array_names():
+            os.replace(self._path(name + ".tmp"), self._path(name))
+        self.vectors = np.load(self._path("vectors.npy"), mmap_mode="r+")
+        self.alive = np.load(self._path("alive.npy"), mmap_mode="r+")
+        self.offsets = np.load(self._path("offsets.npy"), mmap_mode="r+")
+        if self.quantized:
+            self.scales = np.load(self._path("scales.npy"), mmap_mode="r+")
+        self.capacity = capacity
+
+    def _save_state(self):
+        """原子写入状态文件（count 最后落盘，崩溃时多写的行会被忽略）"""
+        for array in self._arrays():
+            array.flush()
+        tmp_path = self._path("state.json.tmp")
+        tmp_path.write_text(json.dumps({
+            "count": self.count,
+            "capacity": self.capacity,
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "alive": self.alive_count
+        }))
+        os.replace(tmp_path, self._path("state.json"))
+
+    def _read_metadata(self, rows: Sequence[int]) -> Dict[int, Tuple[str, dict]]:
+        """按偏移读取多行的 ID 与元数据 {row: (id, metadata)}（文件只打开一次）"""
+        records = {}
+        if not len(rows):
+            return records
+        with open(self._path("meta.jsonl"), "rb") as f:
+            # 按偏移顺序读取，尽量顺序访问文件
+            for row in sorted(set(int(row) for row in rows), key=lambda row: self.offsets[row]):
+                f.seek(int(self.offsets[row]))
+                record = json.loads(f.readline().decode("utf-8"))
+                records[row] = (record["id"], record["metadata"])
+        return records
+
+    def _iter_records(self) -> Iterator[Tuple[int, str, dict]]:
+        """顺序遍历所有有效行 (row, id, metadata)"""
+        meta_path = self._path("meta.jsonl")
+        if not meta_path.exists():
+            return
+        offset_to_row = {int(self.offsets[row]): row for row in range(self.count)}
+        with open(meta_path, "rb") as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                row = offset_to_row.get(offset)
+                if row is None or not self.alive[row]:
+                    continue
+                record = json.loads(line.decode("utf-8"))
+                yield row, record["id"], record["metadata"]
+
+    def _row_map(self) -> Dict[str, int]:
+        """ID → 行号（首次写入/删除时才构建）"""
+        if self._id_to_row is None:
+            self._id_to_row = {record_id: row for row, record_id, _ in self._iter_records()}
+        return self._id_to_row
+
+    def _write_rows(self, start: int, vectors: np.ndarray):
+        """把 float32 向量按存储格式写入 [start, start+len) 行"""
+        end = start + len(vectors)
+        if self.quantized:
+            self.vectors[start:end], self.scales[start:end] = quantize_int8(vectors)
+        else:
+            self.vectors[start:end] = vectors.astype(self.dtype)
+
+    def _decode_rows(self, start: int, end: int) -> np.ndarray:
+        """读取 [start, end) 行并还原为 float32"""
+        if self.quantized:
+            return dequantize_int8(self.vectors[start:end], self.scales[start:end])
+        return np.asarray(self.vectors[start:end], dtype=np.float32)
+
+    def _score_rows(self, start: int, end: int, queries: np.ndarray) -> np.ndarray:
+        """[start, end) 行与查询的内积 (Q, end-start)
+
+        float32 直接在内存映射上做乘法；float16/int8 需转为 float32 才能走 BLAS，
+        按 CAST_BLOCK_ROWS 分段转换，不会复制整块矩阵。int8 的逐行 scale
+        在乘法之后作用于得分，不还原向量。
+        """
+        if self.dtype == np.float32:
+            return queries @ np.asarray(self.vectors[start:end]).T
+        result = np.empty((len(queries), end - start), dtype=np.float32)
+        for part in range(start, end, self.CAST_BLOCK_ROWS):
+            part_end = min(part + self.CAST_BLOCK_ROWS, end)
+            block = self.vectors[part:part_end].astype(np.float32)
+            result[:, part - start:part_end - start] = queries @ block.T
+        if self.quantized:
+            result *= np.asarray(self.scales[start:end])
+        return result
+
+    # ---------- 写入 ----------
+
+    def upsert(self, ids: Sequence[str], vectors, metadatas: Sequence[dict]):
+        """写入向量；ID 已存在时旧行标记删除、追加新行"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(ids) == 0:
+            return
+        # 同一批中重复的 ID 只保留最后一条，避免留下指向同一 ID 的多个有效行
+        last = {record_id: i for i, record_id in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            ids = [ids[i] for i in keep]
+            vectors = vectors[keep]
+            metadatas = [metadatas[i] for i in keep]
+        with self._lock:
+            row_map = self._row_map()
+            for record_id in ids:
+                old_row = row_map.get(record_id)
+                if old_row is not None and self.alive[old_row]:
+                    self.alive[old_row] = False
+                    self.alive_count -= 1
+
+            needed = self.count + len(ids)
+            if needed > self.capacity:
+                capacity = max(self.capacity, self.INITIAL_CAPACITY)
+                while capacity < needed:
+                    capacity *= 2
+                self._allocate(capacity)
+
+            start, end = self.count, needed
+            self._write_rows(start, vectors)
+            with open(self._path("meta.jsonl"), "ab") as f:
+                for offset, (record_id, metadata) in enumerate(zip(ids, metadatas)):
+                    self.offsets[start + offset] = f.tell()
+                    line = json.dumps({"id": record_id, "metadata": metadata}, ensure_ascii=False)
+                    f.write((line + "\n").encode("utf-8"))
+                    row_map[record_id] = start + offset
+            self.alive[start:end] = True
+            self.count = end
+            self.alive_count += len(ids)
+            self._save_state()
+            # 覆盖写入同样会留下无效行
+            self._maybe_compact()
+
+    def delete(self, ids: Sequence[str]) -> int:
+        """按 ID 删除，返回实际删除的条数"""
+        with self._lock:
+            row_map = self._row_map()
+            removed = 0
+            for record_id in ids:
+                row = row_map.pop(record_id, None)
+                if row is not None and self.alive[row]:
+                    self.alive[row] = False
+                    removed += 1
+            if removed:
+                self.alive_count -= removed
+                self._save_state()
+                self._maybe_compact()
+            return removed
+
+    def _maybe_compact(self):
+        """无效行过多时压缩，避免查询扫描大量已删除数据"""
+        if self.count > self.INITIAL_CAPACITY and self.alive_count < self.count // 2:
+            self.compact()
+
+    def compact(self):
+        """重建索引文件，去掉已删除的行"""
+        self.convert(self.dtype.name)
+
+    def convert(self, dtype: str):
+        """以新的存储格式重写索引并去掉已删除的行（已量化的数据不会恢复精度）"""
+        with self._lock:
+            records = list(self._iter_records())
+            rows = [row for row, _, _ in records]
+            matrix = self._decode_rows(0, self.count)[rows] if rows else np.empty((0, self.dim), np.float32)
+            self._reset_files(dtype)
+            if records:
+                self.upsert([record_id for _, record_id, _ in records], matrix,
+                            [metadata for _, _, metadata in records])
+
+    def _reset_files(self, dtype: Optional[str] = None):
+        """删除所有索引文件并重新创建空索引（可同时更换存储格式）"""
+        self.vectors = self.alive = self.offsets = self.scales = None
+        for name in ("vectors.npy", "alive.npy", "offsets.npy", "scales.npy",
+                     "meta.jsonl", "state.json"):
+            path = self._path(name)
+            if path.exists():
+                path.unlink()
+        self._id_to_row = None
+        if dtype is not None:
+            self.dtype = np.dtype(dtype)
+        self._open()
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self._reset_files()
+
+    # ---------- 查询 ----------
+
+    def __len__(self) -> int:
+        return self.alive_count
+
+    def search(self, query: np.ndarray, k: int,
+               where: Optional[dict] = None) -> List[Tuple[float, str, dict]]:
+        """精确 top-k 检索，返回 [(内积, id, metadata)]，按得分降序
+
+        where 为元数据等值过滤条件。
+        """
+        return self.search_many(np.asarray(query, dtype=np.float32).reshape(1, -1), k, where)[0]
+
+    def search_many(self, queries: np.ndarray, k: int,
+                    where: Optional[dict] = None) -> List[List[Tuple[float, str, dict]]]:
+        """批量精确 top-k 检索（每块数据只读一次），每条查询一个结果列表"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        # 得分与元数据读取在同一把锁内完成，期间的写入/压缩不会改变行号
+        with self._lock:
+            mask = None if where is None else self._where_mask(where)
+            top = self._top_rows(queries, k, mask)
+            records = self._read_metadata([int(row) for rows, _ in top for row in rows])
+            return [[(float(score), *records[int(row)]) for row, score in zip(rows, scores)]
+                    for rows, scores in top]
+
+    def _where_mask(self, where: dict) -> np.ndarray:
+        """满足元数据等值条件的行（顺序读取一遍 meta.jsonl）"""
+        mask = np.zeros(self.count, dtype=np.bool_)
+        for row, _, metadata in self._iter_records():
+            if all(metadata.get(key) == value for key, value in where.items()):
+                mask[row] = True
+        return mask
+
+    def _top_rows(self, queries: np.ndarray, k: int,
+                  mask: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """逐块计算得分并维护每条查询的 top-k，返回每条查询的 (行号, 得分)，按得分降序
+
+        峰值内存为 查询数 × (SCORE_BLOCK_ROWS + k)，与索引大小无关；
+        mask 为额外的行过滤。调用方需持有锁。
+        """
+        count = len(queries)
+        best_scores = np.empty((count, 0), dtype=np.float32)
+        best_rows = np.empty((count, 0), dtype=np.int64)
+        if k <= 0:
+            return [(rows, scores) for rows, scores in zip(best_rows, best_scores)]
+        for start in range(0, self.count, self.SCORE_BLOCK_ROWS):
+            end = min(start + self.SCORE_BLOCK_ROWS, self.count)
+            scores = self._score_rows(start, end, queries)
+            valid = np.asarray(self.alive[start:end])
+            if mask is not None:
+                valid = valid & mask[start:end]
+            scores[:, ~valid] = -np.inf
+            rows = np.broadcast_to(np.arange(start, end, dtype=np.int64), scores.shape)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+
+        results = []
+        for rows, scores in zip(best_rows, best_scores):
+            order = np.argsort(-scores, kind="stable")
+            order = order[np.isfinite(scores[order])]
+            results.append((rows[order], scores[order]))
+        return results
+
+    def get_all(self) -> List[Tuple[str, dict]]:
+        """所有有效记录 [(id, metadata)]"""
+        with self._lock:
+            return [(record_id, metadata) for _, record_id, metadata in self._iter_records()]
+
+    def get_matrix(self) -> Tuple[List[str], np.ndarray]:
+        """所有有效行的 (ids, float32 矩阵)"""
+        with self._lock:
+            records = list(self._iter_records())
+            rows = [row for row, _, _ in records]
+            matrix = (self._decode_rows(0, self.count)[rows] if rows
+                      else np.empty((0, self.dim), dtype=np.float32))
+            return [record_id for _, record_id, _ in records], matrix
@@ -0,0 +1,162 @@
+# folder_sync.py
+"""增量文件夹同步
+
+清单记录每个已同步文件的 (路径, 大小, 修改时间, 内容哈希)。同步时只遍历目录并 stat：
+大小和修改时间都没变的文件直接跳过（不读取内容）；新增或变化的文件才计算哈希，
+内容真的变了才重新编码，文件删除时同时删除对应的向量。论文原地入库，不移动文件。
+"""
+import os
+from typing import Callable, Dict, List, Optional
+from .file_utils import FileUtils, IMAGE_EXTENSIONS
+from .ingest import ingest_images, ingest_paper
+from . import profiling
+
+# 同步类型 → 扩展名；类型名与入库清单中的 kind 一致
+SYNC_EXTENSIONS = {
+    "paper": {".pdf"},
+    "image": IMAGE_EXTENSIONS,
+}
+
+# 结果回调: (路径, 状态 "added"/"updated"/"removed"/"skipped"/"failed", 说明)；
+# dry_run 时状态为 "added"/"modified"/"deleted"
+SyncCallback = Callable[[str, str, str], None]
+
+def plan_sync(root: str, kind: str, manifest, scanned: Dict[str, tuple]) -> Dict[str, list]:
+    """对比目录现状与清单，返回 {"added", "modified", "deleted", "unchanged"} 路径列表"""
+    known = manifest.synced_files(kind, root)
+    plan = {"added": [], "modified": [], "deleted": [], "unchanged": []}
+    for path, stat in scanned.items():
+        entry = known.get(path)
+        if entry is None:
+            plan["added"].append(path)
+        elif (entry[0], entry[1]) != stat:
+            plan["modified"].append(path)
+        else:
+            plan["unchanged"].append(path)
+    plan["deleted"] = [path for path in known if path not in scanned]
+    plan["known"] = known
+    return plan
+
+def sync_folder(root: str, kind: str, manifest, load: Callable[[str], object],
+                topics: Optional[List[str]] = None, dry_run: bool = False,
+                scanned: Optional[Dict[str, tuple]] = None,
+                on_result: Optional[SyncCallback] = None) -> Dict[str, int]:
+    """同步一个目录中的一类文件（"paper" 或 "image"）
+
+    load(name) 按需返回组件（"vector_db"、"text_processor"、"image_processor"、"classifier"），
+    没有变化时不会加载任何模型。
+    """
+    def report(path, status, message=""):
+        if on_result is not None:
+            on_result(path, status, message)
+
+    root = os.path.abspath(root)
+    if scanned is None:
+        with profiling.span("sync.scan"):
+            scanned = FileUtils.scan_files(root, SYNC_EXTENSIONS[kind])
+    plan = plan_sync(root, kind, manifest, scanned)
+    known = plan["known"]
+    summary = {"scanned": len(scanned), "unchanged": len(plan["unchanged"]),
+               "added": 0, "updated": 0, "touched": 0, "removed": 0, "failed": 0}
+    if dry_run:
+        for status in ("added", "modified", "deleted"):
+            for path in plan[status]:
+                report(path, status, "")
+        summary.update(added=len(plan["added"]), updated=len(plan["modified"]),
+                       removed=len(plan["deleted"]))
+        return summary
+    if not plan["added"] and not plan["modified"] and not plan["deleted"]:
+        return summary
+
+    # 只对新增和大小/修改时间变化的文件计算哈希
+    hashes: Dict[str, str] = {}
+    with profiling.span("sync.hash"):
+        for path in plan["added"] + plan["modified"]:
+            try:
+                hashes[path] = FileUtils.compute_file_hash(path)
+            except OSError as e:
+                summary["failed"] += 1
+                report(path, "failed", str(e))
+
+    # 只是修改时间变了（内容相同）：更新清单即可
+    touched = [path for path in plan["modified"]
+               if path in hashes and hashes[path] == known[path][2]]
+    manifest.record_synced(kind, [(path, *scanned[path], hashes[path]) for path in touched])
+    summary["touched"] = len(touched)
+
+    # 旧内容不再对应任何文件：删除向量。向量只属于清单中登记的来源路径，
+    # 来源是别的文件（例如 add_images 入库的同一张图）时保留
+    stale = [path for path in plan["modified"] if path in hashes and path not in touched]
+    gone = set(plan["deleted"]) | set(stale)
+    reingest = set()
+    old_hashes = {known[path][2] for path in gone}
+    current_hashes = {known[path][2] for path in plan["unchanged"]} | set(hashes.values())
+    vector_db = load("vector_db") if gone or plan["added"] else None
+    for content_hash in old_hashes:
+        entry = vector_db.manifest.get(kind, content_hash)
+        if entry is None or entry["source"] not in gone:
+            continue
+        if kind == "paper":
+            vector_db.remove_paper(content_hash)
+        else:
+            vector_db.remove_images([content_hash])
+        # 同样内容的其它文件仍在：以它为来源重新入库
+        if content_hash in current_hashes:
+            reingest.update(path for path in plan["unchanged"] if known[path][2] == content_hash)
+    for path in plan["deleted"]:
+        report(path, "removed", "")
+    manifest.remove_synced(kind, plan["deleted"])
+    summary["removed"] = len(plan["deleted"])
+
+    for path in reingest:
+        hashes[path] = known[path][2]
+    pending = [path for path in plan["added"] + stale + sorted(reingest) if path in hashes]
+    new_paths = set(plan["added"])
+    if not pending:
+        return summary
+
+    synced = []
+
+    def record(path, status, message=""):
+        if status == "failed":
+            # 失败的文件不登记，下次同步重试
+            summary["failed"] += 1
+        else:
+            synced.append((path, *scanned[path], hashes[path]))
+            if path in new_paths:
+                summary["added"] += 1
+            elif path not in reingest:
+                summary["updated"] += 1
+                if status == "added":
+                    status = "updated"
+        report(path, status, message)
+
+    if kind == "image":
+        def commit():
+            # 每批写库后提交一次同步状态，中断后下次同步只处理剩余文件
+            manifest.record_synced(kind, synced)
+            synced.clear()
+
+        ingest_images(pending, load("image_processor"), vector_db,
+                      on_result=record, on_progress=lambda processed: commit(),
+                      content_hashes=hashes)
+        commit()
+    else:
+        text_processor = load("text_processor")
+        classifier = load("classifier")
+        for path in pending:
+            try:
+                result = ingest_paper(path, text_processor, vector_db, classifier, topics,
+                                      move=False, content_hash=hashes[path])
+            except Exception as e:
+                record(path, "failed", str(e))
+                continue
+            if result["status"] == "failed":
+                record(path, "failed", "添加到数据库失败")
+            else:
+                # 无法提取文本的PDF也登记，避免每次同步都重新解析
+                record(path, "added" if result["status"] == "added" else "skipped",
+                       result["topic"])
+            manifest.record_synced(kind, synced)
+            synced.clear()
+    return summary
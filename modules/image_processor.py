@@ -1,19 +1,31 @@
 # image_processor.py
 import torch
 import torchvision.transforms as transforms
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import numpy as np
-from transformers import CLIPProcessor, CLIPModel
-from typing import List
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 import config
+from . import model_registry, profiling
+from .embedding_cache import EmbeddingCache, cached_encode, get_default_cache
+from .batcher import MicroBatcher
 
 class ImageProcessor:
     """图像处理模块"""
     
-    def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model = CLIPModel.from_pretrained(config.IMAGE_MODEL_NAME).to(self.device)
-        self.processor = CLIPProcessor.from_pretrained(config.IMAGE_MODEL_NAME)
+    def __init__(self, cache: Optional[EmbeddingCache] = None, micro_batching: bool = False):
+        # 通过注册表获取，CLI/Web 中的多个实例共享同一份 CLIP 模型
+        self.model, self.processor = model_registry.get_clip_model(config.IMAGE_MODEL_NAME)
+        # 以实际加载的后端为准（ONNX 加载失败回退 PyTorch 时可能在 GPU 上）
+        self.device = model_registry.model_device(self.model)
+        # 缓存按 模型名@推理后端 区分，PyTorch 与 ONNX(int8) 的向量互不复用
+        self.cache_model_name = (f"{config.IMAGE_MODEL_NAME}@"
+                                 f"{model_registry.backend_name(self.model)}#text")
+        # 旧版 transformers 中图像预处理器名为 feature_extractor
+        self.image_preprocessor = (getattr(self.processor, "image_processor", None)
+                                   or self.processor.feature_extractor)
+        crop_size = getattr(self.image_preprocessor, "crop_size", 224)
+        self.input_size = crop_size.get("height", 224) if isinstance(crop_size, dict) else crop_size
         
         # 图像预处理
         self.transform = transforms.Compose([
@@ -24,53 +36,152 @@ class ImageProcessor:
                 std=[0.229, 0.224, 0.225]
             )
         ])
+        # 文本查询向量缓存（图片向量由内容哈希清单去重，不走这里）
+        self.cache = cache if cache is not None else get_default_cache()
+        # 并发查询合并（Web 应用开启）：多个线程的以文搜图查询合并为一次前向计算
+        self.query_batcher = (MicroBatcher(self.encode_texts_for_image_search,
+                                           name="image-query-batcher")
+                              if micro_batching else None)
         print(f"Image model loaded on {self.device}")
     
+    @profiling.timed("image.decode")
+    def _load_pixels(self, image_path: str) -> np.ndarray:
+        """解码并预处理单张图片，返回 pixel_values（可在工作线程中执行）"""
+        with Image.open(image_path) as image:
+            # JPEG 可在解码阶段直接降采样，大图解码速度提升明显
+            image.draft("RGB", (self.input_size, self.input_size))
+            image = image.convert("RGB")
+        inputs = self.image_preprocessor(images=image, return_tensors="np")
+        return inputs["pixel_values"][0]
+    
+    def preprocess_image(self, image_path: str) -> Tuple[Optional[np.ndarray], Optional[str]]:
+        """解码并预处理单张图片，返回 (pixel_values, 错误信息)，失败时不抛出异常
+
+        与 encode_pixel_batch 一起构成 iter_image_batches 的两个阶段，可单独计时。
+        """
+        try:
+            return self._load_pixels(image_path), None
+        except Exception as e:
+            return None, str(e)
+    
+    @profiling.timed("image.encode")
+    def encode_pixel_batch(self, pixel_values: np.ndarray) -> np.ndarray:
+        """对一批 pixel_values 做一次前向计算（L2归一化）"""
+        with torch.no_grad():
+            image_features = self.model.get_image_features(
+                torch.from_numpy(pixel_values).to(self.device)
+            )
+            # L2 归一化 - 关键修复！
+            image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+            return image_features.cpu().numpy()
+    
     def encode_image(self, image_path: str) -> np.ndarray:
         """编码单个图像为向量（L2归一化）"""
         try:
-            image = Image.open(image_path).convert("RGB")
-            inputs = self.processor(images=image, return_tensors="pt", padding=True)
-            
-            with torch.no_grad():
-                image_features = self.model.get_image_features(
-                    inputs["pixel_values"].to(self.device)
-                )
-                # L2 归一化 - 关键修复！
-                image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-                embedding = image_features.cpu().numpy()[0]
-            
-            return embedding
+            pixel_values = self._load_pixels(image_path)
+            return self.encode_pixel_batch(pixel_values[np.newaxis])[0]
         except Exception as e:
             print(f"❌ 处理图片失败 {image_path}: {e}")
             return np.zeros(config.IMAGE_EMBEDDING_DIM)
     
+    def iter_image_batches(self, image_paths: Sequence[str], batch_size: int = None,
+                           num_workers: int = None
+                           ) -> Iterator[Tuple[List[str], np.ndarray, Dict[str, str]]]:
+        """流式批量编码图像
+        
+        线程池并行解码/缩放，下一批的解码与当前批的前向计算重叠进行；
+        每批只调用一次 get_image_features。
+        逐批产出 (成功的路径, 对应的向量矩阵, {失败路径: 错误信息})。
+        """
+        batch_size = batch_size or config.BATCH_SIZE
+        num_workers = num_workers or config.IMAGE_DECODE_WORKERS
+        paths = list(image_paths)
+        batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+        if not batches:
+            return
+        
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            pending = [pool.submit(self.preprocess_image, p) for p in batches[0]]
+            for index, batch in enumerate(batches):
+                current = pending
+                if index + 1 < len(batches):
+                    pending = [pool.submit(self.preprocess_image, p)
+                               for p in batches[index + 1]]
+                
+                ok_paths, pixels, failed = [], [], {}
+                for path, future in zip(batch, current):
+                    pixel_values, error = future.result()
+                    if error is None:
+                        ok_paths.append(path)
+                        pixels.append(pixel_values)
+                    else:
+                        failed[path] = error
+                
+                if not pixels:
+                    yield ok_paths, np.empty((0, config.IMAGE_EMBEDDING_DIM), dtype=np.float32), failed
+                    continue
+                
+                try:
+                    embeddings = self.encode_pixel_batch(np.stack(pixels))
+                except Exception:
+                    # 整批前向失败时逐张重试，避免一张坏图拖垮整批
+                    kept_paths, kept = [], []
+                    for path, pixel_values in zip(ok_paths, pixels):
+                        try:
+                            kept.append(self.encode_pixel_batch(pixel_values[np.newaxis])[0])
+                            kept_paths.append(path)
+                        except Exception as e:
+                            failed[path] = str(e)
+                    ok_paths = kept_paths
+                    embeddings = (np.stack(kept) if kept else
+                                  np.empty((0, config.IMAGE_EMBEDDING_DIM), dtype=np.float32))
+                
+                yield ok_paths, embeddings, failed
+    
     def encode_images(self, image_paths: List[str]) -> List[np.ndarray]:
-        """批量编码图像（L2归一化）"""
-        embeddings = []
-        for path in image_paths:
-            embedding = self.encode_image(path)
-            embeddings.append(embedding)
-        return embeddings
+        """批量编码图像（L2归一化），失败的图片返回零向量"""
+        results = {}
+        for ok_paths, embeddings, failed in self.iter_image_batches(image_paths):
+            for path, embedding in zip(ok_paths, embeddings):
+                results[path] = embedding
+            for path, error in failed.items():
+                print(f"❌ 处理图片失败 {path}: {error}")
+        return [results.get(path, np.zeros(config.IMAGE_EMBEDDING_DIM))
+                for path in image_paths]
     
     def encode_text_for_image_search(self, text: str) -> np.ndarray:
         """编码文本用于图像搜索（L2归一化）"""
-        inputs = self.processor(
-            text=[text],
-            return_tensors="pt",
-            padding=True,
-            truncation=True
+        if self.query_batcher is not None:
+            return self.query_batcher.submit(text)
+        return self.encode_texts_for_image_search([text])[0]
+    
+    def encode_texts_for_image_search(self, texts: List[str]) -> np.ndarray:
+        """批量编码查询文本用于图像搜索，返回 N×D 矩阵（命中缓存的文本不再计算）"""
+        return cached_encode(
+            self.cache, self.cache_model_name, texts, self._encode_query_texts
         )
+    
+    def _encode_query_texts(self, texts: List[str]) -> np.ndarray:
+        """对查询文本做前向计算（L2归一化），每 QUERY_BATCH_SIZE 条一次"""
+        batch_size = config.QUERY_BATCH_SIZE
+        if len(texts) > batch_size:
+            return np.concatenate([self._encode_query_texts(texts[start:start + batch_size])
+                                   for start in range(0, len(texts), batch_size)])
         
-        with torch.no_grad():
+        with profiling.span("image.encode_query"), torch.no_grad():
+            inputs = self.processor(
+                text=texts,
+                return_tensors="pt",
+                padding=True,
+                truncation=True
+            )
             text_features = self.model.get_text_features(
-                inputs["input_ids"].to(self.device)
+                input_ids=inputs["input_ids"].to(self.device),
+                attention_mask=inputs["attention_mask"].to(self.device)
             )
             # L2 归一化 - 关键修复！
             text_features = text_features / text_features.norm(dim=-1, keepdim=True)
-            embedding = text_features.cpu().numpy()[0]
-        
-        return embedding
+            return text_features.cpu().numpy()
     
     def compute_similarity(self, image_embedding: np.ndarray, text_embedding: np.ndarray) -> float:
         """计算余弦相似度"""
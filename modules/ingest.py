@@ -0,0 +1,173 @@
+# ingest.py
+import itertools
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import config
+from .file_utils import FileUtils
+
+# 进度回调: (图片路径, 状态 "added"/"skipped"/"failed", 说明)
+ResultCallback = Callable[[str, str, str], None]
+# 批次进度回调: (已处理数量)；每处理完一批调用一次，可用于更新进度或让出CPU
+ProgressCallback = Callable[[int], None]
+
+def image_metadata(image_path: str) -> dict:
+    """生成图片的基础元数据"""
+    path = Path(image_path)
+    return {
+        "filename": path.name,
+        "path": str(path),
+        "size": f"{path.stat().st_size} bytes",
+        "format": path.suffix[1:].upper()
+    }
+
+def ingest_images(image_paths: List[str], image_processor, vector_db,
+                  on_result: Optional[ResultCallback] = None,
+                  on_progress: Optional[ProgressCallback] = None,
+                  content_hashes: Optional[Dict[str, str]] = None) -> Dict[str, int]:
+    """批量入库图片：先按内容哈希跳过已入库文件，再分批编码写入
+
+    on_progress 在每批编码后以已处理的图片数（含跳过与失败）调用；
+    编码结果攒够 DB_WRITE_BATCH_SIZE 才写库，on_result 的 "added" 只在写库后报告。
+    调用方已计算过内容哈希时可通过 content_hashes（路径 → 哈希）传入，不再重复读取文件。
+    """
+    def report(path, status, message=""):
+        if on_result is not None:
+            on_result(path, status, message)
+
+    summary = {"total": len(image_paths), "added": 0, "skipped": 0, "failed": 0}
+
+    # 每个文件只做一次哈希；已入库或本次重复的内容不再编码
+    hashes = {}
+    seen = set()
+    known_hashes = content_hashes or {}
+    for path in image_paths:
+        try:
+            content_hash = known_hashes.get(path) or FileUtils.compute_file_hash(path)
+        except OSError as e:
+            summary["failed"] += 1
+            report(path, "failed", str(e))
+            continue
+        if content_hash in seen or vector_db.is_image_indexed(content_hash):
+            summary["skipped"] += 1
+            report(path, "skipped", "已入库")
+            continue
+        seen.add(content_hash)
+        hashes[path] = content_hash
+
+    # 编码结果先在内存中累积，攒够 DB_WRITE_BATCH_SIZE 再整批写库
+    pending_paths: List[str] = []
+    pending_embeddings: List[np.ndarray] = []
+
+    def flush():
+        if not pending_paths:
+            return
+        matrix = np.concatenate(pending_embeddings)
+        ok = vector_db.add_images(pending_paths, matrix,
+                                  [image_metadata(p) for p in pending_paths],
+                                  [hashes[p] for p in pending_paths])
+        for path in pending_paths:
+            if ok:
+                summary["added"] += 1
+                report(path, "added", "")
+            else:
+                summary["failed"] += 1
+                report(path, "failed", "添加到数据库失败")
+        pending_paths.clear()
+        pending_embeddings.clear()
+
+    processed = summary["total"] - len(hashes)
+    for ok_paths, embeddings, failed in image_processor.iter_image_batches(list(hashes)):
+        for path, error in failed.items():
+            summary["failed"] += 1
+            report(path, "failed", error)
+
+        if ok_paths:
+            pending_paths.extend(ok_paths)
+            pending_embeddings.append(embeddings)
+        if len(pending_paths) >= config.DB_WRITE_BATCH_SIZE:
+            flush()
+        processed += len(ok_paths) + len(failed)
+        if on_progress is not None:
+            on_progress(processed)
+    flush()
+
+    return summary
+
+def ingest_paper(pdf_path: str, text_processor, vector_db, classifier,
+                 topics: Optional[List[str]] = None,
+                 on_progress: Optional[ProgressCallback] = None,
+                 move: bool = True, content_hash: Optional[str] = None) -> Dict[str, str]:
+    """入库单篇论文（流式）
+
+    PDF 只打开一次：开头几页用于分类并被缓存，随后逐页切块、
+    按批编码并写库，峰值内存与文档页数无关。文件在全部写入后才移动。
+
+    on_progress 在每批写入后以累计chunk数调用。
+    move=False 时原地入库（文件夹同步），不移动到主题文件夹；
+    调用方已计算过内容哈希时可通过 content_hash 传入。
+    返回 {"status": "added"/"skipped"/"empty"/"failed", "topic", "target_path"}
+    """
+    path = Path(pdf_path)
+    result = {"status": "failed", "topic": "", "target_path": ""}
+
+    # 内容未变化的论文直接跳过，不再重复编码
+    if content_hash is None:
+        content_hash = FileUtils.compute_file_hash(str(path))
+    if vector_db.is_paper_indexed(content_hash):
+        result["status"] = "skipped"
+        return result
+
+    with FileUtils.open_pdf(str(path)) as document:
+        # 分类（只读取开头几页，这些页会被切块阶段复用）
+        topic = classifier.classify_document(document, topics)
+
+        batches = text_processor.iter_document_batches(document)
+        first_batch = next(batches, None)
+        if first_batch is None:
+            result["status"] = "empty"
+            return result
+        result["topic"] = topic
+
+        # 先确定整理后的路径（原子占位），文本块直接以最终路径为来源写入
+        target_path = FileUtils.resolve_target_path(str(path), topic) if move else str(path)
+        metadata = {
+            "title": path.stem,
+            "topic": topic,
+            "original_path": str(path),
+            "organized_path": target_path
+        }
+
+        def discard():
+            # 前面批次已写入的chunk和累计的中心向量一并删除，不留下半篇论文
+            vector_db.remove_paper(content_hash)
+            if move:
+                FileUtils.release_target_path(target_path)
+
+        chunk_count = 0
+        try:
+            for chunks, embeddings, chunk_metadatas in itertools.chain([first_batch], batches):
+                if not vector_db.add_paper_chunks(target_path, chunks, embeddings, metadata,
+                                                  content_hash, start_index=chunk_count,
+                                                  chunk_metadatas=chunk_metadatas):
+                    discard()
+                    return result
+                chunk_count += len(chunks)
+                if on_progress is not None:
+                    on_progress(chunk_count)
+        except Exception:
+            discard()
+            raise
+
+    # 文档关闭后再移动文件（Windows 上无法移动已打开的文件）；
+    # 移动或登记失败同样回滚，chunk 和清单记录不会指向不存在的文件
+    try:
+        if move:
+            FileUtils.organize_file(str(path), topic, target_path)
+        vector_db.mark_paper_indexed(content_hash, target_path, chunk_count)
+    except Exception:
+        discard()
+        raise
+    result["target_path"] = target_path
+    result["status"] = "added"
+    return result
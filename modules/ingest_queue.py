@@ -0,0 +1,273 @@
+# ingest_queue.py
+import itertools
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+import config
+from .ingest import ingest_images, ingest_paper
+from . import metrics
+
+class IngestJob:
+    """一个后台入库任务（一篇论文或一批图片）"""
+
+    def __init__(self, job_id: int, kind: str, name: str, total: int = 0):
+        self.job_id = job_id
+        self.kind = kind
+        self.name = name
+        self.status = "queued"      # queued / running / done / failed
+        self.done = 0
+        self.total = total          # 论文任务事先不知道chunk总数，为 0
+        self.message = ""
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "name": self.name,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "message": self.message,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class IngestQueue:
+    """Web 上传的后台入库队列
+
+    上传文件按块流式复制到 INGEST_UPLOAD_DIR 后立即返回任务编号，
+    由工作线程池完成提取、分类、编码与写库。前台有检索请求时，
+    工作线程在批次之间暂停（最多 INGEST_YIELD_MAX_S 秒），把CPU让给检索。
+    任务结束时删除暂存副本：论文入库后已移动到主题目录，入库成功的图片以暂存路径
+    作为图库文件保留，其余（跳过、失败）一律删除。
+    """
+
+    # 任务类型 → 指标中的操作名（耗时与结果在任务结束时记录）
+    METRIC_OPERATIONS = {"paper": "add_paper", "images": "add_images"}
+
+    STATUS_ICONS = {"queued": "⏳", "running": "⚙️", "done": "✅", "failed": "❌"}
+
+    def __init__(self, text_processor, image_processor, vector_db, classifier,
+                 workers: int = None, upload_dir: str = None):
+        self.text_processor = text_processor
+        self.image_processor = image_processor
+        self.vector_db = vector_db
+        self.classifier = classifier
+        self.upload_dir = Path(upload_dir or config.INGEST_UPLOAD_DIR)
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers or config.INGEST_WORKERS,
+                                            thread_name_prefix="ingest",
+                                            initializer=self._lower_priority)
+        self._jobs: Dict[int, IngestJob] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # 没有前台请求时置位；工作线程在批次之间等待它
+        self._idle = threading.Event()
+        self._idle.set()
+        self._foreground = 0
+
+    @staticmethod
+    def _lower_priority():
+        """降低工作线程的调度优先级（Linux 上按线程生效，其它平台忽略）"""
+        if config.INGEST_NICE and hasattr(os, "setpriority") and hasattr(threading, "get_native_id"):
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), config.INGEST_NICE)
+            except OSError:
+                pass
+
+    # ---------- 前台让步 ----------
+
+    @contextmanager
+    def foreground(self):
+        """标记一次前台请求（检索），期间后台任务在批次之间暂停"""
+        with self._lock:
+            self._foreground += 1
+            self._idle.clear()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._foreground -= 1
+                if self._foreground == 0:
+                    self._idle.set()
+
+    def _yield_to_foreground(self):
+        self._idle.wait(timeout=config.INGEST_YIELD_MAX_S)
+
+    # ---------- 提交 ----------
+
+    def stage_upload(self, file, subdir: str = "") -> Path:
+        """把上传文件按块流式复制到上传目录（不整体读入内存），返回保存路径"""
+        source_path = getattr(file, "name", None) or str(file)
+        target_dir = self.upload_dir / subdir
+        target_dir.mkdir(parents=True, exist_ok=True)
+        target = target_dir / Path(source_path).name
+        counter = 1
+        while target.exists():
+            target = target_dir / f"{Path(source_path).stem}_{counter}{Path(source_path).suffix}"
+            counter += 1
+
+        if os.path.isfile(source_path):
+            with open(source_path, "rb") as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst, config.INGEST_COPY_CHUNK_BYTES)
+        else:
+            # 旧版 Gradio 传入的是类文件对象
+            with open(target, "wb") as dst:
+                shutil.copyfileobj(file, dst, config.INGEST_COPY_CHUNK_BYTES)
+        return target
+
+    def _new_job(self, kind: str, name: str, total: int = 0) -> IngestJob:
+        with self._lock:
+            job = IngestJob(next(self._ids), kind, name, total)
+            self._jobs[job.job_id] = job
+            # 只保留最近的任务记录
+            finished = [j for j in self._jobs.values() if j.status in ("done", "failed")]
+            for old in finished[:max(0, len(self._jobs) - config.INGEST_JOB_HISTORY)]:
+                del self._jobs[old.job_id]
+        return job
+
+    def submit_paper(self, file) -> IngestJob:
+        """上传一篇论文并加入队列"""
+        path = self.stage_upload(file)
+        job = self._new_job("paper", path.name)
+        self._executor.submit(self._run_paper, job, str(path))
+        return job
+
+    def submit_images(self, files) -> IngestJob:
+        """上传一批图片并加入队列"""
+        paths = [str(self.stage_upload(file, "images")) for file in files]
+        job = self._new_job("images", f"{len(paths)} 张图片", len(paths))
+        self._executor.submit(self._run_images, job, paths)
+        return job
+
+    # ---------- 执行 ----------
+
+    def _start(self, job: IngestJob):
+        job.status = "running"
+        job.started_at = time.time()
+
+    def _finish(self, job: IngestJob, status: str, message: str):
+        job.status = status
+        job.message = message
+        job.finished_at = time.time()
+        operation = self.METRIC_OPERATIONS[job.kind]
+        metrics.REQUESTS.inc(operation, "ok" if status == "done" else "error")
+        metrics.REQUEST_LATENCY.observe(job.finished_at - job.started_at, operation)
+
+    @staticmethod
+    def _discard(paths):
+        """删除暂存副本（已被移走的忽略）"""
+        for path in paths:
+            try:
+                Path(path).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"⚠️  无法删除暂存文件 {path}: {e}")
+
+    def _run_paper(self, job: IngestJob, path: str):
+        self._start(job)
+
+        def on_progress(chunk_count):
+            job.done = chunk_count
+            self._yield_to_foreground()
+
+        try:
+            result = ingest_paper(path, self.text_processor, self.vector_db,
+                                  self.classifier, on_progress=on_progress)
+        except Exception as e:
+            self._finish(job, "failed", f"处理失败: {e}")
+            return
+        finally:
+            # 入库成功时文件已移动到主题目录；跳过、无文本或失败时删除暂存副本
+            self._discard([path])
+
+        if result["status"] == "added":
+            self._finish(job, "done", f"分类: {result['topic']}，保存到: {result['target_path']}")
+        elif result["status"] == "skipped":
+            self._finish(job, "done", "该论文内容已入库，跳过")
+        elif result["status"] == "empty":
+            self._finish(job, "failed", "无法提取文本内容")
+        else:
+            self._finish(job, "failed", "添加到数据库失败")
+
+    def _run_images(self, job: IngestJob, paths: List[str]):
+        self._start(job)
+        failures = []
+        added = set()
+
+        def on_result(path, status, message):
+            if status == "added":
+                added.add(path)
+            elif status == "failed":
+                failures.append(f"{Path(path).name}: {message}")
+
+        def on_progress(processed):
+            job.done = processed
+            self._yield_to_foreground()
+
+        try:
+            summary = ingest_images(paths, self.image_processor, self.vector_db,
+                                    on_result=on_result, on_progress=on_progress)
+        except Exception as e:
+            self._finish(job, "failed", f"处理失败: {e}")
+            return
+        finally:
+            # 向量库记录的是暂存路径，入库成功的图片保留；重复或失败的删除（Web 任务不重试）
+            self._discard([path for path in paths if path not in added])
+
+        job.done = summary["total"]
+        message = f"新增 {summary['added']}，跳过 {summary['skipped']}，失败 {summary['failed']}"
+        if failures:
+            message += "；" + "；".join(failures[:5])
+        self._finish(job, "failed" if summary["failed"] == summary["total"] else "done", message)
+
+    # ---------- 查询 ----------
+
+    def get(self, job_id: int) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def list_jobs(self, limit: int = 20) -> List[dict]:
+        """最近的任务（新的在前）"""
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda j: j.job_id, reverse=True)[:limit]
+            return [job.to_dict() for job in jobs]
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        result = {status: 0 for status in self.STATUS_ICONS}
+        with self._lock:
+            for job in self._jobs.values():
+                result[job.status] += 1
+        return result
+
+    def format_status(self, limit: int = 10) -> str:
+        """Markdown 形式的任务列表（Web 页面轮询显示）"""
+        jobs = self.list_jobs(limit)
+        if not jobs:
+            return "暂无入库任务"
+        lines = ["| # | 类型 | 文件 | 状态 | 进度 | 说明 |", "|---|---|---|---|---|---|"]
+        for job in jobs:
+            if job["total"]:
+                progress = f"{job['done']}/{job['total']}"
+            else:
+                progress = f"{job['done']} chunks" if job["done"] else "-"
+            kind = "论文" if job["kind"] == "paper" else "图片"
+            icon = self.STATUS_ICONS.get(job["status"], "")
+            lines.append(f"| {job['job_id']} | {kind} | {job['name']} | {icon} {job['status']} | "
+                         f"{progress} | {job['message']} |")
+        return "\n".join(lines)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,223 @@
+# job_journal.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import config
+
+# 文件状态：pending（未处理）→ encoded（organize 已分类、未移动）→ written（已写库/已移动），或 failed
+# add_images 的向量只在写库后才持久，因此图片直接由 pending 变为 written
+FILE_STATUSES = ("pending", "encoded", "written", "failed")
+# 任务状态：running（运行中或进程异常退出）、interrupted（Ctrl+C 或出错）、done
+RESUMABLE_JOB_STATUSES = ("running", "interrupted")
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    """进程是否仍在运行"""
+    if not pid:
+        return False
+    if os.name == "nt":
+        # Windows 上 os.kill 会结束进程，改用 OpenProcess 查询
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobJournal:
+    """批量入库任务日志（SQLite）
+
+    add_images / organize 开始时把全部文件登记为 pending，处理过程中按批更新状态；
+    进程被杀或断电后，resume 只处理尚未写入的文件，不必重新遍历、哈希和编码。
+    运行中的任务记录所属进程号，进程仍在运行时 claim() 拒绝其它进程接手。
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = Path(db_path or config.JOB_JOURNAL_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        # WAL 下每次提交只追加日志，频繁的小批量更新开销很小
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                source TEXT,
+                options TEXT,
+                status TEXT NOT NULL,
+                created_at REAL,
+                updated_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS job_files (
+                job_id INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                detail TEXT,
+                updated_at REAL,
+                PRIMARY KEY (job_id, path)
+            );
+            CREATE INDEX IF NOT EXISTS job_files_status ON job_files (job_id, status);
+            """
+        )
+        # 旧版本的任务日志没有 owner_pid 列
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "owner_pid" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner_pid INTEGER")
+        self._conn.commit()
+
+    def create_job(self, kind: str, source: str, paths: Iterable[str],
+                   options: Optional[dict] = None) -> int:
+        """登记新任务及其全部文件（状态 pending），返回任务编号"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, source, options, status, created_at, updated_at, owner_pid) "
+                "VALUES (?, ?, ?, 'running', ?, ?, ?)",
+                (kind, source, json.dumps(options or {}), now, now, os.getpid())
+            )
+            job_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO job_files (job_id, path, status, updated_at) "
+                "VALUES (?, ?, 'pending', ?)",
+                [(job_id, str(path), now) for path in paths]
+            )
+            self._conn.commit()
+        return job_id
+
+    def mark_many(self, job_id: int, entries: List[Tuple[str, str, str]]):
+        """批量更新文件状态 [(路径, 状态, 说明)]，一次提交"""
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE job_files SET status = ?, detail = ?, updated_at = ? "
+                "WHERE job_id = ? AND path = ?",
+                [(status, detail, now, job_id, path) for path, status, detail in entries]
+            )
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (now, job_id))
+            self._conn.commit()
+
+    def set_job_status(self, job_id: int, status: str):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+                               (status, time.time(), job_id))
+            self._conn.commit()
+
+    def claim(self, job_id: int, force: bool = False) -> bool:
+        """由当前进程接手任务（状态置为 running）
+
+        任务正由另一个仍在运行的进程执行时返回 False；force=True 时忽略检查
+        （例如进程号已被无关进程复用）。
+        """
+        with self._lock:
+            # BEGIN IMMEDIATE 取得写锁，两个进程同时 claim 时只有一个能成功
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT status, owner_pid FROM jobs WHERE job_id = ?",
+                                         (job_id,)).fetchone()
+                if row is None:
+                    self._conn.rollback()
+                    return False
+                status, owner_pid = row
+                if (not force and status == "running" and owner_pid != os.getpid()
+                        and _pid_alive(owner_pid)):
+                    self._conn.rollback()
+                    return False
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', owner_pid = ?, updated_at = ? "
+                    "WHERE job_id = ?", (os.getpid(), time.time(), job_id))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return True
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self._JOB_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._job_dict(row) if row else None
+
+    def latest_resumable(self, kind: Optional[str] = None) -> Optional[Dict]:
+        """最近一个未完成、且没有被其它运行中的进程执行的任务"""
+        placeholders = ",".join("?" * len(RESUMABLE_JOB_STATUSES))
+        query = f"SELECT {self._JOB_COLUMNS} FROM jobs WHERE status IN ({placeholders})"
+        params: list = list(RESUMABLE_JOB_STATUSES)
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY job_id DESC", params).fetchall()
+        for row in rows:
+            job = self._job_dict(row)
+            if not job["live"]:
+                return job
+        return None
+
+    def list_jobs(self, limit: int = 20) -> List[Dict]:
+        """最近的任务（新的在前），附带各状态文件数"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._JOB_COLUMNS} FROM jobs ORDER BY job_id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        jobs = [self._job_dict(row) for row in rows]
+        for job in jobs:
+            job["counts"] = self.counts(job["job_id"])
+        return jobs
+
+    def counts(self, job_id: int) -> Dict[str, int]:
+        """各状态的文件数"""
+        result = {status: 0 for status in FILE_STATUSES}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM job_files WHERE job_id = ? GROUP BY status",
+                (job_id,)
+            ).fetchall()
+        result.update(dict(rows))
+        return result
+
+    def remaining(self, job_id: int, include_failed: bool = False) -> List[Tuple[str, str, Optional[str]]]:
+        """尚未写入的文件 [(路径, 状态, 说明)]，按登记顺序"""
+        statuses = ["pending", "encoded"] + (["failed"] if include_failed else [])
+        placeholders = ",".join("?" * len(statuses))
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT path, status, detail FROM job_files WHERE job_id = ? "
+                f"AND status IN ({placeholders}) ORDER BY rowid",
+                [job_id, *statuses]
+            ).fetchall()
+
+    _JOB_COLUMNS = "job_id, kind, source, options, status, created_at, updated_at, owner_pid"
+
+    @staticmethod
+    def _job_dict(row) -> Dict:
+        return {
+            "job_id": row[0],
+            "kind": row[1],
+            "source": row[2],
+            "options": json.loads(row[3] or "{}"),
+            "status": row[4],
+            "created_at": row[5],
+            "updated_at": row[6],
+            "owner_pid": row[7],
+            # 正由另一个仍在运行的进程执行
+            "live": row[4] == "running" and row[7] != os.getpid() and _pid_alive(row[7])
+        }
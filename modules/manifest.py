@@ -0,0 +1,186 @@
+# manifest.py
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import config
+
+class IngestManifest:
+    """已入库内容清单（按内容哈希记录，避免重复编码）"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = Path(db_path or config.MANIFEST_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Web 应用会在多个线程中访问，统一加锁
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ingested (
+                kind TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                source TEXT,
+                item_count INTEGER,
+                added_at REAL,
+                PRIMARY KEY (kind, content_hash)
+            )
+            """
+        )
+        # 文件夹同步状态：路径 → (大小, 修改时间, 内容哈希)；大小和修改时间不变的文件不再哈希
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS synced_files (
+                kind TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER,
+                mtime_ns INTEGER,
+                content_hash TEXT,
+                synced_at REAL,
+                PRIMARY KEY (kind, path)
+            )
+            """
+        )
+        # 持久化的状态标记（如论文中心向量是否完整），在写入时维护，查询时直接读取
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._conn.commit()
+
+    def contains(self, kind: str, content_hash: str) -> bool:
+        """判断内容是否已入库"""
+        return self.get(kind, content_hash) is not None
+
+    def get(self, kind: str, content_hash: str) -> Optional[Dict]:
+        """获取单条记录"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source, item_count, added_at FROM ingested "
+                "WHERE kind = ? AND content_hash = ?",
+                (kind, content_hash)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"source": row[0], "item_count": row[1], "added_at": row[2]}
+
+    def filter_new(self, kind: str, content_hashes: Iterable[str]) -> List[str]:
+        """返回尚未入库的哈希（保持输入顺序）"""
+        hashes = list(content_hashes)
+        known = set()
+        with self._lock:
+            # SQLite 单条语句的参数个数有限，分段查询
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT content_hash FROM ingested WHERE kind = ? "
+                    f"AND content_hash IN ({placeholders})",
+                    [kind, *part]
+                ).fetchall()
+                known.update(row[0] for row in rows)
+        return [h for h in hashes if h not in known]
+
+    def record(self, kind: str, content_hash: str, source: str, item_count: int = 1):
+        """记录一条已入库内容"""
+        self.record_many(kind, [(content_hash, source, item_count)])
+
+    def record_many(self, kind: str, entries: List[Tuple[str, str, int]]):
+        """批量记录 (content_hash, source, item_count)"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ingested "
+                "(kind, content_hash, source, item_count, added_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(kind, h, source, count, now) for h, source, count in entries]
+            )
+            self._conn.commit()
+
+    def count(self, kind: str) -> int:
+        """某类已入库内容的条数"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM ingested WHERE kind = ?", (kind,)
+            ).fetchone()[0]
+
+    def remove(self, kind: str, content_hash: str):
+        """删除一条记录"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM ingested WHERE kind = ? AND content_hash = ?",
+                (kind, content_hash)
+            )
+            self._conn.commit()
+
+    def remove_many(self, kind: str, content_hashes: Iterable[str]):
+        """批量删除记录"""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM ingested WHERE kind = ? AND content_hash = ?",
+                [(kind, h) for h in content_hashes]
+            )
+            self._conn.commit()
+
+    def clear(self, kind: Optional[str] = None):
+        """清空清单（同时清空文件夹同步状态）"""
+        with self._lock:
+            if kind is None:
+                self._conn.execute("DELETE FROM ingested")
+                self._conn.execute("DELETE FROM synced_files")
+            else:
+                self._conn.execute("DELETE FROM ingested WHERE kind = ?", (kind,))
+                self._conn.execute("DELETE FROM synced_files WHERE kind = ?", (kind,))
+            self._conn.commit()
+
+    def get_setting(self, key: str) -> Optional[str]:
+        """读取状态标记，不存在时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM settings WHERE key = ?", (key,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def set_setting(self, key: str, value: str):
+        """写入状态标记"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value)
+            )
+            self._conn.commit()
+
+    # ---------- 文件夹同步状态 ----------
+
+    def synced_files(self, kind: str, root: str) -> Dict[str, Tuple[int, int, str]]:
+        """root 目录下已同步的文件 {路径: (大小, 修改时间ns, 内容哈希)}"""
+        prefix = os.path.join(root, "")
+        # 按前缀做范围查询（可走主键索引），不用 LIKE 以免转义路径中的 % 和 _
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, size, mtime_ns, content_hash FROM synced_files "
+                "WHERE kind = ? AND path >= ? AND path < ?",
+                (kind, prefix, upper)
+            ).fetchall()
+        return {path: (size, mtime_ns, content_hash) for path, size, mtime_ns, content_hash in rows}
+
+    def record_synced(self, kind: str, entries: List[Tuple[str, int, int, str]]):
+        """批量记录已同步文件 (路径, 大小, 修改时间ns, 内容哈希)"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO synced_files "
+                "(kind, path, size, mtime_ns, content_hash, synced_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(kind, path, size, mtime_ns, h, now) for path, size, mtime_ns, h in entries]
+            )
+            self._conn.commit()
+
+    def remove_synced(self, kind: str, paths: Iterable[str]):
+        """删除已同步文件记录"""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM synced_files WHERE kind = ? AND path = ?",
+                [(kind, path) for path in paths]
+            )
+            self._conn.commit()
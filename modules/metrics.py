@@ -0,0 +1,241 @@
+# metrics.py
+"""进程内指标注册表与 Prometheus 文本格式导出
+
+计数器、直方图与回调式仪表盘；start_server() 在独立端口上提供 /metrics，
+与 Gradio 应用并行运行。enable_stage_metrics() 注册 profiling 的 span 回调后，
+阶段耗时（模型推理、Chroma 查询等）自动汇入 assistant_stage_duration_seconds，
+与页面上的计时开关无关。
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import config
+from . import profiling
+
+# 默认延迟分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        key = tuple(str(value) for value in label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """固定分桶直方图（导出为 Prometheus 的累积分桶）"""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 → [各分桶计数..., 总和, 总数]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        key = tuple(str(v) for v in label_values)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0.0] * (len(self.buckets) + 3)
+            entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets + (float("inf"),), entry):
+                    cumulative += count
+                    labels = _format_labels(self.labels, key, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+                labels = _format_labels(self.labels, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(entry[-2])}")
+                lines.append(f"{self.name}_count{labels} {_format_value(entry[-1])}")
+        return lines
+
+class Gauge:
+    """回调式仪表盘：每次导出时调用 collect() 取当前值 {标签值元组: 数值}"""
+
+    def __init__(self, name: str, documentation: str, collect: Callable[[], Dict[Tuple[str, ...], float]],
+                 labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.collect()
+        except Exception as e:
+            # 采集失败不影响其它指标
+            return lines + [f"# collect failed: {_escape(e)}"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+class Registry:
+    """指标注册表（同名指标只创建一次）"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name: str, factory):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = factory()
+            return self._metrics[name]
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(name, lambda: Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(name, lambda: Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name: str, documentation: str,
+              collect: Callable[[], Dict[Tuple[str, ...], float]],
+              labels: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(name, lambda: Gauge(name, documentation, collect, labels))
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# 进程级默认注册表
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter("assistant_requests_total", "Requests handled, by operation and status",
+                            ("operation", "status"))
+REQUEST_LATENCY = REGISTRY.histogram("assistant_request_duration_seconds",
+                                     "End-to-end request latency", ("operation",))
+STAGE_LATENCY = REGISTRY.histogram("assistant_stage_duration_seconds",
+                                   "Pipeline stage latency (model inference, Chroma, PDF...)",
+                                   ("stage",))
+
+def _on_stage(name: str, seconds: float):
+    STAGE_LATENCY.observe(seconds, name)
+
+def enable_stage_metrics():
+    """让 profiling 的各阶段耗时汇入指标（重复调用无副作用）"""
+    profiling.add_listener(_on_stage)
+
+def track(operation: str):
+    """请求计数与延迟装饰器；抛出异常时状态记为 error"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            status = "error"
+            try:
+                result = func(*args, **kwargs)
+                status = "ok"
+                return result
+            finally:
+                REQUESTS.inc(operation, status)
+                REQUEST_LATENCY.observe(time.perf_counter() - start, operation)
+        return wrapper
+    return decorator
+
+def register_app_gauges(vector_db=None):
+    """注册集合大小与向量缓存命中率仪表盘"""
+    if vector_db is not None:
+        def collection_sizes():
+            stats = vector_db.get_collection_stats()
+            return {(name,): entry["count"] for name, entry in stats.items()}
+        REGISTRY.gauge("assistant_collection_items", "Items stored per collection",
+                       collection_sizes, ("collection",))
+
+    def cache_stats():
+        from .embedding_cache import get_default_cache
+        cache = get_default_cache()
+        if cache is None:
+            return {}
+        stats = cache.stats()
+        return {(key,): stats[key] for key in
+                ("hit_rate", "memory_hits", "disk_hits", "misses", "memory_items", "disk_items")}
+    REGISTRY.gauge("assistant_embedding_cache", "Embedding cache hit rate and counters",
+                   cache_stats, ("field",))
+
+def register_ingest_gauges(ingest_queue):
+    """注册后台入库任务数仪表盘（按状态）"""
+    def job_counts():
+        return {(status,): count for status, count in ingest_queue.counts().items()}
+    REGISTRY.gauge("assistant_ingest_jobs", "Background ingestion jobs, by status",
+                   job_counts, ("status",))
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 抓取请求很频繁，不打印访问日志
+        pass
+
+def start_server(port: int = None, host: str = None) -> Optional[ThreadingHTTPServer]:
+    """在后台线程中启动 /metrics 服务（默认只监听本机），端口被占用时返回 None"""
+    host = host or config.METRICS_HOST
+    port = port or config.METRICS_PORT
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"⚠️  指标服务启动失败 {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    enable_stage_metrics()
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"📈 指标服务: http://{host}:{port}/metrics")
+    return server
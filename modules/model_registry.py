@@ -0,0 +1,95 @@
+# model_registry.py
+import threading
+from typing import Callable, Dict, List, Tuple
+import config
+
+# 进程级模型缓存：同名模型在一个进程内只加载一次，按引用共享
+_models: Dict[Tuple[str, str, str], object] = {}
+_lock = threading.Lock()
+
+def default_device() -> str:
+    """PyTorch 模型的默认推理设备（ONNX 模型固定在 CPU 上，见 model_device）"""
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def model_device(model) -> str:
+    """模型实际所在的设备：ONNX 后端为 CPU，PyTorch 模型（含 ONNX 失败后的回退）取其自身设备"""
+    if backend_name(model) != "torch":
+        return "cpu"
+    return str(getattr(model, "device", "cpu"))
+
+def get_or_load(kind: str, name: str, device: str, loader: Callable[[], object]):
+    """获取已加载的模型，不存在时调用 loader 加载并缓存"""
+    key = (kind, name, device)
+    # 加载可能耗时数秒，持锁可防止多个线程同时加载同一模型
+    with _lock:
+        if key not in _models:
+            _models[key] = loader()
+        return _models[key]
+
+def _load_onnx(loader_name: str, name: str):
+    """通过 ONNX 后端加载模型；依赖缺失、导出失败或校验未通过时返回 None（退回 PyTorch）"""
+    try:
+        from . import onnx_backend
+        return getattr(onnx_backend, loader_name)(name)
+    except ImportError as e:
+        print(f"⚠️  ONNX 后端不可用（{e}），改用 PyTorch")
+        return None
+    except Exception as e:
+        # 导出、量化或会话创建失败不应阻止启动
+        print(f"⚠️  ONNX 模型加载失败 {name}（{type(e).__name__}: {e}），改用 PyTorch")
+        return None
+
+def get_text_model(name: str = config.TEXT_MODEL_NAME, device: str = None):
+    """获取共享的 SentenceTransformer 模型（ONNX 后端时为同接口的 OnnxSentenceEncoder）"""
+    if config.INFERENCE_BACKEND == "onnx":
+        model = get_or_load("text-onnx", name, "cpu",
+                            lambda: _load_onnx("load_text_encoder", name))
+        if model is not None:
+            return model
+
+    device = device or default_device()
+
+    def load():
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(name)
+        model.to(device)
+        return model
+
+    return get_or_load("text", name, device, load)
+
+def get_clip_model(name: str = config.IMAGE_MODEL_NAME, device: str = None):
+    """获取共享的 CLIP 模型与预处理器，返回 (model, processor)"""
+    if config.INFERENCE_BACKEND == "onnx":
+        loaded = get_or_load("clip-onnx", name, "cpu",
+                             lambda: _load_onnx("load_clip_model", name))
+        if loaded is not None:
+            return loaded
+
+    device = device or default_device()
+
+    def load():
+        from transformers import CLIPModel, CLIPProcessor
+        model = CLIPModel.from_pretrained(name).to(device)
+        processor = CLIPProcessor.from_pretrained(name)
+        return model, processor
+
+    return get_or_load("clip", name, device, load)
+
+def backend_name(model) -> str:
+    """模型实际使用的推理后端（"torch"、"onnx" 或 "onnx-int8"），ONNX 校验未通过时为 "torch"
+
+    不同后端的输出有细微差别，向量缓存按此区分。
+    """
+    return getattr(model, "backend", "torch")
+
+def loaded_models() -> List[str]:
+    """列出当前进程已加载的模型"""
+    with _lock:
+        return [f"{kind}:{name}@{device}" for (kind, name, device), model in _models.items()
+                if model is not None]
+
+def clear():
+    """释放所有缓存的模型引用"""
+    with _lock:
+        _models.clear()
@@ -0,0 +1,297 @@
+# onnx_backend.py
+"""ONNX Runtime 推理后端（config.INFERENCE_BACKEND = "onnx"）
+
+首次使用时把 PyTorch 模型导出为 ONNX（可选动态 int8 量化），并与 PyTorch
+输出做一致性校验；之后直接加载 ONNX 文件，不再加载 PyTorch 权重。
+包装类与原模型接口一致，TextProcessor / ImageProcessor 无需修改。
+"""
+import json
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+import config
+
+# 一致性校验使用的样例文本
+PARITY_TEXTS = [
+    "Attention is all you need.",
+    "Deep residual learning for image recognition",
+    "一只在草地上奔跑的狗",
+    "reinforcement learning with sparse rewards in robotic manipulation tasks",
+]
+
+def _onnx_path(name: str, part: str, quantized: bool) -> Path:
+    """导出文件路径：<ONNX_DIR>/<模型名>-<部分>[-int8].onnx"""
+    suffix = "-int8" if quantized else ""
+    return Path(config.ONNX_DIR) / f"{name.replace('/', '__')}-{part}{suffix}.onnx"
+
+def _meta_path(name: str, part: str, quantized: bool) -> Path:
+    return _onnx_path(name, part, quantized).with_suffix(".json")
+
+def _backend_name(path: Path) -> str:
+    """后端标识（量化与否由导出文件决定），用于区分向量缓存"""
+    return "onnx-int8" if path.stem.endswith("-int8") else "onnx"
+
+def _create_session(path: Path):
+    """创建 CPU 推理会话（线程数取 config.ONNX_INTRA_OP_THREADS，0 表示由运行时决定）"""
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if config.ONNX_INTRA_OP_THREADS > 0:
+        options.intra_op_num_threads = config.ONNX_INTRA_OP_THREADS
+    return ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+def _export(module, inputs: Tuple, input_names: List[str], output_name: str,
+            dynamic_axes: Dict[str, Dict[int, str]], path: Path, quantized: bool):
+    """导出 ONNX 并按需做动态 int8 量化，返回最终文件路径"""
+    import torch
+    path.parent.mkdir(parents=True, exist_ok=True)
+    float_path = path.with_name(path.name.replace("-int8", "")) if quantized else path
+    module.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            module, inputs, str(float_path),
+            input_names=input_names,
+            output_names=[output_name],
+            dynamic_axes=dict(dynamic_axes, **{output_name: {0: "batch"}}),
+            opset_version=config.ONNX_OPSET
+        )
+    if quantized:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(float_path), str(path), weight_type=QuantType.QInt8)
+    return path
+
+def _cosine_parity(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """逐行余弦相似度与最大绝对误差"""
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    cosine = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1) + 1e-12)
+    return {
+        "min_cosine": float(cosine.min()),
+        "max_abs_error": float(np.abs(reference - candidate).max())
+    }
+
+def _load_or_export(name: str, part: str, export: Callable[[Path, bool], Dict]) -> Optional[Tuple[Path, Dict]]:
+    """加载已导出的模型；不存在时调用 export(path, quantized) 导出并校验
+
+    校验未通过时返回 None，由调用方退回 PyTorch。
+    """
+    quantized = config.ONNX_QUANTIZE
+    path = _onnx_path(name, part, quantized)
+    meta_path = _meta_path(name, part, quantized)
+    if path.exists() and meta_path.exists():
+        meta = json.loads(meta_path.read_text())
+    else:
+        print(f"📦 正在导出 ONNX 模型: {name} ({part}{', int8' if quantized else ''})")
+        meta = export(path, quantized)
+        meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2))
+
+    parity = meta.get("parity", {})
+    if parity.get("min_cosine", 0.0) < config.ONNX_PARITY_MIN_COSINE:
+        print(f"⚠️  ONNX 模型 {name} ({part}) 与 PyTorch 输出不一致 "
+              f"(min cosine {parity.get('min_cosine', 0.0):.4f})，改用 PyTorch")
+        return None
+    return path, meta
+
+# ---------- 文本模型（SentenceTransformer） ----------
+
+class OnnxSentenceEncoder:
+    """与 SentenceTransformer 接口一致的 ONNX 文本编码器（encode / tokenizer / max_seq_length）
+
+    池化与归一化在导出的计算图内完成，输出与原模型的 sentence_embedding 相同。
+    """
+
+    def __init__(self, path: Path, tokenizer, max_seq_length: int):
+        self.session = _create_session(path)
+        self.backend = _backend_name(path)
+        self.tokenizer = tokenizer
+        self.max_seq_length = max_seq_length
+        self._input_names = {node.name for node in self.session.get_inputs()}
+
+    def _run(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, padding=True, truncation=True,
+                                 max_length=self.max_seq_length, return_tensors="np")
+        feeds = {key: np.asarray(value, dtype=np.int64) for key, value in encoded.items()
+                 if key in self._input_names}
+        return self.session.run(None, feeds)[0]
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True,
+               **kwargs) -> np.ndarray:
+        """批量编码；与 SentenceTransformer 一样按长度排序分批以减少填充"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        order = np.argsort([-len(text) for text in texts])
+        outputs = [None] * len(texts)
+        for start in range(0, len(texts), batch_size):
+            indices = order[start:start + batch_size]
+            embeddings = self._run([texts[i] for i in indices])
+            for i, embedding in zip(indices, embeddings):
+                outputs[i] = embedding
+        result = np.stack(outputs)
+        return result[0] if single else result
+
+def _export_text_model(name: str, path: Path, quantized: bool) -> Dict:
+    """导出 SentenceTransformer（含池化/归一化）并与 PyTorch 输出比较"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(name, device="cpu")
+    tokenizer = model.tokenizer
+
+    class SentenceEmbedding(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            features = {"input_ids": input_ids, "attention_mask": attention_mask}
+            return self.model(features)["sentence_embedding"]
+
+    sample = tokenizer(PARITY_TEXTS[:1], return_tensors="pt")
+    axes = {0: "batch", 1: "sequence"}
+    _export(SentenceEmbedding(), (sample["input_ids"], sample["attention_mask"]),
+            ["input_ids", "attention_mask"], "sentence_embedding",
+            {"input_ids": axes, "attention_mask": axes}, path, quantized)
+
+    encoder = OnnxSentenceEncoder(path, tokenizer, model.max_seq_length)
+    reference = model.encode(PARITY_TEXTS, convert_to_numpy=True)
+    return {
+        "model": name,
+        "quantized": quantized,
+        "max_seq_length": model.max_seq_length,
+        "parity": _cosine_parity(reference, encoder.encode(PARITY_TEXTS))
+    }
+
+def load_text_encoder(name: str) -> Optional[OnnxSentenceEncoder]:
+    """加载（必要时导出）ONNX 文本编码器；校验未通过时返回 None"""
+    loaded = _load_or_export(name, "text", lambda path, quantized:
+                             _export_text_model(name, path, quantized))
+    if loaded is None:
+        return None
+    path, meta = loaded
+    from transformers import AutoTokenizer
+    return OnnxSentenceEncoder(path, AutoTokenizer.from_pretrained(name), meta["max_seq_length"])
+
+# ---------- CLIP ----------
+
+class OnnxClipModel:
+    """与 CLIPModel 的 get_image_features / get_text_features 接口一致的 ONNX 实现
+
+    输入输出仍为 torch 张量，ImageProcessor 中的归一化等后续代码保持不变。
+    """
+
+    def __init__(self, vision_path: Path, text_path: Path):
+        self.vision_session = _create_session(vision_path)
+        self.text_session = _create_session(text_path)
+        self.backend = _backend_name(vision_path)
+
+    @staticmethod
+    def _to_numpy(tensor, dtype) -> np.ndarray:
+        if hasattr(tensor, "detach"):
+            tensor = tensor.detach().cpu().numpy()
+        return np.asarray(tensor, dtype=dtype)
+
+    def get_image_features(self, pixel_values=None, **kwargs):
+        import torch
+        outputs = self.vision_session.run(
+            None, {"pixel_values": self._to_numpy(pixel_values, np.float32)})
+        return torch.from_numpy(outputs[0])
+
+    def get_text_features(self, input_ids=None, attention_mask=None, **kwargs):
+        import torch
+        input_ids = self._to_numpy(input_ids, np.int64)
+        if attention_mask is None:
+            attention_mask = np.ones_like(input_ids)
+        outputs = self.text_session.run(None, {
+            "input_ids": input_ids,
+            "attention_mask": self._to_numpy(attention_mask, np.int64)
+        })
+        return torch.from_numpy(outputs[0])
+
+    def to(self, device):
+        # ONNX 会话固定在 CPU 上运行
+        return self
+
+    def eval(self):
+        return self
+
+def _export_clip(name: str, part: str, path: Path, quantized: bool) -> Dict:
+    """导出 CLIP 的图像或文本分支并与 PyTorch 输出比较"""
+    import torch
+    from transformers import CLIPModel, CLIPProcessor
+
+    model = CLIPModel.from_pretrained(name).eval()
+    processor = CLIPProcessor.from_pretrained(name)
+
+    if part == "vision":
+        class Branch(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.model = model
+
+            def forward(self, pixel_values):
+                return self.model.get_image_features(pixel_values=pixel_values)
+
+        size = model.config.vision_config.image_size
+        pixels = torch.from_numpy(
+            np.random.default_rng(0).normal(size=(4, 3, size, size)).astype(np.float32))
+        _export(Branch(), (pixels[:1],), ["pixel_values"], "image_embeds",
+                {"pixel_values": {0: "batch"}}, path, quantized)
+        with torch.no_grad():
+            reference = model.get_image_features(pixel_values=pixels).numpy()
+        candidate = _create_session(path).run(None, {"pixel_values": pixels.numpy()})[0]
+    else:
+        class Branch(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.model = model
+
+            def forward(self, input_ids, attention_mask):
+                return self.model.get_text_features(input_ids=input_ids,
+                                                    attention_mask=attention_mask)
+
+        tokens = processor(text=PARITY_TEXTS, return_tensors="pt", padding=True, truncation=True)
+        axes = {0: "batch", 1: "sequence"}
+        _export(Branch(), (tokens["input_ids"][:1], tokens["attention_mask"][:1]),
+                ["input_ids", "attention_mask"], "text_embeds",
+                {"input_ids": axes, "attention_mask": axes}, path, quantized)
+        with torch.no_grad():
+            reference = model.get_text_features(input_ids=tokens["input_ids"],
+                                                attention_mask=tokens["attention_mask"]).numpy()
+        candidate = _create_session(path).run(None, {
+            "input_ids": tokens["input_ids"].numpy().astype(np.int64),
+            "attention_mask": tokens["attention_mask"].numpy().astype(np.int64)
+        })[0]
+
+    return {
+        "model": name,
+        "quantized": quantized,
+        "parity": _cosine_parity(reference, candidate)
+    }
+
+def load_clip_model(name: str):
+    """加载（必要时导出）ONNX CLIP，返回 (model, processor)；校验未通过时返回 None"""
+    parts = {}
+    for part in ("vision", "text"):
+        loaded = _load_or_export(name, part, lambda path, quantized, part=part:
+                                 _export_clip(name, part, path, quantized))
+        if loaded is None:
+            return None
+        parts[part] = loaded[0]
+    from transformers import CLIPProcessor
+    return OnnxClipModel(parts["vision"], parts["text"]), CLIPProcessor.from_pretrained(name)
+
+def parity_report() -> List[Dict]:
+    """已导出模型的一致性校验结果（用于 onnx_check 命令）"""
+    report = []
+    for name, part in ((config.TEXT_MODEL_NAME, "text"),
+                       (config.IMAGE_MODEL_NAME, "vision"),
+                       (config.IMAGE_MODEL_NAME, "text")):
+        meta_path = _meta_path(name, part, config.ONNX_QUANTIZE)
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+            report.append(dict(meta["parity"], model=name, part=part,
+                               quantized=meta.get("quantized", False)))
+    return report
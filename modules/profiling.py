@@ -0,0 +1,150 @@
+# profiling.py
+"""轻量级分阶段计时
+
+在流水线各阶段外包一层 span / timed，开启后按阶段名累计调用次数与耗时。
+注册了回调（例如指标导出）时 span 同样计时并通知回调，与是否累计统计无关。
+两者都没有时 span() 返回共享的空上下文、timed 包装只多一次布尔判断，开销可以忽略。
+
+    with profiling.span("pdf.extract"):
+        ...
+
+    @profiling.timed("text.encode")
+    def encode_texts(...):
+        ...
+
+多线程中的同名阶段会累加各线程的耗时，因此总耗时可能超过墙钟时间。
+"""
+import functools
+import threading
+import time
+from typing import Callable, Dict, List
+
+_enabled = False
+# 开启了统计或注册了回调时为 True，决定 span 是否计时
+_active = False
+_lock = threading.Lock()
+# 阶段名 → [调用次数, 总耗时(秒), 最大耗时(秒)]
+_stats: Dict[str, List[float]] = {}
+# 每次 span 结束时回调 listener(阶段名, 耗时秒)，供指标导出等使用
+_listeners: List[Callable[[str, float], None]] = []
+
+def enable(enabled: bool = True):
+    """开启或关闭统计累计（不影响已注册的回调）"""
+    global _enabled, _active
+    _enabled = enabled
+    _active = enabled or bool(_listeners)
+
+def is_enabled() -> bool:
+    return _enabled
+
+def reset():
+    """清空已累计的统计"""
+    with _lock:
+        _stats.clear()
+
+def add_listener(listener: Callable[[str, float], None]):
+    """注册 span 结束回调；注册后 span 始终计时，即使统计未开启"""
+    global _active
+    if listener not in _listeners:
+        _listeners.append(listener)
+    _active = True
+
+def record(name: str, seconds: float):
+    """记录一次阶段耗时"""
+    if _enabled:
+        with _lock:
+            entry = _stats.get(name)
+            if entry is None:
+                _stats[name] = [1, seconds, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+                if seconds > entry[2]:
+                    entry[2] = seconds
+    for listener in _listeners:
+        listener(name, seconds)
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+def span(name: str):
+    """阶段计时上下文；未开启且没有回调时返回空上下文"""
+    if not _active:
+        return _NULL_SPAN
+    return _Span(name)
+
+def timed(name: str):
+    """函数计时装饰器（生成器函数只统计创建开销，应在循环内用 span）"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _active:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def snapshot() -> Dict[str, dict]:
+    """当前统计 {阶段名: {calls, total_s, mean_ms, max_ms}}"""
+    with _lock:
+        return {
+            name: {
+                "calls": int(calls),
+                "total_s": total,
+                "mean_ms": total / calls * 1000 if calls else 0.0,
+                "max_ms": longest * 1000
+            }
+            for name, (calls, total, longest) in _stats.items()
+        }
+
+def format_report(wall_seconds: float = None) -> str:
+    """按总耗时降序的文本表格；给出墙钟时间时附带占比"""
+    stats = snapshot()
+    if not stats:
+        return "（没有记录到阶段耗时）"
+    lines = [f"{'阶段':<24}{'次数':>8}{'总耗时(s)':>12}{'平均(ms)':>12}{'最大(ms)':>12}"
+             + (f"{'占比':>8}" if wall_seconds else "")]
+    for name, entry in sorted(stats.items(), key=lambda item: item[1]["total_s"], reverse=True):
+        line = (f"{name:<24}{entry['calls']:>8}{entry['total_s']:>12.3f}"
+                f"{entry['mean_ms']:>12.2f}{entry['max_ms']:>12.2f}")
+        if wall_seconds:
+            line += f"{entry['total_s'] / wall_seconds:>8.1%}"
+        lines.append(line)
+    if wall_seconds:
+        lines.append(f"{'墙钟时间':<24}{'':>8}{wall_seconds:>12.3f}")
+    return "\n".join(lines)
+
+def format_markdown() -> str:
+    """Markdown 表格（Web 系统状态页使用）"""
+    stats = snapshot()
+    if not stats:
+        return "暂无阶段计时数据" + ("" if _enabled else "（计时未开启）")
+    lines = ["| 阶段 | 次数 | 总耗时(s) | 平均(ms) | 最大(ms) |",
+             "|---|---:|---:|---:|---:|"]
+    for name, entry in sorted(stats.items(), key=lambda item: item[1]["total_s"], reverse=True):
+        lines.append(f"| {name} | {entry['calls']} | {entry['total_s']:.3f} | "
+                     f"{entry['mean_ms']:.2f} | {entry['max_ms']:.2f} |")
+    return "\n".join(lines)
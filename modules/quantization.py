@@ -0,0 +1,83 @@
+# quantization.py
+from typing import List, Sequence, Tuple
+import numpy as np
+
+# 支持的向量存储格式
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """逐向量缩放的 int8 量化：每行 scale = max|x| / 127，返回 (int8 矩阵, float32 scale)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis]
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    quantized = np.clip(np.rint(matrix / scales[:, np.newaxis]), -127, 127).astype(np.int8)
+    return quantized, scales
+
+def dequantize_int8(quantized: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """int8 矩阵还原为 float32"""
+    return quantized.astype(np.float32) * np.asarray(scales, dtype=np.float32)[:, np.newaxis]
+
+def roundtrip(matrix: np.ndarray, dtype: str) -> np.ndarray:
+    """按指定格式压缩再还原，得到查询时实际使用的向量"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if dtype == "int8":
+        return dequantize_int8(*quantize_int8(matrix))
+    return matrix.astype(dtype).astype(np.float32)
+
+def bytes_per_vector(dtype: str, dim: int) -> int:
+    """单个向量的存储字节数（int8 额外存一个 float32 scale）"""
+    if dtype == "int8":
+        return dim + 4
+    return dim * np.dtype(dtype).itemsize
+
+def _top_k_rows(queries: np.ndarray, matrix: np.ndarray, k: int,
+                exclude: np.ndarray) -> np.ndarray:
+    """每条查询的 top-k 行号（排除查询自身所在行）"""
+    scores = queries @ matrix.T
+    scores[np.arange(len(queries)), exclude] = -np.inf
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return top
+
+def topk_overlap_report(matrix: np.ndarray, k: int = 10, n_queries: int = 200,
+                        dtypes: Sequence[str] = SUPPORTED_DTYPES, seed: int = 0,
+                        query_block: int = 16) -> List[dict]:
+    """比较各存储格式与 float32 全精度检索的 top-k 重合率
+
+    从库中随机抽取 n_queries 个向量作为查询（排除自身），分别在全精度和
+    压缩后的矩阵上求 top-k，统计平均/最差重合率与得分误差。
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    count, dim = matrix.shape
+    k = min(k, count - 1)
+    if k <= 0:
+        return []
+
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(count, size=min(n_queries, count), replace=False)
+
+    report = []
+    for dtype in dtypes:
+        stored = matrix if dtype == "float32" else roundtrip(matrix, dtype)
+        overlaps, score_errors = [], []
+        for start in range(0, len(query_rows), query_block):
+            rows = query_rows[start:start + query_block]
+            queries = matrix[rows]
+            exact = _top_k_rows(queries, matrix, k, rows)
+            approx = _top_k_rows(queries, stored, k, rows)
+            for i in range(len(rows)):
+                overlaps.append(len(set(exact[i]) & set(approx[i])) / k)
+            score_errors.append(np.abs(queries @ stored.T - queries @ matrix.T).max())
+
+        size = bytes_per_vector(dtype, dim)
+        report.append({
+            "dtype": dtype,
+            "bytes_per_vector": size,
+            "index_mb": size * count / 1024 / 1024,
+            "compression": bytes_per_vector("float32", dim) / size,
+            "overlap_mean": float(np.mean(overlaps)),
+            "overlap_min": float(np.min(overlaps)),
+            "max_score_error": float(max(score_errors))
+        })
+    return report
@@ -1,50 +1,166 @@
-import torch
-from sentence_transformers import SentenceTransformer
-from typing import List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import numpy as np
-from .file_utils import FileUtils
+from .file_utils import FileUtils, ParsedDocument
+from . import model_registry, profiling
+from .embedding_cache import EmbeddingCache, cached_encode, get_default_cache
+from .batcher import MicroBatcher
 import config
 
 class TextProcessor:
     """文本处理模块"""
     
-    def __init__(self):
-        self.model = SentenceTransformer(config.TEXT_MODEL_NAME)
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model.to(self.device)
+    def __init__(self, cache: Optional[EmbeddingCache] = None, micro_batching: bool = False):
+        # 通过注册表获取，同一进程内多个 TextProcessor 共享同一份模型
+        self.model = model_registry.get_text_model(config.TEXT_MODEL_NAME)
+        # 以实际加载的后端为准（ONNX 加载失败回退 PyTorch 时可能在 GPU 上）
+        self.device = model_registry.model_device(self.model)
+        # 缓存按 模型名@推理后端 区分，PyTorch 与 ONNX(int8) 的向量互不复用
+        self.cache_model_name = f"{config.TEXT_MODEL_NAME}@{model_registry.backend_name(self.model)}"
+        # 向量缓存（默认使用进程共享的两级缓存，配置关闭时为 None）
+        self.cache = cache if cache is not None else get_default_cache()
+        # 并发查询合并（Web 应用开启）：多个线程的 encode_text 合并为一次批量编码
+        self.query_batcher = (MicroBatcher(self.encode_texts, name="text-query-batcher")
+                              if micro_batching else None)
         print(f"Text model loaded on {self.device}")
     
     def encode_text(self, text: str) -> np.ndarray:
         """编码单个文本为向量"""
-        embedding = self.model.encode(text, convert_to_numpy=True)
-        return embedding
+        if self.query_batcher is not None:
+            return self.query_batcher.submit(text)
+        return self.encode_texts([text])[0]
     
+    @profiling.timed("text.encode")
     def encode_texts(self, texts: List[str]) -> np.ndarray:
-        """批量编码文本"""
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
-        return embeddings
+        """批量编码文本（命中缓存的文本不再计算）"""
+        return cached_encode(
+            self.cache, self.cache_model_name, texts,
+            lambda batch: self.model.encode(batch, convert_to_numpy=True)
+        )
     
     def process_pdf(self, pdf_path: str) -> Tuple[List[str], List[np.ndarray]]:
         """处理PDF文件，返回文本chunks和对应的向量"""
-        # 提取文本
-        text = FileUtils.extract_text_from_pdf(pdf_path)
+        return self.process_document(FileUtils.parse_pdf(pdf_path))
+    
+    def process_document(self, document: ParsedDocument) -> Tuple[List[str], List[np.ndarray]]:
+        """处理已解析的文档，返回文本chunks和对应的向量"""
+        chunks, embeddings = [], []
+        for batch_chunks, batch_embeddings, _ in self.iter_document_batches(document):
+            chunks.extend(batch_chunks)
+            embeddings.append(batch_embeddings)
         
-        if not text.strip():
-            print(f"Warning: No text extracted from {pdf_path}")
+        if len(chunks) == 0:
+            print(f"Warning: No text extracted from {document.path}")
             return [], []
         
-        # 分割文本
-        chunks = FileUtils.split_text(text)
+        return chunks, np.concatenate(embeddings)
+    
+    @property
+    def max_chunk_tokens(self) -> int:
+        """单个chunk可容纳的词元数（模型序列上限减去 [CLS]/[SEP]）"""
+        if config.CHUNK_MAX_TOKENS:
+            return config.CHUNK_MAX_TOKENS
+        return self.model.max_seq_length - 2
+    
+    def iter_chunks(self, pages: Iterable[str]) -> Iterator[Tuple[str, Dict]]:
+        """按配置的策略切块，产出 (chunk文本, chunk元数据)"""
+        tokenizer = getattr(self.model, "tokenizer", None)
+        # 需要快速分词器提供字符偏移，否则退回按字符切分
+        if config.CHUNK_STRATEGY == "tokens" and getattr(tokenizer, "is_fast", False):
+            yield from self.iter_token_chunks(pages)
+        else:
+            for chunk in FileUtils.iter_text_chunks(pages):
+                yield chunk, {}
+    
+    def iter_token_chunks(self, pages: Iterable[str], max_tokens: int = None,
+                          overlap: int = None) -> Iterator[Tuple[str, Dict]]:
+        """按模型自身的词元计数切块
         
-        # 生成向量
-        if len(chunks) == 0:
-            return [], []
+        每个chunk填满到模型序列上限（可选重叠），不会再有超出上限被截断、
+        从未被索引的文本。元数据记录在全文中的字符偏移与起止页码；全文与
+        ParsedDocument.text 一致，各页直接相连、不加分隔符，因此
+        chunk == 全文[char_start:char_end]。
+        逐页分词，内存中只保留尚未产出的词元。
+        """
+        tokenizer = self.model.tokenizer
+        max_tokens = max_tokens or self.max_chunk_tokens
+        overlap = config.CHUNK_OVERLAP_TOKENS if overlap is None else overlap
+        overlap = max(0, min(overlap, max_tokens - 1))
+        step = max_tokens - overlap
+        
+        # 词元缓冲: (页码, 页内起始偏移, 页内结束偏移)
+        buffer: List[Tuple[int, int, int]] = []
+        page_texts: Dict[int, str] = {}
+        page_bases: Dict[int, int] = {}
+        emitted = False
+        doc_offset = 0
+        
+        def make_chunk(tokens):
+            first_page, first_start, _ = tokens[0]
+            last_page, _, last_end = tokens[-1]
+            if first_page == last_page:
+                text = page_texts[first_page][first_start:last_end]
+            else:
+                # 跨页时取全文中的连续片段（含中间没有词元的页）
+                parts = [page_texts[first_page][first_start:]]
+                parts.extend(page_texts[p] for p in range(first_page + 1, last_page))
+                parts.append(page_texts[last_page][:last_end])
+                text = "".join(parts)
+            metadata = {
+                "char_start": page_bases[first_page] + first_start,
+                "char_end": page_bases[last_page] + last_end,
+                "page_start": first_page,
+                "page_end": last_page,
+                "token_count": len(tokens)
+            }
+            return text, metadata
         
-        embeddings = self.encode_texts(chunks)
+        for page_no, text in enumerate(pages, 1):
+            page_texts[page_no] = text
+            page_bases[page_no] = doc_offset
+            doc_offset += len(text)
+            
+            with profiling.span("text.chunk"):
+                encoding = tokenizer(text, add_special_tokens=False,
+                                     return_offsets_mapping=True,
+                                     return_attention_mask=False, verbose=False)
+            buffer.extend((page_no, start, end)
+                          for start, end in encoding["offset_mapping"] if end > start)
+            
+            while len(buffer) >= max_tokens:
+                yield make_chunk(buffer[:max_tokens])
+                emitted = True
+                buffer = buffer[step:]
+            
+            # 只保留缓冲中最早词元所在页及之后的页面文本
+            oldest = buffer[0][0] if buffer else page_no
+            for stale in [p for p in page_texts if p < oldest]:
+                del page_texts[stale]
+                del page_bases[stale]
+        
+        # 剩余词元中若有尚未产出过的部分，输出最后一个chunk
+        if buffer and (not emitted or len(buffer) > overlap):
+            yield make_chunk(buffer)
+    
+    def iter_document_batches(self, document, batch_size: int = None
+                              ) -> Iterator[Tuple[List[str], np.ndarray, List[Dict]]]:
+        """流式切块并编码：逐页读取，每攒够 batch_size 个chunk编码一次并产出
         
-        return chunks, embeddings
+        document 可以是 ParsedDocument 或 StreamingDocument，
+        内存中最多只保留一个批次的chunk和向量。
+        产出 (chunks, 向量矩阵, 每个chunk的元数据)。
+        """
+        batch_size = batch_size or config.EMBED_BATCH_CHUNKS
+        batch, metadatas = [], []
+        for chunk, metadata in self.iter_chunks(document.iter_pages()):
+            batch.append(chunk)
+            metadatas.append(metadata)
+            if len(batch) >= batch_size:
+                yield batch, self.encode_texts(batch), metadatas
+                batch, metadatas = [], []
+        if batch:
+            yield batch, self.encode_texts(batch), metadatas
     
     def get_pdf_summary(self, pdf_path: str, max_chars: int = 500) -> str:
         """获取PDF摘要（前N个字符）"""
-        text = FileUtils.extract_text_from_pdf(pdf_path)
+        text = FileUtils.parse_pdf(pdf_path, max_chars=max_chars + 1).text
         return text[:max_chars] + "..." if len(text) > max_chars else text
\ No newline at end of file
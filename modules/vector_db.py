@@ -1,9 +1,15 @@
 # modules/vector_db.py - 完整修复版（支持归一化特征）
 import chromadb
+from pathlib import Path
 from typing import List, Tuple, Optional
-import uuid
+import hashlib
 import numpy as np
 import config
+from .file_utils import FileUtils
+from .manifest import IngestManifest
+from .flat_index import FlatIndex
+from .quantization import topk_overlap_report
+from . import profiling
 
 class VectorDB:
     """向量数据库管理"""
@@ -22,17 +28,75 @@ class VectorDB:
         self.image_collection = self.client.get_or_create_collection(
             name="images"
         )
+        
+        # 论文级摘要向量（每篇一条，chunk向量的归一化均值），用于粗筛与相似论文
+        self.centroid_collection = self.client.get_or_create_collection(
+            name="paper_centroids"
+        )
+        # 流式入库中尚未写完的论文：内容哈希 → [向量和, chunk数, 论文级metadata]
+        self._centroid_sums = {}
+        
+        # 图片索引后端："flat" 时图片向量存放在内存映射的平面索引中
+        self.image_index = None
+        if config.IMAGE_INDEX_BACKEND == "flat":
+            self.image_index = FlatIndex(config.FLAT_INDEX_DIR, config.IMAGE_EMBEDDING_DIM,
+                                         config.FLAT_INDEX_DTYPE)
+        
+        # 暴力检索兜底用的图片矩阵缓存（写入时失效）
+        self._image_matrix_cache = None
+        
+        # 已入库内容清单（内容哈希 → 已编码）
+        self.manifest = IngestManifest()
+        if self.manifest.get_setting(self.CENTROIDS_READY_KEY) is None:
+            # 首次打开（含旧版本数据库）时统计一次，之后由写入和重建维护
+            ready = self.centroid_collection.count() >= self.count_papers()
+            self._set_centroids_ready(ready)
         print("✅ VectorDB 初始化成功")
     
+    def is_paper_indexed(self, content_hash: str) -> bool:
+        """论文内容是否已入库"""
+        return self.manifest.contains("paper", content_hash)
+    
+    def is_image_indexed(self, content_hash: str) -> bool:
+        """图片内容是否已入库"""
+        return self.manifest.contains("image", content_hash)
+    
+    @staticmethod
+    def _content_hash_for(path: str, fallback: bytes) -> str:
+        """优先使用文件内容哈希，文件不存在时退化为数据本身的哈希"""
+        if path and Path(path).is_file():
+            return FileUtils.compute_file_hash(path)
+        return hashlib.sha256(fallback).hexdigest()
+    
     def add_paper(self, pdf_path: str, chunks: List[str], 
-                  embeddings: List[np.ndarray], metadata: dict = None):
-        """添加论文到数据库"""
+                  embeddings: List[np.ndarray], metadata: dict = None,
+                  content_hash: Optional[str] = None):
+        """添加论文到数据库（ID由内容哈希派生，重复添加会覆盖而不是复制）"""
         if not chunks or len(chunks) == 0:
             print(f"⚠️  没有文本块可添加: {pdf_path}")
             return False
         
-        # 生成唯一ID
-        ids = [str(uuid.uuid4()) for _ in range(len(chunks))]
+        if content_hash is None:
+            content_hash = self._content_hash_for(
+                pdf_path, "\n".join(chunks).encode("utf-8")
+            )
+        
+        if not self.add_paper_chunks(pdf_path, chunks, embeddings, metadata,
+                                     content_hash, total_chunks=len(chunks)):
+            return False
+        self.mark_paper_indexed(content_hash, pdf_path, len(chunks))
+        return True
+    
+    def add_paper_chunks(self, pdf_path: str, chunks: List[str], embeddings,
+                         metadata: Optional[dict], content_hash: str,
+                         start_index: int = 0, total_chunks: Optional[int] = None,
+                         chunk_metadatas: Optional[List[dict]] = None) -> bool:
+        """写入论文的一批文本块（流式入库时逐批调用，不更新清单）
+        
+        chunk_metadatas 为每个块单独的元数据（字符偏移、页码等）。
+        """
+        # 确定性ID：<内容哈希>:<块序号>
+        ids = [f"{content_hash}:{start_index + i}" for i in range(len(chunks))]
         
         # 准备metadata
         if metadata is None:
@@ -41,44 +105,166 @@ class VectorDB:
         metadatas = []
         for i in range(len(chunks)):
             chunk_meta = metadata.copy()
+            if chunk_metadatas is not None:
+                chunk_meta.update(chunk_metadatas[i])
             chunk_meta["source"] = pdf_path
-            chunk_meta["chunk_index"] = i
-            chunk_meta["total_chunks"] = len(chunks)
+            chunk_meta["content_hash"] = content_hash
+            chunk_meta["chunk_index"] = start_index + i
+            # 流式写入时总块数事先未知，只记录在清单中
+            if total_chunks is not None:
+                chunk_meta["total_chunks"] = total_chunks
             metadatas.append(chunk_meta)
         
-        # 转换为列表
-        embeddings_list = [embedding.tolist() for embedding in embeddings]
-        
         try:
-            # 添加到数据库
-            self.text_collection.add(
-                embeddings=embeddings_list,
-                documents=chunks,
-                metadatas=metadatas,
-                ids=ids
-            )
-            
-            print(f"✅ 添加成功: {len(chunks)} chunks from {pdf_path}")
+            # 添加到数据库（upsert：相同内容重复写入不会产生重复行）
+            with profiling.span("db.write"):
+                self._bulk_upsert(self.text_collection, ids, embeddings, metadatas,
+                                  documents=chunks)
+            self._accumulate_centroid(content_hash, pdf_path, metadata, embeddings,
+                                      reset=start_index == 0)
             return True
             
         except Exception as e:
             print(f"❌ 添加失败 {pdf_path}: {e}")
             return False
     
+    def mark_paper_indexed(self, content_hash: str, pdf_path: str, chunk_count: int):
+        """论文全部文本块写入后登记到清单"""
+        self._write_centroid(content_hash)
+        self.manifest.record("paper", content_hash, pdf_path, chunk_count)
+        print(f"✅ 添加成功: {chunk_count} chunks from {pdf_path}")
+    
+    # chunk级字段，写入论文中心向量时去掉
+    CHUNK_METADATA_KEYS = ("chunk_index", "total_chunks", "char_start", "char_end",
+                           "page_start", "page_end", "token_count")
+    
+    @staticmethod
+    def _normalized_rows(embeddings) -> np.ndarray:
+        """逐行 L2 归一化（全零行保持不变）"""
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[np.newaxis]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1.0)
+    
+    # 旧版本入库的chunk没有 content_hash，中心向量ID改由来源路径派生
+    LEGACY_CENTROID_PREFIX = "source:"
+    
+    @classmethod
+    def _centroid_key(cls, metadata: dict) -> str:
+        """chunk 所属论文的中心向量ID：内容哈希，旧数据退化为来源路径的哈希"""
+        content_hash = metadata.get('content_hash')
+        if content_hash:
+            return content_hash
+        source = metadata.get('source', '')
+        return cls.LEGACY_CENTROID_PREFIX + hashlib.sha256(source.encode("utf-8")).hexdigest()
+    
+    def _accumulate_centroid(self, content_hash: str, pdf_path: str,
+                             metadata: dict, embeddings, reset: bool = False):
+        """累加一批chunk向量到该论文的中心向量（reset 时从头开始）"""
+        rows = self._normalized_rows(embeddings)
+        entry = None if reset else self._centroid_sums.get(content_hash)
+        if entry is None:
+            base = {key: value for key, value in metadata.items()
+                    if key not in self.CHUNK_METADATA_KEYS}
+            base["source"] = pdf_path
+            if not content_hash.startswith(self.LEGACY_CENTROID_PREFIX):
+                base["content_hash"] = content_hash
+            entry = [np.zeros(rows.shape[1], dtype=np.float32), 0, base]
+            self._centroid_sums[content_hash] = entry
+        entry[0] += rows.sum(axis=0)
+        entry[1] += len(rows)
+    
+    @profiling.timed("db.write_centroid")
+    def _write_centroid(self, content_hash: str) -> bool:
+        """把累加完成的中心向量写入 paper_centroids 集合，返回是否成功"""
+        entry = self._centroid_sums.pop(content_hash, None)
+        if entry is None or entry[1] == 0:
+            return True
+        total, count, base = entry
+        centroid = self._normalized_rows(total / count)
+        try:
+            self.centroid_collection.upsert(
+                ids=[content_hash],
+                embeddings=centroid.tolist(),
+                metadatas=[dict(base, chunk_count=count)]
+            )
+            return True
+        except Exception as e:
+            # 中心向量缺失只会让检索退回全量扫描，不影响入库
+            print(f"⚠️  论文中心向量写入失败 {base.get('source')}: {e}")
+            self._set_centroids_ready(False)
+            return False
+    
+    def rebuild_paper_centroids(self, page_size: int = 2048) -> int:
+        """根据已入库的chunk重新计算全部论文中心向量（用于旧数据库升级），返回论文数"""
+        self.client.delete_collection("paper_centroids")
+        self.centroid_collection = self.client.get_or_create_collection(name="paper_centroids")
+        self._centroid_sums = {}
+        
+        total = self.text_collection.count()
+        for offset in range(0, total, page_size):
+            results = self.text_collection.get(include=["embeddings", "metadatas"],
+                                               limit=page_size, offset=offset)
+            embeddings = results.get('embeddings')
+            if embeddings is None or len(embeddings) == 0:
+                continue
+            metadatas = results.get('metadatas') or []
+            for embedding, metadata in zip(embeddings, metadatas):
+                if not metadata or not (metadata.get('content_hash') or metadata.get('source')):
+                    continue
+                # 旧数据没有内容哈希，按来源路径归组
+                self._accumulate_centroid(self._centroid_key(metadata), metadata.get('source', ''),
+                                          metadata, [embedding])
+        
+        hashes = list(self._centroid_sums)
+        written = [self._write_centroid(content_hash) for content_hash in hashes]
+        self._set_centroids_ready(all(written))
+        print(f"✅ 已重建 {len(hashes)} 篇论文的中心向量")
+        return len(hashes)
+    
+    def count_papers(self, page_size: int = 4096) -> int:
+        """文本集合中不同论文（source）的数量，包括没有清单记录的旧数据（全量扫描）"""
+        total = self.text_collection.count()
+        sources = set()
+        for offset in range(0, total, page_size):
+            results = self.text_collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            for metadata in results.get('metadatas') or []:
+                if metadata and metadata.get('source'):
+                    sources.add(metadata['source'])
+        return len(sources)
+    
+    # 清单中的状态标记："1" 表示每篇论文都有中心向量
+    CENTROIDS_READY_KEY = "paper_centroids_ready"
+    
+    def _set_centroids_ready(self, ready: bool):
+        self.manifest.set_setting(self.CENTROIDS_READY_KEY, "1" if ready else "0")
+    
+    def centroids_ready(self) -> bool:
+        """文本集合中的每篇论文是否都有中心向量（旧数据需先 rebuild_centroids）
+        
+        状态在入库、重建和清空时维护并持久化，查询时不再扫描chunk。
+        """
+        return (self.manifest.get_setting(self.CENTROIDS_READY_KEY) == "1"
+                and self.centroid_collection.count() > 0)
+    
     def add_image(self, image_path: str, embedding: np.ndarray, 
-                  metadata: dict = None):
-        """添加图像到数据库"""
+                  metadata: dict = None, content_hash: Optional[str] = None):
+        """添加图像到数据库（ID即图片内容哈希）"""
         if metadata is None:
             metadata = {}
         
+        if content_hash is None:
+            content_hash = self._content_hash_for(
+                image_path, np.asarray(embedding).tobytes()
+            )
+        
         metadata["source"] = image_path
+        metadata["content_hash"] = content_hash
         
         try:
-            self.image_collection.add(
-                embeddings=[embedding.tolist()],
-                metadatas=[metadata],
-                ids=[str(uuid.uuid4())]
-            )
+            self._write_images([content_hash], np.asarray(embedding)[np.newaxis], [metadata])
+            self.manifest.record("image", content_hash, image_path)
             
             print(f"✅ 图片添加成功: {image_path}")
             return True
@@ -87,55 +273,311 @@ class VectorDB:
             print(f"❌ 图片添加失败 {image_path}: {e}")
             return False
     
+    def _bulk_upsert(self, collection, ids: List[str], embeddings,
+                     metadatas: List[dict], documents: Optional[List[str]] = None):
+        """分批写入集合
+        
+        整个矩阵一次性转成 float32 再按批整体 tolist()，避免逐条转换；
+        每批大小取 config.DB_WRITE_BATCH_SIZE 与客户端上限中的较小值。
+        """
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[np.newaxis]
+        
+        batch_size = config.DB_WRITE_BATCH_SIZE
+        max_batch_size = getattr(self.client, "max_batch_size", None)
+        if max_batch_size:
+            batch_size = min(batch_size, max_batch_size)
+        
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            kwargs = {
+                "ids": ids[start:end],
+                "embeddings": matrix[start:end].tolist(),
+                "metadatas": metadatas[start:end]
+            }
+            if documents is not None:
+                kwargs["documents"] = documents[start:end]
+            collection.upsert(**kwargs)
+    
+    @profiling.timed("db.write")
+    def _write_images(self, ids: List[str], embeddings, metadatas: List[dict]):
+        """写入图片向量到当前配置的后端"""
+        self._invalidate_image_matrix()
+        if self.image_index is not None:
+            self.image_index.upsert(ids, embeddings, metadatas)
+        else:
+            self._bulk_upsert(self.image_collection, ids, embeddings, metadatas)
+    
+    def add_images(self, image_paths: List[str], embeddings: np.ndarray,
+                   metadatas: Optional[List[dict]] = None,
+                   content_hashes: Optional[List[str]] = None) -> bool:
+        """批量添加图像（一次写入多张，embeddings 为 N×D 矩阵）"""
+        if len(image_paths) == 0:
+            return True
+        
+        embeddings = np.asarray(embeddings)
+        if metadatas is None:
+            metadatas = [{} for _ in image_paths]
+        if content_hashes is None:
+            content_hashes = [self._content_hash_for(path, embedding.tobytes())
+                              for path, embedding in zip(image_paths, embeddings)]
+        
+        prepared = []
+        for path, content_hash, metadata in zip(image_paths, content_hashes, metadatas):
+            metadata = dict(metadata)
+            metadata["source"] = path
+            metadata["content_hash"] = content_hash
+            prepared.append(metadata)
+        
+        try:
+            self._write_images(list(content_hashes), embeddings, prepared)
+            self.manifest.record_many(
+                "image", [(h, path, 1) for h, path in zip(content_hashes, image_paths)]
+            )
+            print(f"✅ 批量添加图片成功: {len(image_paths)} 张")
+            return True
+        except Exception as e:
+            print(f"❌ 批量添加图片失败: {e}")
+            return False
+    
+    @profiling.timed("db.delete")
+    def remove_paper(self, content_hash: str) -> bool:
+        """删除一篇论文的全部文本块、中心向量和清单记录"""
+        try:
+            self.text_collection.delete(where={"content_hash": content_hash})
+            self.centroid_collection.delete(ids=[content_hash])
+            self._centroid_sums.pop(content_hash, None)
+            self.manifest.remove("paper", content_hash)
+            return True
+        except Exception as e:
+            print(f"❌ 删除论文失败 {content_hash}: {e}")
+            return False
+
+    @profiling.timed("db.delete")
+    def remove_images(self, content_hashes: List[str]) -> bool:
+        """按内容哈希（即图片ID）批量删除图片向量和清单记录"""
+        if not content_hashes:
+            return True
+        try:
+            self._invalidate_image_matrix()
+            if self.image_index is not None:
+                self.image_index.delete(content_hashes)
+            else:
+                self.image_collection.delete(ids=list(content_hashes))
+            self.manifest.remove_many("image", content_hashes)
+            return True
+        except Exception as e:
+            print(f"❌ 删除图片失败: {e}")
+            return False
+
     def search_text(self, query_embedding: np.ndarray, k: int = config.SEARCH_TOP_K,
                filter_metadata: Optional[dict] = None) -> List[Tuple[float, str, dict]]:
         """在文本中搜索（按论文去重）"""
+        return self.search_papers(query_embedding, k, filter_metadata)
+    
+    def search_text_batch(self, query_embeddings: np.ndarray, k: int = config.SEARCH_TOP_K,
+                          filter_metadata: Optional[dict] = None
+                          ) -> List[List[Tuple[float, str, dict]]]:
+        """批量文本搜索（按论文去重）"""
+        return self.search_papers_batch(query_embeddings, k, filter_metadata)
+    
+    @staticmethod
+    def _distance_to_similarity(distance: float) -> float:
+        """相似度计算"""
+        if distance < 0:
+            similarity = 1.0 / (1.0 + abs(distance))
+        else:
+            similarity = 1.0 / (1.0 + distance)
+        return max(0.0, min(1.0, similarity))
+    
+    @staticmethod
+    def _aggregate_scores(scores: List[float], aggregate: str, top_m: int) -> float:
+        """把一篇论文多个chunk的相似度聚合为论文得分（scores 已降序）"""
+        if aggregate == "mean":
+            return float(np.mean(scores))
+        if aggregate == "topm":
+            return float(np.mean(scores[:top_m]))
+        return scores[0]
+    
+    def search_papers(self, query_embedding: np.ndarray, k: int = config.SEARCH_TOP_K,
+                      filter_metadata: Optional[dict] = None, aggregate: str = None,
+                      top_m: int = None, max_candidates: int = None, mode: str = None
+                      ) -> List[Tuple[float, str, dict]]:
+        """论文级检索，返回 [(得分, 最佳chunk文本, metadata)]
+        
+        mode="hierarchical" 时先在论文中心向量中粗筛 k*PAPER_SHORTLIST_FACTOR 篇，
+        再只对这些论文的chunk精排；中心向量不完整或带过滤条件时退回全量扫描。
+        aggregate 决定论文得分: "max"（最佳chunk）、"mean"（窗口内均值）、
+        "topm"（前 top_m 个chunk均值）。
+        """
+        return self.search_papers_batch(
+            np.asarray(query_embedding, dtype=np.float32).reshape(1, -1), k, filter_metadata,
+            aggregate, top_m, max_candidates, mode
+        )[0]
+    
+    @profiling.timed("db.search_papers")
+    def search_papers_batch(self, query_embeddings: np.ndarray, k: int = config.SEARCH_TOP_K,
+                            filter_metadata: Optional[dict] = None, aggregate: str = None,
+                            top_m: int = None, max_candidates: int = None, mode: str = None
+                            ) -> List[List[Tuple[float, str, dict]]]:
+        """批量论文级检索（参数同 search_papers），每条查询返回一个结果列表
+        
+        所有查询合并为一次 Chroma 多查询请求；只有候选窗口不够的查询才单独扩大重查。
+        """
+        aggregate = aggregate or config.PAPER_SCORE_AGGREGATE
+        top_m = top_m or config.PAPER_TOP_M
+        max_candidates = max_candidates or config.PAPER_MAX_CANDIDATES
+        mode = mode or config.PAPER_SEARCH_MODE
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        
         try:
-            results = self.text_collection.query(
-                query_embeddings=[query_embedding.tolist()],
-                n_results=k * 3,  # 获取更多结果用于去重
-                where=filter_metadata
-            )
+            if k <= 0 or len(queries) == 0 or self.text_collection.count() == 0:
+                return [[] for _ in range(len(queries))]
             
-            formatted_results = []
-            seen_papers = set()  # 记录已看到的论文
+            if mode == "hierarchical" and filter_metadata is None and self.centroids_ready():
+                grouped = self._search_paper_shortlist(queries, k, max_candidates)
+            else:
+                grouped = self._search_paper_chunks(queries, k, filter_metadata, max_candidates)
+            return [self._rank_papers(papers, k, aggregate, top_m) for papers in grouped]
             
-            if results['distances'] and results['documents']:
-                distances = results['distances'][0]
-                
-                for i in range(len(distances)):
-                    distance = distances[i]
-                    
-                    # 相似度计算
-                    if distance < 0:
-                        similarity = 1.0 / (1.0 + abs(distance))
-                    else:
-                        similarity = 1.0 / (1.0 + distance)
-                    
-                    similarity = max(0.0, min(1.0, similarity))
-                    
-                    document = results['documents'][0][i]
-                    metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-                    source = metadata.get('source', '')
-                    
-                    # 按论文去重
-                    if source and source not in seen_papers:
-                        seen_papers.add(source)
-                        formatted_results.append((similarity, document, metadata))
-                    
-                    # 达到要求的论文数量就停止
-                    if len(formatted_results) >= k:
-                        break
+        except Exception as e:
+            print(f"❌ 搜索失败: {e}")
+            return [[] for _ in range(len(queries))]
+    
+    def _group_chunk_results(self, results, papers: dict, index: int = 0) -> int:
+        """把chunk查询结果中第 index 条查询的命中按论文分组到 papers，返回命中条数
+        
+        chunk 已按距离升序，每篇论文的首个即最佳chunk。
+        """
+        distances = results['distances'][index] if results['distances'] else []
+        for i, distance in enumerate(distances):
+            metadata = results['metadatas'][index][i] if results['metadatas'] else {}
+            source = metadata.get('source', '')
+            if not source:
+                continue
+            similarity = self._distance_to_similarity(distance)
+            if source not in papers:
+                papers[source] = {"scores": [], "document": results['documents'][index][i],
+                                  "metadata": metadata}
+            papers[source]["scores"].append(similarity)
+        return len(distances)
+    
+    def _rank_papers(self, papers: dict, k: int, aggregate: str,
+                     top_m: int) -> List[Tuple[float, str, dict]]:
+        """按聚合得分排序取前 k 篇"""
+        ranked = sorted(
+            ((self._aggregate_scores(info["scores"], aggregate, top_m),
+              info["document"], info["metadata"]) for info in papers.values()),
+            key=lambda item: item[0], reverse=True
+        )
+        return ranked[:k]
+    
+    @staticmethod
+    def _next_window(n_results: int, returned: int, found: int, k: int,
+                     limit: int) -> Optional[int]:
+        """候选窗口不够时返回下一轮窗口大小，否则返回 None
+        
+        找够论文、候选已耗尽或到达上限时停止；否则按当前每篇论文平均占用的
+        chunk数估算下一轮窗口，至少翻倍。
+        """
+        if found >= k or returned < n_results or n_results >= limit:
+            return None
+        per_paper = n_results / max(1, found)
+        return min(max(n_results * 2, int(per_paper * k * 1.5)), limit)
+    
+    def _search_paper_chunks(self, queries: np.ndarray, k: int,
+                             filter_metadata: Optional[dict], max_candidates: int) -> List[dict]:
+        """全量扫描：逐步扩大候选窗口，直到每条查询凑满 k 篇不同论文
+        
+        窗口从 k*3 个chunk开始，首轮所有查询一起提交；之后只有仍不够 k 篇的
+        查询单独扩大窗口重查，直到找到 k 篇论文、候选耗尽或达到 max_candidates 上限。
+        """
+        limit = min(max_candidates, self.text_collection.count())
+        n_results = min(k * 3, limit)
+        results = self.text_collection.query(
+            query_embeddings=queries.tolist(),
+            n_results=n_results,
+            where=filter_metadata
+        )
+        
+        grouped = []
+        for index, query in enumerate(queries):
+            papers = {}
+            returned = self._group_chunk_results(results, papers, index)
+            window = self._next_window(n_results, returned, len(papers), k, limit)
+            while window is not None:
+                single = self.text_collection.query(
+                    query_embeddings=[query.tolist()],
+                    n_results=window,
+                    where=filter_metadata
+                )
+                papers = {}
+                returned = self._group_chunk_results(single, papers)
+                window = self._next_window(window, returned, len(papers), k, limit)
+            grouped.append(papers)
+        return grouped
+    
+    def _search_paper_shortlist(self, queries: np.ndarray, k: int,
+                                max_candidates: int) -> List[dict]:
+        """分层检索：中心向量粗筛论文（所有查询一次提交），再在入选论文的chunk中精排"""
+        shortlist = self.centroid_collection.query(
+            query_embeddings=queries.tolist(),
+            n_results=min(k * config.PAPER_SHORTLIST_FACTOR, self.centroid_collection.count())
+        )
+        
+        grouped = []
+        for index, query in enumerate(queries):
+            metadatas = shortlist['metadatas'][index] if shortlist['metadatas'] else []
+            sources = [metadata.get('source') for metadata in metadatas if metadata.get('source')]
+            papers = {}
+            if sources:
+                # 入选论文的chunk总数已知，一次查询即可覆盖（受 max_candidates 限制）
+                chunk_total = sum(int(metadata.get('chunk_count', 1)) for metadata in metadatas)
+                results = self.text_collection.query(
+                    query_embeddings=[query.tolist()],
+                    n_results=max(1, min(chunk_total, max_candidates,
+                                         self.text_collection.count())),
+                    where={"source": {"$in": sources}}
+                )
+                self._group_chunk_results(results, papers)
+            grouped.append(papers)
+        return grouped
+    
+    def find_similar_papers(self, source: str, k: int = config.SEARCH_TOP_K
+                            ) -> List[Tuple[float, dict]]:
+        """按论文中心向量查找与指定论文最相似的其它论文，返回 [(相似度, metadata)]"""
+        try:
+            found = self.centroid_collection.get(where={"source": source},
+                                                 include=["embeddings"])
+            embeddings = found.get('embeddings')
+            if embeddings is None or len(embeddings) == 0:
+                return []
             
-            return formatted_results
+            results = self.centroid_collection.query(
+                query_embeddings=[np.asarray(embeddings[0], dtype=np.float32).tolist()],
+                n_results=min(k + 1, self.centroid_collection.count())
+            )
+            similar = []
+            distances = results['distances'][0] if results['distances'] else []
+            for i, distance in enumerate(distances):
+                metadata = results['metadatas'][0][i] if results['metadatas'] else {}
+                if metadata.get('source') == source:
+                    continue
+                similar.append((self._distance_to_similarity(distance), metadata))
+            return similar[:k]
             
         except Exception as e:
-            print(f"❌ 搜索失败: {e}")
+            print(f"❌ 查找相似论文失败: {e}")
             return []
     
+    @profiling.timed("db.search_images")
     def search_images(self, query_embedding: np.ndarray, k: int = config.SEARCH_TOP_K,
                      filter_metadata: Optional[dict] = None) -> List[Tuple[float, str, dict]]:
         """在图像中搜索（优化版，支持归一化特征）"""
+        if self.image_index is not None:
+            return self._search_flat_images(query_embedding, k, filter_metadata)
+        
         try:
             # 使用余弦相似度而不是默认的欧氏距离
             results = self.image_collection.query(
@@ -143,40 +585,94 @@ class VectorDB:
                 n_results=k,
                 where=filter_metadata
             )
+            return self._format_image_results(results, 0)
             
-            formatted_results = []
-            if results['distances'] and results['metadatas']:
-                distances = results['distances'][0]
+        except Exception as e:
+            print(f"❌ 图片搜索失败: {e}")
+            return []
+    
+    @staticmethod
+    def _format_image_results(results, index: int) -> List[Tuple[float, str, dict]]:
+        """把 Chroma 查询结果中第 index 条查询的命中转换为 [(相似度, 路径, metadata)]"""
+        formatted_results = []
+        if results['distances'] and results['metadatas']:
+            distances = results['distances'][index]
+            
+            for i in range(len(distances)):
+                # ChromaDB 返回的是欧氏距离的平方
+                # 对于归一化向量：distance² = 2*(1-cos_sim)
+                # 所以：cos_sim = 1 - distance²/2
+                distance_squared = distances[i]
                 
-                for i in range(len(distances)):
-                    # ChromaDB 返回的是欧氏距离的平方
-                    # 对于归一化向量：distance² = 2*(1-cos_sim)
-                    # 所以：cos_sim = 1 - distance²/2
-                    distance_squared = distances[i]
-                    
-                    # 计算余弦相似度（假设特征已经L2归一化）
-                    # 注意：这假设ChromaDB返回的是平方距离
-                    cosine_similarity = 1.0 - (distance_squared / 2.0)
-                    
-                    # 确保在合理范围内（余弦相似度应该在-1到1之间）
-                    cosine_similarity = max(-1.0, min(1.0, cosine_similarity))
-                    
-                    # 转换为0-1范围（对于展示更友好）
-                    # 余弦相似度-1到1 → 映射到0-1
-                    normalized_similarity = (cosine_similarity + 1.0) / 2.0
-                    
-                    metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-                    formatted_results.append((normalized_similarity, metadata.get('source', ''), metadata))
+                # 计算余弦相似度（假设特征已经L2归一化）
+                # 注意：这假设ChromaDB返回的是平方距离
+                cosine_similarity = 1.0 - (distance_squared / 2.0)
+                
+                # 确保在合理范围内（余弦相似度应该在-1到1之间）
+                cosine_similarity = max(-1.0, min(1.0, cosine_similarity))
+                
+                # 转换为0-1范围（对于展示更友好）
+                # 余弦相似度-1到1 → 映射到0-1
+                normalized_similarity = (cosine_similarity + 1.0) / 2.0
+                
+                metadata = results['metadatas'][index][i] if results['metadatas'] else {}
+                formatted_results.append((normalized_similarity, metadata.get('source', ''), metadata))
+        
+        return formatted_results
+    
+    @profiling.timed("db.search_images")
+    def search_images_batch(self, query_embeddings: np.ndarray, k: int = config.SEARCH_TOP_K,
+                            filter_metadata: Optional[dict] = None
+                            ) -> List[List[Tuple[float, str, dict]]]:
+        """批量图像检索：所有查询一次提交，每条查询返回一个结果列表"""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if len(queries) == 0:
+            return []
+        try:
+            if self.image_index is not None:
+                return [self._format_flat_hits(hits) for hits in
+                        self.image_index.search_many(queries, k, where=filter_metadata)]
             
-            return formatted_results
+            results = self.image_collection.query(
+                query_embeddings=queries.tolist(),
+                n_results=k,
+                where=filter_metadata
+            )
+            return [self._format_image_results(results, i) for i in range(len(queries))]
             
+        except Exception as e:
+            print(f"❌ 批量图片搜索失败: {e}")
+            return [[] for _ in range(len(queries))]
+    
+    def _search_flat_images(self, query_embedding: np.ndarray, k: int,
+                            filter_metadata: Optional[dict] = None) -> List[Tuple[float, str, dict]]:
+        """平面索引检索：一次矩阵-向量乘法 + argpartition"""
+        try:
+            return self._format_flat_hits(
+                self.image_index.search(query_embedding, k, where=filter_metadata))
         except Exception as e:
             print(f"❌ 图片搜索失败: {e}")
             return []
     
+    @staticmethod
+    def _format_flat_hits(hits) -> List[Tuple[float, str, dict]]:
+        """平面索引命中 [(内积, id, metadata)] → [(相似度, 路径, metadata)]"""
+        formatted_results = []
+        for cosine_similarity, _, metadata in hits:
+            # 与 Chroma 路径一致：余弦相似度-1到1 → 映射到0-1
+            cosine_similarity = max(-1.0, min(1.0, cosine_similarity))
+            normalized_similarity = (cosine_similarity + 1.0) / 2.0
+            formatted_results.append((normalized_similarity, metadata.get('source', ''), metadata))
+        return formatted_results
+    
+    @profiling.timed("db.search_images")
     def search_images_simple(self, query_embedding: np.ndarray, k: int = config.SEARCH_TOP_K,
                        filter_metadata: Optional[dict] = None) -> List[Tuple[float, str, dict]]:
         """在图像中搜索（简化版，确保返回结果）"""
+        if self.image_index is not None:
+            # 平面索引本身就是精确检索，不需要兜底
+            return self._search_flat_images(query_embedding, k, filter_metadata)
+        
         try:
             # 先尝试获取一些结果
             try:
@@ -187,9 +683,8 @@ class VectorDB:
                 )
             except Exception as query_error:
                 print(f"[警告] 查询失败: {query_error}")
-                # 如果查询失败，直接获取所有图片
-                results = self.image_collection.get()
-                return self._search_manually(query_embedding, results, k)
+                # 如果查询失败，直接对所有图片做暴力检索
+                return self._search_manually(query_embedding, k)
             
             formatted_results = []
             
@@ -210,8 +705,7 @@ class VectorDB:
             
             # 如果没找到结果，尝试手动搜索
             if not formatted_results:
-                all_results = self.image_collection.get()
-                return self._search_manually(query_embedding, all_results, k)
+                return self._search_manually(query_embedding, k)
             
             return formatted_results
             
@@ -219,40 +713,90 @@ class VectorDB:
             print(f"❌ 图片搜索失败: {e}")
             return []
     
-    def _search_manually(self, query_embedding: np.ndarray, all_results: dict, k: int):
-        """手动计算相似度"""
-        formatted_results = []
+    def _load_image_matrix(self) -> Tuple[np.ndarray, np.ndarray, List[Tuple[str, dict]]]:
+        """把全部图片向量载入为二维矩阵（已按行归一化），结果缓存到下一次写入
         
-        if all_results.get('embeddings') and all_results['embeddings']:
-            embeddings = all_results['embeddings']
-            metadatas = all_results['metadatas'] if all_results.get('metadatas') else []
+        返回 (归一化矩阵, 有效行掩码, [(图片路径, metadata)])
+        """
+        if self._image_matrix_cache is None:
+            results = self.image_collection.get(include=["embeddings", "metadatas"])
+            embeddings = results.get('embeddings')
+            metadatas = results.get('metadatas') or []
             
-            for i, emb in enumerate(embeddings):
-                try:
-                    stored_emb = np.array(emb).flatten()
-                    query_emb = query_embedding.flatten()
-                    
-                    # 计算余弦相似度
-                    dot_product = np.dot(query_emb, stored_emb)
-                    query_norm = np.linalg.norm(query_emb)
-                    stored_norm = np.linalg.norm(stored_emb)
-                    
-                    if query_norm > 0 and stored_norm > 0:
-                        similarity = dot_product / (query_norm * stored_norm)
-                        similarity = max(0.0, min(1.0, similarity))
-                        
-                        metadata = metadatas[i] if i < len(metadatas) else {}
-                        img_path = metadata.get('source', '') or metadata.get('path', '')
-                        
-                        if img_path:
-                            formatted_results.append((similarity, img_path, metadata))
-                except Exception as e:
-                    print(f"[警告] 计算相似度失败: {e}")
-                    continue
+            if embeddings is None or len(embeddings) == 0:
+                matrix = np.empty((0, config.IMAGE_EMBEDDING_DIM), dtype=np.float32)
+            else:
+                matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+            
+            # 范数只计算一次
+            norms = np.linalg.norm(matrix, axis=1)
+            entries = []
+            for i in range(len(matrix)):
+                metadata = metadatas[i] if i < len(metadatas) and metadatas[i] else {}
+                entries.append((metadata.get('source', '') or metadata.get('path', ''), metadata))
+            valid = (norms > 0) & np.array([bool(path) for path, _ in entries], dtype=bool)
+            normalized = matrix / np.where(norms > 0, norms, 1.0)[:, np.newaxis]
+            self._image_matrix_cache = (normalized, valid, entries)
+        return self._image_matrix_cache
+    
+    def _invalidate_image_matrix(self):
+        """图片集合有写入时使缓存的矩阵失效"""
+        self._image_matrix_cache = None
+    
+    def _search_manually(self, query_embedding: np.ndarray, k: int):
+        """手动计算相似度（向量化：一次矩阵乘法 + 部分排序）"""
+        matrix, valid, entries = self._load_image_matrix()
+        if len(matrix) == 0 or k <= 0:
+            return []
+        
+        query_emb = np.asarray(query_embedding, dtype=np.float32).flatten()
+        query_norm = np.linalg.norm(query_emb)
+        if query_norm == 0:
+            return []
         
+        # 计算余弦相似度
+        similarities = np.clip(matrix @ (query_emb / query_norm), 0.0, 1.0)
+        similarities[~valid] = -np.inf
+        
+        k = min(k, int(valid.sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-similarities, k - 1)[:k]
         # 按相似度排序
-        formatted_results.sort(key=lambda x: x[0], reverse=True)
-        return formatted_results[:k]
+        top = top[np.argsort(-similarities[top])]
+        
+        return [(float(similarities[i]), entries[i][0], entries[i][1]) for i in top]
+    
+    def get_embedding_matrix(self, kind: str, page_size: int = 4096) -> np.ndarray:
+        """读取全部 "papers"（文本块）或 "images" 向量为按行归一化的 float32 矩阵"""
+        if kind == "images":
+            if self.image_index is not None:
+                matrix = self.image_index.get_matrix()[1]
+            else:
+                matrix, valid, _ = self._load_image_matrix()
+                return matrix[valid]
+        else:
+            parts = []
+            total = self.text_collection.count()
+            for offset in range(0, total, page_size):
+                results = self.text_collection.get(include=["embeddings"],
+                                                   limit=page_size, offset=offset)
+                embeddings = results.get('embeddings')
+                if embeddings is not None and len(embeddings) > 0:
+                    parts.append(np.asarray(embeddings, dtype=np.float32))
+            if not parts:
+                return np.empty((0, config.EMBEDDING_DIM), dtype=np.float32)
+            matrix = np.concatenate(parts)
+        return self._normalized_rows(matrix) if len(matrix) else matrix
+    
+    def quantization_report(self, kind: str = "papers", k: int = 10,
+                            n_queries: int = 200) -> List[dict]:
+        """估算 float16 / int8 存储与全精度检索的 top-k 重合率（见 quantization 模块）
+        
+        只是评估：Chroma 中的论文和图片向量始终以 float32 存储，
+        实际压缩只作用于平面图片索引（IMAGE_INDEX_BACKEND=flat，FLAT_INDEX_DTYPE）。
+        """
+        return topk_overlap_report(self.get_embedding_matrix(kind), k=k, n_queries=n_queries)
     
     def get_all_papers(self) -> List[str]:
         """获取所有论文路径"""
@@ -268,16 +812,41 @@ class VectorDB:
             print(f"❌ 获取论文列表失败: {e}")
             return []
     
+    def get_all_images(self) -> List[dict]:
+        """获取所有图片的元数据"""
+        try:
+            if self.image_index is not None:
+                return [metadata for _, metadata in self.image_index.get_all()]
+            results = self.image_collection.get(include=["metadatas"])
+            return results['metadatas'] or []
+        except Exception as e:
+            print(f"❌ 获取图片列表失败: {e}")
+            return []
+    
+    def count_images(self) -> int:
+        """图片数量"""
+        if self.image_index is not None:
+            return len(self.image_index)
+        return self.image_collection.count()
+    
     def clear_database(self):
         """清空数据库"""
         try:
             # 删除集合
             self.client.delete_collection("papers")
             self.client.delete_collection("images")
+            self.client.delete_collection("paper_centroids")
             
             # 重新创建空集合
             self.text_collection = self.client.get_or_create_collection(name="papers")
             self.image_collection = self.client.get_or_create_collection(name="images")
+            self.centroid_collection = self.client.get_or_create_collection(name="paper_centroids")
+            self._centroid_sums = {}
+            if self.image_index is not None:
+                self.image_index.clear()
+            self._invalidate_image_matrix()
+            self.manifest.clear()
+            self._set_centroids_ready(True)
             
             print("✅ 数据库已清空")
             return True
@@ -293,9 +862,14 @@ class VectorDB:
                 "name": self.text_collection.name,
                 "count": self.text_collection.count()
             },
+            "centroid_collection": {
+                "name": self.centroid_collection.name,
+                "count": self.centroid_collection.count()
+            },
             "image_collection": {
                 "name": self.image_collection.name,
-                "count": self.image_collection.count()
+                "count": self.count_images(),
+                "backend": config.IMAGE_INDEX_BACKEND
             }
         }
         return stats
@@ -7,18 +7,26 @@ from pathlib import Path
 sys.path.append('.')
 from modules.image_processor import ImageProcessor
 from modules.vector_db import VectorDB
+from modules.ingest import ingest_images
+from modules import metrics
+import config
 
 print("正在初始化...")
 
 # 全局初始化（避免重复初始化）
 try:
-    image_processor = ImageProcessor()
+    image_processor = ImageProcessor(micro_batching=config.QUERY_MICRO_BATCHING)
     vector_db = VectorDB()
+    if config.METRICS_ENABLED:
+        # 阶段耗时（模型推理、Chroma 查询）在 start_server 中接入指标
+        metrics.register_app_gauges(vector_db)
+        metrics.start_server()
     print("✅ 初始化成功")
 except Exception as e:
     print(f"❌ 初始化失败: {e}")
     raise
 
+@metrics.track("search_images")
 def search_images_simple(query, top_k=3):
     """最简单的图片搜索"""
     try:
@@ -74,29 +82,19 @@ def search_images_simple(query, top_k=3):
         traceback.print_exc()
         return error_msg, []
 
+@metrics.track("add_images")
 def add_image_simple(files):
     """添加图片"""
     try:
         if not files:
             return "请选择图片文件"
         
-        success_count = 0
-        for file_info in files:
-            file_path = file_info.name
-            print(f"[上传] 处理: {Path(file_path).name}")
-            
-            # 编码图片
-            embedding = image_processor.encode_image(file_path)
-            
-            # 添加到数据库
-            metadata = {
-                "filename": Path(file_path).name,
-                "path": file_path,
-                "size": Path(file_path).stat().st_size
-            }
-            
-            if vector_db.add_image(file_path, embedding, metadata):
-                success_count += 1
+        file_paths = [file_info.name for file_info in files]
+        print(f"[上传] 批量处理 {len(file_paths)} 张图片")
+        
+        # 分批编码，已入库的图片按内容哈希跳过
+        result = ingest_images(file_paths, image_processor, vector_db)
+        success_count = result["added"] + result["skipped"]
         
         return f"✅ 成功添加 {success_count}/{len(files)} 张图片"
         
@@ -152,7 +150,7 @@ with gr.Blocks(title="AI图片搜索", theme=gr.themes.Soft()) as demo:
             status_output = gr.Markdown()
             
             def get_status():
-                count = vector_db.image_collection.count()
+                count = vector_db.count_images()
                 return f"**数据库状态**\n\n📊 图片数量: {count} 张"
             
             status_output.value = get_status()
@@ -0,0 +1,14 @@
+# tests/conftest.py
+import pytest
+import config
+
+@pytest.fixture
+def isolated_storage(tmp_path, monkeypatch):
+    """把数据库、清单、索引、任务日志指向临时目录，不影响 data/ 下的正式数据"""
+    monkeypatch.setattr(config, "DB_DIR", tmp_path / "chroma_db")
+    monkeypatch.setattr(config, "MANIFEST_PATH", tmp_path / "manifest.db")
+    monkeypatch.setattr(config, "JOB_JOURNAL_PATH", tmp_path / "jobs.db")
+    monkeypatch.setattr(config, "FLAT_INDEX_DIR", tmp_path / "image_index")
+    monkeypatch.setattr(config, "IMAGE_INDEX_BACKEND", "chroma")
+    (tmp_path / "chroma_db").mkdir()
+    return tmp_path
@@ -0,0 +1,65 @@
+# tests/test_batch_queries.py
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import config
+import main
+
+DIM = 8
+
+def test_read_queries_accepts_text_and_json(tmp_path):
+    path = tmp_path / "queries.txt"
+    path.write_text('transformer architecture\n\n{"query": "图像分割", "id": "q2", "lang": "zh"}\n'
+                    '{"id": 5}\n{not json\n', encoding="utf-8")
+    assert main.read_queries(str(path)) == [
+        {"query": "transformer architecture", "id": 1},
+        {"query": "图像分割", "id": "q2", "lang": "zh"},
+        {"query": '{"id": 5}', "id": 4},
+        {"query": "{not json", "id": 5},
+    ]
+
+def test_run_batch_queries_matches_single_queries(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "QUERY_BATCH_SIZE", 2)
+    texts = [f"query {i}" for i in range(5)]
+    (tmp_path / "queries.txt").write_text("\n".join(texts), encoding="utf-8")
+
+    def encode(batch):
+        return np.array([[len(text), int(text.split()[1])] for text in batch], dtype=np.float32)
+
+    def search_one(embedding):
+        return [(float(embedding[1] * 10 + rank), f"doc{int(embedding[1])}-{rank}") for rank in range(2)]
+
+    batches = []
+
+    def search_batch(embeddings):
+        batches.append(len(embeddings))
+        return [search_one(embedding) for embedding in embeddings]
+
+    args = SimpleNamespace(queries_file=str(tmp_path / "queries.txt"), output=str(tmp_path / "out.jsonl"))
+    main.run_batch_queries(args, encode, search_batch, lambda hit: {"score": hit[0], "id": hit[1]})
+    lines = [json.loads(line) for line in (tmp_path / "out.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert batches == [2, 2, 1]
+    assert [line["query"] for line in lines] == texts
+    for line, text in zip(lines, texts):
+        expected = search_one(encode([text])[0])
+        assert line["results"] == [{"score": score, "id": hit_id} for score, hit_id in expected]
+
+@pytest.mark.parametrize("mode", ["flat", "hierarchical"])
+def test_search_papers_batch_equals_single_queries(isolated_storage, mode):
+    pytest.importorskip("chromadb")
+    from modules.vector_db import VectorDB
+    rng = np.random.default_rng(0)
+    db = VectorDB()
+    for p in range(6):
+        vectors = rng.normal(size=(4, DIM))
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        db.add_paper_chunks(f"p{p}.pdf", [f"p{p} c{i}" for i in range(4)], vectors, {}, f"h{p}")
+        db.mark_paper_indexed(f"h{p}", f"p{p}.pdf", 4)
+    queries = rng.normal(size=(5, DIM)).astype(np.float32)
+
+    batch = db.search_papers_batch(queries, k=3, mode=mode)
+    single = [db.search_papers(query, k=3, mode=mode) for query in queries]
+    assert batch == single and all(len(hits) == 3 for hits in batch)
@@ -0,0 +1,55 @@
+# tests/test_batcher.py
+import threading
+
+import pytest
+
+from modules.batcher import MicroBatcher
+
+def _submit_concurrently(batcher, items):
+    """并发提交，返回 {item: 结果或异常}"""
+    outcomes = {}
+    barrier = threading.Barrier(len(items))
+
+    def call(item):
+        barrier.wait()
+        try:
+            outcomes[item] = batcher.submit(item)
+        except Exception as e:
+            outcomes[item] = e
+
+    threads = [threading.Thread(target=call, args=(item,)) for item in items]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+def test_concurrent_requests_are_batched_in_order():
+    sizes = []
+
+    def double(items):
+        sizes.append(len(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_batch_size=8, max_wait_ms=50)
+    outcomes = _submit_concurrently(batcher, list(range(8)))
+    assert outcomes == {item: item * 2 for item in range(8)}
+    assert sum(sizes) == 8 and max(sizes) > 1
+    assert batcher.stats()["items"] == 8
+
+def test_batch_error_is_raised_to_every_caller():
+    def fail(items):
+        raise ValueError("boom")
+
+    batcher = MicroBatcher(fail, max_batch_size=4, max_wait_ms=50)
+    outcomes = _submit_concurrently(batcher, [1, 2, 3, 4])
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes.values())
+    # 出错后工作线程继续服务后续请求
+    batcher.batch_fn = lambda items: items
+    assert batcher.submit(5) == 5
+
+def test_wrong_result_count_fails_the_batch():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=1, max_wait_ms=0)
+    with pytest.raises(RuntimeError):
+        batcher.submit("x")
+    assert batcher.stats()["batches"] == 0
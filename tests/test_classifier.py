@@ -0,0 +1,41 @@
+# tests/test_classifier.py
+import pytest
+
+pytest.importorskip("sklearn")
+fitz = pytest.importorskip("fitz")
+if not hasattr(fitz.open(), "new_page"):
+    pytest.skip("需要 PyMuPDF 生成测试 PDF", allow_module_level=True)
+
+from modules.classifier import Classifier
+
+TEXTS = {
+    "rl": "Reinforcement learning agent maximises reward with a learned policy.",
+    "cv": "Convolutional networks for image segmentation and object detection.",
+    "nlp": "A transformer language model with attention for natural language text.",
+    "robot": "Robot manipulation with kinematics and motion control.",
+}
+
+def _write_pdf(path, text):
+    document = fitz.open()
+    document.new_page().insert_text((72, 72), text)
+    document.save(str(path))
+    document.close()
+    return str(path)
+
+@pytest.fixture
+def pdfs(tmp_path):
+    paths = [_write_pdf(tmp_path / f"{name}{i}.pdf", text)
+             for i in range(2) for name, text in TEXTS.items()]
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    return paths + [str(broken)]
+
+def test_process_pool_matches_serial(pdfs):
+    classifier = Classifier()
+    serial = list(classifier.classify_pdfs(pdfs, workers=1))
+    pooled = list(classifier.classify_pdfs(pdfs, workers=2))
+    # 进程池（spawn）按输入顺序返回，结果与串行一致
+    assert pooled == serial
+    assert [path for path, _, _ in pooled] == pdfs
+    assert [topic for _, topic, _ in pooled[:4]] == ["RL", "CV", "NLP", "Robotics"]
+    assert pooled[-1][1] == "Other"
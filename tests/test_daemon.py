@@ -0,0 +1,94 @@
+# tests/test_daemon.py
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import config
+from modules import daemon
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 守护进程在子进程中运行：服务端重定向的是进程级 stdout，不能与客户端共用
+SERVER = textwrap.dedent("""
+    import sys, time
+    from pathlib import Path
+    import config
+    config.DAEMON_TOKEN_PATH = Path(sys.argv[1])
+    config.DAEMON_PORT = 0
+    from modules import daemon
+
+    def dispatch(argv):
+        command, *args = argv
+        if command == "echo":
+            print(" ".join(args))
+        elif command == "exit":
+            sys.exit(None if args[0] == "none" else int(args[0]) if args[0].isdigit() else args[0])
+        elif command == "sleep":
+            print("sleeping", flush=True)
+            time.sleep(float(args[0]))
+        elif command == "touch":
+            Path(args[0]).write_text("ran")
+        return 0
+
+    daemon.DaemonServer(dispatch).serve()
+""")
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    token_path = tmp_path / "daemon.json"
+    script = tmp_path / "server.py"
+    script.write_text(SERVER)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    process = subprocess.Popen([sys.executable, str(script), str(token_path)], cwd=ROOT, env=env)
+    deadline = time.time() + 10
+    while not token_path.exists() or not token_path.read_text():
+        assert time.time() < deadline and process.poll() is None, "守护进程未能启动"
+        time.sleep(0.05)
+    monkeypatch.setattr(config, "DAEMON_TOKEN_PATH", token_path)
+    yield token_path
+    daemon.shutdown()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def test_round_trip_forwards_output(server, capsys):
+    assert daemon.forward(["echo", "hello", "daemon"]) == 0
+    assert capsys.readouterr().out == "hello daemon\n"
+
+@pytest.mark.parametrize("code, expected, output", [
+    ("none", 0, ""), ("3", 3, ""), ("参数错误", 1, "参数错误\n")])
+def test_exit_codes_propagate(server, capsys, code, expected, output):
+    assert daemon.forward(["exit", code]) == expected
+    assert capsys.readouterr().out == output
+
+def test_wrong_token_is_rejected(server, monkeypatch, capsys):
+    info = daemon._read_token()
+    with monkeypatch.context() as patch:
+        patch.setattr(daemon, "_read_token", lambda: dict(info, token="bad"))
+        assert daemon.forward(["echo", "secret"]) == 1
+    assert "令牌不匹配" in capsys.readouterr().out
+
+def test_token_file_is_private(server):
+    assert server.stat().st_mode & 0o077 == 0
+
+def test_client_timeout(server, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(config, "DAEMON_READ_TIMEOUT", 0.5)
+    # 已开始执行后超时：报错退出
+    blocker = threading.Thread(target=daemon.forward, args=(["sleep", "2"],))
+    blocker.start()
+    time.sleep(0.2)
+    # 排队期间超时：返回 None 由调用方本地执行，守护进程之后也不会再执行
+    marker = tmp_path / "ran.txt"
+    assert daemon.forward(["touch", str(marker)]) is None
+    blocker.join()
+    out = capsys.readouterr().out
+    assert "没有输出，已断开" in out and "改为在当前进程执行" in out
+    time.sleep(0.5)
+    assert not marker.exists()
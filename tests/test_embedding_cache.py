@@ -0,0 +1,71 @@
+# tests/test_embedding_cache.py
+import itertools
+
+import numpy as np
+import pytest
+
+from modules import embedding_cache
+from modules.embedding_cache import EmbeddingCache, cached_encode
+
+MODEL = "all-MiniLM-L6-v2@torch"
+
+def _vector(value):
+    return np.full(4, value, dtype=np.float32)
+
+@pytest.fixture
+def clock(monkeypatch):
+    """单调递增的时间，保证 last_used 不会相同"""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: float(next(ticks)))
+
+def test_memory_lru_evicts_least_recently_used():
+    cache = EmbeddingCache(memory_items=2, persistent=False)
+    cache.put(MODEL, "a", _vector(1))
+    cache.put(MODEL, "b", _vector(2))
+    assert cache.get(MODEL, "a") is not None
+    cache.put(MODEL, "c", _vector(3))
+    assert cache.get(MODEL, "b") is None
+    assert cache.get(MODEL, "a") is not None and cache.get(MODEL, "c") is not None
+    assert cache.stats()["memory_items"] == 2
+
+def test_disk_trim_keeps_recently_used(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), memory_items=1, disk_items=2)
+    cache.put(MODEL, "a", _vector(1))
+    cache.put(MODEL, "b", _vector(2))
+    cache.get(MODEL, "a")
+    cache.put(MODEL, "c", _vector(3))
+    assert cache.stats()["disk_items"] == 2
+    reopened = EmbeddingCache(str(tmp_path / "cache.db"))
+    assert reopened.get(MODEL, "b") is None
+    np.testing.assert_array_equal(reopened.get(MODEL, "a"), _vector(1))
+
+def test_vectors_persist_across_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    EmbeddingCache(path).put_many(MODEL, ["deep  learning", "图像检索"], [_vector(1), _vector(2)])
+    reopened = EmbeddingCache(path)
+    # 规范化后的文本命中同一条
+    vectors = reopened.get_many(MODEL, ["deep learning", "图像检索", "other"])
+    np.testing.assert_array_equal(vectors[0], _vector(1))
+    np.testing.assert_array_equal(vectors[1], _vector(2))
+    assert vectors[2] is None
+    stats = reopened.stats()
+    assert stats["disk_hits"] == 2 and stats["misses"] == 1
+
+def test_keys_separate_models_and_backends(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"))
+    cache.put(MODEL, "query", _vector(1))
+    assert cache.get("all-MiniLM-L6-v2@onnx-int8", "query") is None
+    assert cache.get("clip-vit-base-patch32@torch#text", "query") is None
+    assert EmbeddingCache.make_key(MODEL, "q") != EmbeddingCache.make_key("all-MiniLM-L6-v2@onnx", "q")
+
+def test_cached_encode_only_encodes_misses():
+    cache = EmbeddingCache(persistent=False)
+    cache.put(MODEL, "known", _vector(9))
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        return np.stack([_vector(len(text)) for text in texts])
+    result = cached_encode(cache, MODEL, ["known", "new", "new"], encode)
+    assert calls == [["new"]]
+    np.testing.assert_array_equal(result, np.stack([_vector(9), _vector(3), _vector(3)]))
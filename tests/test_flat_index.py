@@ -0,0 +1,153 @@
+# tests/test_flat_index.py
+import threading
+
+import numpy as np
+import pytest
+
+from modules.flat_index import FlatIndex
+
+DIM = 8
+
+def _vectors(n, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def _fill(index, n, seed=0, prefix="v"):
+    vectors = _vectors(n, seed)
+    ids = [f"{prefix}{i}" for i in range(n)]
+    index.upsert(ids, vectors, [{"n": i, "group": i % 2} for i in range(n)])
+    return ids, vectors
+
+@pytest.fixture
+def small_capacity(monkeypatch):
+    monkeypatch.setattr(FlatIndex, "INITIAL_CAPACITY", 8)
+
+def test_upsert_and_search(tmp_path):
+    index = FlatIndex(tmp_path, DIM)
+    ids, vectors = _fill(index, 20)
+    assert len(index) == 20
+    hits = index.search(vectors[3], k=3)
+    assert hits[0][1] == "v3" and hits[0][0] == pytest.approx(1.0, abs=1e-5)
+    filtered = index.search(vectors[3], k=3, where={"group": 0})
+    assert all(metadata["group"] == 0 for _, _, metadata in filtered)
+
+def test_upsert_existing_id_replaces_row(tmp_path):
+    index = FlatIndex(tmp_path, DIM)
+    _fill(index, 5)
+    replacement = _vectors(1, seed=9)
+    index.upsert(["v2"], replacement, [{"n": 99}])
+    assert len(index) == 5 and index.count == 6
+    hit = index.search(replacement[0], k=1)[0]
+    assert hit[1] == "v2" and hit[2] == {"n": 99}
+    assert sorted(record_id for record_id, _ in index.get_all()) == [f"v{i}" for i in range(5)]
+
+def test_delete_and_reopen(tmp_path):
+    index = FlatIndex(tmp_path, DIM)
+    _, vectors = _fill(index, 10)
+    assert index.delete(["v1", "v4", "missing"]) == 2
+    assert index.delete(["v1"]) == 0
+    reopened = FlatIndex(tmp_path, DIM)
+    assert len(reopened) == 8
+    ids, matrix = reopened.get_matrix()
+    assert "v1" not in ids and "v4" not in ids
+    np.testing.assert_allclose(matrix[ids.index("v5")], vectors[5], atol=1e-6)
+    assert reopened.search(vectors[1], k=1)[0][1] != "v1"
+
+def test_delete_compacts_dead_rows(tmp_path, small_capacity):
+    index = FlatIndex(tmp_path, DIM)
+    ids, vectors = _fill(index, 20)
+    index.delete(ids[:15])
+    assert index.count == len(index) == 5
+    assert index.search(vectors[17], k=1)[0][1] == "v17"
+
+def test_repeated_upserts_compact(tmp_path, small_capacity):
+    index = FlatIndex(tmp_path, DIM)
+    _fill(index, 10)
+    for seed in range(1, 6):
+        _fill(index, 10, seed=seed)
+    # 同一批 ID 覆盖写入 5 次，无效行不会无限增长
+    assert len(index) == 10
+    assert index.count < 2 * 10 + 10
+    reopened = FlatIndex(tmp_path, DIM)
+    assert len(reopened) == 10
+    last = _vectors(10, seed=5)
+    assert reopened.search(last[7], k=1)[0][1] == "v7"
+
+def test_convert_dtype_on_reopen(tmp_path):
+    index = FlatIndex(tmp_path, DIM, dtype="float32")
+    _, vectors = _fill(index, 10)
+    converted = FlatIndex(tmp_path, DIM, dtype="int8")
+    assert converted.dtype == np.int8 and len(converted) == 10
+    assert converted.search(vectors[6], k=1)[0][1] == "v6"
+
+def test_search_consistent_during_compaction(tmp_path, small_capacity):
+    index = FlatIndex(tmp_path, DIM)
+    _, vectors = _fill(index, 16)
+    errors = []
+
+    def writer():
+        for seed in range(1, 30):
+            _fill(index, 16, seed=seed)
+
+    def reader():
+        for _ in range(200):
+            for score, record_id, metadata in index.search(vectors[0], k=4):
+                if f"v{metadata['n']}" != record_id:
+                    errors.append((record_id, metadata))
+
+    threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_blockwise_top_k_matches_full_scan(tmp_path, monkeypatch, dtype):
+    monkeypatch.setattr(FlatIndex, "SCORE_BLOCK_ROWS", 7)
+    monkeypatch.setattr(FlatIndex, "CAST_BLOCK_ROWS", 3)
+    index = FlatIndex(tmp_path, DIM, dtype=dtype)
+    _, vectors = _fill(index, 40)
+    index.delete(["v5", "v11"])
+    queries = _vectors(5, seed=3)
+    ids, stored = index.get_matrix()
+
+    for query, hits in zip(queries, index.search_many(queries, k=6)):
+        expected = [ids[i] for i in np.argsort(-(stored @ query))[:6]]
+        assert [record_id for _, record_id, _ in hits] == expected
+    filtered = index.search_many(queries, k=50, where={"group": 1})
+    assert all(len(hits) == 18 for hits in filtered)
+    assert all(metadata["group"] == 1 for hits in filtered for _, _, metadata in hits)
+
+def test_duplicate_ids_in_batch_keep_last(tmp_path):
+    index = FlatIndex(tmp_path, DIM)
+    vectors = _vectors(3)
+    index.upsert(["a", "b", "a"], vectors, [{"n": 0}, {"n": 1}, {"n": 2}])
+    assert len(index) == index.count == 2
+    assert dict(index.get_all()) == {"a": {"n": 2}, "b": {"n": 1}}
+    assert sorted(record_id for _, record_id, _ in index.search(vectors[0], k=5)) == ["a", "b"]
+    assert index.delete(["a"]) == 1 and len(index) == 1
+
+def test_reopen_with_different_dim_raises(tmp_path):
+    _fill(FlatIndex(tmp_path, DIM), 3)
+    with pytest.raises(ValueError):
+        FlatIndex(tmp_path, DIM * 2)
+
+def test_search_reads_metadata_file_once(tmp_path, monkeypatch):
+    import builtins
+    index = FlatIndex(tmp_path, DIM)
+    _, vectors = _fill(index, 20)
+    opened = []
+    original = builtins.open
+
+    def counting_open(path, *args, **kwargs):
+        if str(path).endswith("meta.jsonl"):
+            opened.append(path)
+        return original(path, *args, **kwargs)
+    monkeypatch.setattr(builtins, "open", counting_open)
+    hits = index.search_many(vectors[:3], k=5)
+    assert [len(result) for result in hits] == [5, 5, 5] and len(opened) == 1
+    opened.clear()
+    # 过滤条件扫描一遍，读取结果元数据一遍
+    index.search(vectors[0], k=5, where={"group": 1})
+    assert len(opened) == 2
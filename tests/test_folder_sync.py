@@ -0,0 +1,78 @@
+# tests/test_folder_sync.py
+import os
+
+import numpy as np
+import pytest
+
+from modules import folder_sync
+from modules.file_utils import FileUtils
+from modules.manifest import IngestManifest
+
+class _ImageProcessor:
+    def iter_image_batches(self, paths):
+        vectors = np.eye(len(paths), 8, dtype=np.float32)
+        yield list(paths), vectors, {}
+
+def _write_images(folder, count):
+    folder.mkdir(exist_ok=True)
+    for i in range(count):
+        (folder / f"img{i}.png").write_bytes(b"image %d" % i)
+
+@pytest.fixture
+def manifest(tmp_path):
+    return IngestManifest(str(tmp_path / "manifest.db"))
+
+def _record_all(manifest, scanned):
+    manifest.record_synced("image", [(path, *stat, FileUtils.compute_file_hash(path))
+                                     for path, stat in scanned.items()])
+
+def test_plan_sync_detects_changes(tmp_path, manifest):
+    root = tmp_path / "photos"
+    _write_images(root, 4)
+    scanned = FileUtils.scan_files(str(root), folder_sync.SYNC_EXTENSIONS["image"])
+    plan = folder_sync.plan_sync(str(root), "image", manifest, scanned)
+    assert sorted(plan["added"]) == sorted(scanned) and not plan["unchanged"]
+    _record_all(manifest, scanned)
+
+    paths = {name: str(root / name) for name in ("img0.png", "img1.png", "img2.png", "img3.png")}
+    (root / "img0.png").write_bytes(b"changed content")
+    stat = os.stat(paths["img1.png"])
+    os.utime(paths["img1.png"], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    os.remove(paths["img2.png"])
+    (root / "new.png").write_bytes(b"new")
+
+    scanned = FileUtils.scan_files(str(root), folder_sync.SYNC_EXTENSIONS["image"])
+    plan = folder_sync.plan_sync(str(root), "image", manifest, scanned)
+    assert plan["added"] == [str(root / "new.png")]
+    # 只看大小和修改时间：内容变化和仅时间变化都算 modified，由同步时的哈希区分
+    assert sorted(plan["modified"]) == [paths["img0.png"], paths["img1.png"]]
+    assert plan["deleted"] == [paths["img2.png"]]
+    assert plan["unchanged"] == [paths["img3.png"]]
+
+def test_plan_sync_ignores_other_roots(tmp_path, manifest):
+    _write_images(tmp_path / "photos", 1)
+    _write_images(tmp_path / "photos2", 1)
+    other = FileUtils.scan_files(str(tmp_path / "photos2"), folder_sync.SYNC_EXTENSIONS["image"])
+    _record_all(manifest, other)
+    scanned = FileUtils.scan_files(str(tmp_path / "photos"), folder_sync.SYNC_EXTENSIONS["image"])
+    plan = folder_sync.plan_sync(str(tmp_path / "photos"), "image", manifest, scanned)
+    assert plan["deleted"] == [] and len(plan["added"]) == 1
+
+def test_sync_hashes_each_new_image_once(isolated_storage, monkeypatch):
+    pytest.importorskip("chromadb")
+    from modules.vector_db import VectorDB
+    root = isolated_storage / "photos"
+    _write_images(root, 3)
+    db = VectorDB()
+    calls = []
+    original = folder_sync.FileUtils.compute_file_hash
+
+    def counting(path, *args, **kwargs):
+        calls.append(path)
+        return original(path, *args, **kwargs)
+    monkeypatch.setattr(folder_sync.FileUtils, "compute_file_hash", counting)
+
+    components = {"vector_db": db, "image_processor": _ImageProcessor()}
+    summary = folder_sync.sync_folder(str(root), "image", db.manifest, components.__getitem__)
+    assert summary["added"] == 3
+    assert sorted(calls) == sorted(set(calls)) and len(calls) == 3
@@ -0,0 +1,64 @@
+# tests/test_image_processor.py
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+Image = pytest.importorskip("PIL.Image")
+pytest.importorskip("torchvision")
+
+from modules.image_processor import ImageProcessor
+
+POISON = 255  # 红色通道为 255 的图片在前向计算时报错
+
+class _Preprocessor:
+    def __call__(self, images, return_tensors="np"):
+        value = images.getpixel((0, 0))[0] / 255.0
+        return {"pixel_values": np.full((1, 3, 2, 2), value, dtype=np.float32)}
+
+class _Model:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def get_image_features(self, pixel_values):
+        self.batch_sizes.append(len(pixel_values))
+        if bool((pixel_values == 1.0).any()):
+            raise RuntimeError("bad pixels")
+        return pixel_values.flatten(1)[:, :4] + 0.1
+
+@pytest.fixture
+def processor():
+    # 不加载 CLIP，只替换模型与预处理器
+    processor = ImageProcessor.__new__(ImageProcessor)
+    processor.model = _Model()
+    processor.image_preprocessor = _Preprocessor()
+    processor.input_size = 224
+    processor.device = "cpu"
+    return processor
+
+def _write_image(path, red):
+    Image.new("RGB", (8, 8), (red, 10, 10)).save(path)
+    return str(path)
+
+def test_unreadable_image_does_not_fail_batch(tmp_path, processor):
+    good = [_write_image(tmp_path / f"ok{i}.png", 20 * (i + 1)) for i in range(3)]
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not an image")
+    paths = [good[0], str(broken), good[1], good[2]]
+
+    batches = list(processor.iter_image_batches(paths, batch_size=2, num_workers=2))
+    ok_paths = [path for batch_paths, _, _ in batches for path in batch_paths]
+    failed = {path: error for _, _, errors in batches for path, error in errors.items()}
+    assert ok_paths == good
+    assert list(failed) == [str(broken)]
+    embeddings = np.concatenate([vectors for _, vectors, _ in batches])
+    assert embeddings.shape == (3, 4)
+    np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-5)
+
+def test_encode_failure_retries_images_individually(tmp_path, processor):
+    paths = [_write_image(tmp_path / "a.png", 40), _write_image(tmp_path / "poison.png", POISON),
+             _write_image(tmp_path / "b.png", 80)]
+    [(ok_paths, embeddings, failed)] = list(processor.iter_image_batches(paths, batch_size=3))
+    assert ok_paths == [paths[0], paths[2]] and embeddings.shape == (2, 4)
+    assert failed == {paths[1]: "bad pixels"}
+    # 整批一次，失败后逐张重试三次
+    assert processor.model.batch_sizes == [3, 1, 1, 1]
@@ -0,0 +1,68 @@
+# tests/test_image_search.py
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+
+from modules.vector_db import VectorDB
+
+DIM = 8
+
+def _reference_search(query_embedding, all_results, k):
+    """原逐条循环实现，作为向量化兜底检索的对照"""
+    formatted_results = []
+    metadatas = all_results.get('metadatas') or []
+    for i, emb in enumerate(all_results['embeddings']):
+        stored_emb = np.array(emb).flatten()
+        query_emb = query_embedding.flatten()
+        query_norm = np.linalg.norm(query_emb)
+        stored_norm = np.linalg.norm(stored_emb)
+        if query_norm > 0 and stored_norm > 0:
+            similarity = np.dot(query_emb, stored_emb) / (query_norm * stored_norm)
+            similarity = max(0.0, min(1.0, similarity))
+            metadata = metadatas[i] if i < len(metadatas) else {}
+            img_path = metadata.get('source', '') or metadata.get('path', '')
+            if img_path:
+                formatted_results.append((similarity, img_path, metadata))
+    formatted_results.sort(key=lambda x: x[0], reverse=True)
+    return formatted_results[:k]
+
+@pytest.fixture
+def db(isolated_storage):
+    db = VectorDB()
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(30, DIM)) * rng.uniform(0.5, 3.0, size=(30, 1))
+    vectors[4] = 0.0
+    db.add_images([f"img{i}.png" for i in range(30)], vectors,
+                  content_hashes=[f"h{i}" for i in range(30)])
+    # 没有路径的记录不参与检索
+    db.image_collection.upsert(ids=["nopath"], embeddings=[vectors[7].tolist()],
+                               metadatas=[{"content_hash": "nopath"}])
+    db._invalidate_image_matrix()
+    return db, vectors
+
+def test_vectorised_fallback_matches_loop(db):
+    db, vectors = db
+    all_results = db.image_collection.get(include=["embeddings", "metadatas"])
+    rng = np.random.default_rng(1)
+    for query in list(vectors[[1, 7, 12]] + 0.1 * rng.normal(size=(3, DIM))) + [rng.normal(size=DIM)]:
+        expected = _reference_search(query, all_results, 5)
+        actual = db._search_manually(query, 5)
+        assert [path for _, path, _ in actual] == [path for _, path, _ in expected]
+        np.testing.assert_allclose([score for score, _, _ in actual],
+                                   [score for score, _, _ in expected], atol=1e-5)
+    assert db._search_manually(np.zeros(DIM), 5) == []
+
+def test_writes_invalidate_matrix_cache(db):
+    db, vectors = db
+    query = np.ones(DIM)
+    db._search_manually(query, 3)
+    assert db._image_matrix_cache is not None
+
+    assert db.add_images(["best.png"], query[np.newaxis], content_hashes=["best"])
+    assert db._image_matrix_cache is None
+    assert db._search_manually(query, 1)[0][1] == "best.png"
+
+    assert db.remove_images(["best"])
+    assert db._image_matrix_cache is None
+    assert "best.png" not in [path for _, path, _ in db._search_manually(query, 31)]
@@ -0,0 +1,83 @@
+# tests/test_ingest.py
+from contextlib import nullcontext
+
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+
+from modules import ingest
+from modules.vector_db import VectorDB
+
+DIM = 8
+
+class _Classifier:
+    def classify_document(self, document, topics=None):
+        return "ML"
+
+class _TextProcessor:
+    """每批两个chunk，共三批"""
+
+    def iter_document_batches(self, document):
+        rng = np.random.default_rng(0)
+        for b in range(3):
+            vectors = rng.normal(size=(2, DIM))
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            yield [f"batch{b} chunk{i}" for i in range(2)], vectors, None
+
+@pytest.fixture
+def pdf(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest.FileUtils, "open_pdf", lambda path: nullcontext())
+    path = tmp_path / "paper.pdf"
+    path.write_bytes(b"%PDF fake")
+    return path
+
+def test_failed_batch_removes_partial_paper(isolated_storage, pdf, monkeypatch):
+    db = VectorDB()
+    original = db.add_paper_chunks
+    calls = []
+
+    def flaky(*args, **kwargs):
+        calls.append(1)
+        return False if len(calls) == 3 else original(*args, **kwargs)
+    monkeypatch.setattr(db, "add_paper_chunks", flaky)
+
+    result = ingest.ingest_paper(str(pdf), _TextProcessor(), db, _Classifier(),
+                                 move=False, content_hash="h1")
+    assert result["status"] == "failed"
+    assert db.text_collection.get(where={"content_hash": "h1"})["ids"] == []
+    assert "h1" not in db._centroid_sums
+    assert not db.is_paper_indexed("h1")
+
+def test_successful_ingest_writes_all_batches(isolated_storage, pdf):
+    db = VectorDB()
+    result = ingest.ingest_paper(str(pdf), _TextProcessor(), db, _Classifier(),
+                                 move=False, content_hash="h1")
+    assert result["status"] == "added"
+    assert len(db.text_collection.get(where={"content_hash": "h1"})["ids"]) == 6
+    assert db.is_paper_indexed("h1")
+
+def test_same_filename_reserves_distinct_targets(tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    monkeypatch.setattr(ingest.config, "PAPERS_DIR", tmp_path / "papers")
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        targets = list(pool.map(lambda _: ingest.FileUtils.resolve_target_path("/in/paper.pdf", "ML"),
+                                range(16)))
+    assert len(set(targets)) == 16
+    for target in targets:
+        ingest.FileUtils.release_target_path(target)
+    assert list((tmp_path / "papers" / "ML").iterdir()) == []
+
+def test_failed_move_removes_paper_and_placeholder(isolated_storage, pdf, monkeypatch):
+    monkeypatch.setattr(ingest.config, "PAPERS_DIR", isolated_storage / "papers")
+
+    def failing_move(source, target):
+        raise OSError("disk full")
+    monkeypatch.setattr("modules.file_utils.shutil.move", failing_move)
+    db = VectorDB()
+    with pytest.raises(OSError):
+        ingest.ingest_paper(str(pdf), _TextProcessor(), db, _Classifier(), content_hash="h1")
+    assert db.text_collection.get(where={"content_hash": "h1"})["ids"] == []
+    assert not db.is_paper_indexed("h1")
+    assert pdf.exists()
+    assert list((isolated_storage / "papers" / "ML").iterdir()) == []
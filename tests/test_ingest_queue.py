@@ -0,0 +1,97 @@
+# tests/test_ingest_queue.py
+import os
+import threading
+import time
+
+import pytest
+
+import config
+from modules import ingest_queue
+from modules.ingest_queue import IngestQueue
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "等待超时"
+        time.sleep(0.01)
+
+class _FakeIngest:
+    """代替 ingest_images：记录执行顺序，每张图片之间报告一次进度"""
+
+    def __init__(self):
+        self.order = []
+        self.steps = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, paths, image_processor, vector_db, on_result=None, on_progress=None):
+        self.release.wait()
+        self.order.append(os.path.basename(paths[0]))
+        for i, path in enumerate(paths, 1):
+            on_progress(i)
+            self.steps.append(i)
+            on_result(path, "added", "")
+        return {"total": len(paths), "added": len(paths), "skipped": 0, "failed": 0}
+
+@pytest.fixture
+def fake_ingest(monkeypatch):
+    fake = _FakeIngest()
+    monkeypatch.setattr(ingest_queue, "ingest_images", fake)
+    monkeypatch.setattr(config, "INGEST_NICE", 0)
+    return fake
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = IngestQueue(None, None, None, None, workers=1, upload_dir=str(tmp_path / "uploads"))
+    yield queue
+    queue._idle.set()
+    queue.shutdown()
+
+def _images(tmp_path, prefix, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"{prefix}{i}.png"
+        path.write_bytes(b"png")
+        paths.append(str(path))
+    return paths
+
+def test_jobs_run_in_submission_order(tmp_path, queue, fake_ingest):
+    fake_ingest.release.clear()
+    jobs = [queue.submit_images(_images(tmp_path, f"batch{b}-", 2)) for b in range(3)]
+    assert [job.job_id for job in jobs] == [1, 2, 3]
+    assert queue.counts()["queued"] + queue.counts()["running"] == 3
+    fake_ingest.release.set()
+    _wait_until(lambda: all(job.status == "done" for job in jobs))
+    assert fake_ingest.order == ["batch0-0.png", "batch1-0.png", "batch2-0.png"]
+    assert [job["job_id"] for job in queue.list_jobs()] == [3, 2, 1]
+    assert all(job.done == 2 and job.message.startswith("新增 2") for job in jobs)
+
+def test_worker_pauses_while_foreground_active(tmp_path, queue, fake_ingest, monkeypatch):
+    monkeypatch.setattr(config, "INGEST_YIELD_MAX_S", 10)
+    with queue.foreground():
+        job = queue.submit_images(_images(tmp_path, "img", 3))
+        _wait_until(lambda: job.done == 1)
+        time.sleep(0.2)
+        # 第一批之后在让步处等待，不继续处理
+        assert fake_ingest.steps == [] and job.status == "running"
+        with queue.foreground():
+            pass
+        time.sleep(0.1)
+        assert fake_ingest.steps == []
+    _wait_until(lambda: job.status == "done")
+    assert fake_ingest.steps == [1, 2, 3]
+
+def test_yield_is_bounded(tmp_path, queue, fake_ingest, monkeypatch):
+    monkeypatch.setattr(config, "INGEST_YIELD_MAX_S", 0.05)
+    with queue.foreground():
+        job = queue.submit_images(_images(tmp_path, "img", 3))
+        # 前台一直占用时后台仍会在超时后继续
+        _wait_until(lambda: job.status == "done")
+
+def test_shutdown_waits_for_queued_jobs(tmp_path, fake_ingest):
+    queue = IngestQueue(None, None, None, None, workers=1, upload_dir=str(tmp_path / "uploads"))
+    jobs = [queue.submit_images(_images(tmp_path, f"b{b}-", 1)) for b in range(3)]
+    queue.shutdown(wait=True)
+    assert [job.status for job in jobs] == ["done", "done", "done"]
+    with pytest.raises(RuntimeError):
+        queue.submit_images(_images(tmp_path, "late", 1))
@@ -0,0 +1,69 @@
+# tests/test_job_journal.py
+import subprocess
+import sys
+
+import pytest
+
+from modules.job_journal import JobJournal
+
+@pytest.fixture
+def journal(tmp_path):
+    return JobJournal(str(tmp_path / "jobs.db"))
+
+def _set_owner(journal, job_id, pid):
+    journal._conn.execute("UPDATE jobs SET owner_pid = ? WHERE job_id = ?", (pid, job_id))
+    journal._conn.commit()
+
+def test_file_states_and_remaining(journal):
+    job_id = journal.create_job("add_images", "/photos", ["a", "b", "c", "d"])
+    journal.mark_many(job_id, [("a", "written", ""), ("b", "failed", "bad"), ("c", "encoded", "CV")])
+    assert journal.counts(job_id) == {"pending": 1, "encoded": 1, "written": 1, "failed": 1}
+    assert [path for path, _, _ in journal.remaining(job_id)] == ["c", "d"]
+    assert [path for path, _, _ in journal.remaining(job_id, include_failed=True)] == ["b", "c", "d"]
+
+def test_job_status_transitions(journal):
+    first = journal.create_job("organize", "/papers", ["x.pdf"])
+    second = journal.create_job("add_images", "/photos", ["a"])
+    journal.set_job_status(second, "done")
+    # 本进程创建的 running 任务不算“被其它进程占用”
+    assert journal.latest_resumable()["job_id"] == first
+    journal.set_job_status(first, "interrupted")
+    assert journal.latest_resumable("organize")["job_id"] == first
+    assert journal.latest_resumable("add_images") is None
+
+def test_claim_refuses_job_owned_by_live_process(journal):
+    job_id = journal.create_job("add_images", "/photos", ["a"])
+    other = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        _set_owner(journal, job_id, other.pid)
+        assert journal.get_job(job_id)["live"]
+        assert journal.latest_resumable() is None
+        assert not journal.claim(job_id)
+        assert journal.claim(job_id, force=True)
+        assert journal.get_job(job_id)["owner_pid"] != other.pid
+    finally:
+        other.kill()
+        other.wait()
+
+def test_claim_takes_over_job_of_exited_process(journal):
+    job_id = journal.create_job("add_images", "/photos", ["a"])
+    finished = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                              capture_output=True, text=True)
+    _set_owner(journal, job_id, int(finished.stdout))
+    assert not journal.get_job(job_id)["live"]
+    assert journal.latest_resumable()["job_id"] == job_id
+    assert journal.claim(job_id)
+    assert journal.get_job(job_id)["status"] == "running"
+
+def test_reopen_adds_owner_column_to_old_journal(tmp_path):
+    import sqlite3
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(str(path))
+    conn.execute("CREATE TABLE jobs (job_id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, "
+                 "source TEXT, options TEXT, status TEXT NOT NULL, created_at REAL, updated_at REAL)")
+    conn.execute("INSERT INTO jobs (kind, source, options, status) VALUES ('organize', '/p', '{}', 'interrupted')")
+    conn.commit()
+    conn.close()
+    journal = JobJournal(str(path))
+    assert journal.get_job(1)["owner_pid"] is None
+    assert journal.claim(1)
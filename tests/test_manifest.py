@@ -0,0 +1,40 @@
+# tests/test_manifest.py
+import os
+
+import pytest
+
+from modules.manifest import IngestManifest
+
+@pytest.fixture
+def manifest(tmp_path):
+    return IngestManifest(str(tmp_path / "manifest.db"))
+
+def test_record_filter_and_remove(manifest):
+    manifest.record_many("image", [("h1", "/a.png", 1), ("h2", "/b.png", 1)])
+    manifest.record("paper", "h1", "/p.pdf", 12)
+    assert manifest.contains("image", "h1") and not manifest.contains("image", "h3")
+    assert manifest.get("paper", "h1")["item_count"] == 12
+    assert manifest.filter_new("image", ["h3", "h1", "h4", "h2"]) == ["h3", "h4"]
+    assert manifest.count("image") == 2
+    manifest.remove_many("image", ["h1", "h2"])
+    assert manifest.count("image") == 0 and manifest.count("paper") == 1
+
+def test_synced_files_prefix_query(manifest, tmp_path):
+    root = str(tmp_path / "photos")
+    inside = os.path.join(root, "a.png")
+    nested = os.path.join(root, "sub", "b.png")
+    sibling = str(tmp_path / "photos2" / "c.png")
+    manifest.record_synced("image", [(inside, 1, 10, "h1"), (nested, 2, 20, "h2"),
+                                     (sibling, 3, 30, "h3")])
+    assert manifest.synced_files("image", root) == {inside: (1, 10, "h1"), nested: (2, 20, "h2")}
+    assert manifest.synced_files("paper", root) == {}
+    manifest.remove_synced("image", [inside])
+    assert list(manifest.synced_files("image", root)) == [nested]
+
+def test_clear_kind_also_clears_sync_state(manifest, tmp_path):
+    manifest.record("image", "h1", "/a.png")
+    manifest.record_synced("image", [(str(tmp_path / "a.png"), 1, 1, "h1")])
+    manifest.record("paper", "p1", "/p.pdf")
+    manifest.clear("image")
+    assert manifest.count("image") == 0 and manifest.synced_files("image", str(tmp_path)) == {}
+    assert manifest.count("paper") == 1
@@ -0,0 +1,80 @@
+# tests/test_metrics.py
+import urllib.request
+
+import pytest
+
+import config
+from modules import metrics, profiling
+
+def test_counter_and_gauge_rendering():
+    registry = metrics.Registry()
+    counter = registry.counter("jobs_total", "Jobs", ("kind", "status"))
+    counter.inc("paper", "ok")
+    counter.inc("paper", "ok", amount=2)
+    counter.inc('we"ird\n', "error")
+    assert registry.counter("jobs_total", "ignored") is counter
+    registry.gauge("items", "Items", lambda: {("papers",): 3}, ("collection",))
+    registry.gauge("broken", "Broken", lambda: 1 / 0)
+
+    text = registry.render()
+    assert text.endswith("\n")
+    lines = text.splitlines()
+    assert lines[:2] == ["# HELP jobs_total Jobs", "# TYPE jobs_total counter"]
+    assert 'jobs_total{kind="paper",status="ok"} 3.0' in lines
+    assert 'jobs_total{kind="we\\"ird\\n",status="error"} 1.0' in lines
+    assert 'items{collection="papers"} 3.0' in lines
+    # 采集失败只影响该指标
+    assert "# TYPE broken gauge" in lines and any(line.startswith("# collect failed") for line in lines)
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("latency_seconds", "Latency", ("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "search")
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{op="search",le="0.1"} 2.0',
+        'latency_seconds_bucket{op="search",le="1.0"} 3.0',
+        'latency_seconds_bucket{op="search",le="+Inf"} 4.0',
+        'latency_seconds_sum{op="search"} 3.65',
+        'latency_seconds_count{op="search"} 4.0',
+    ]
+
+def test_track_records_status(monkeypatch):
+    requests = metrics.Counter("requests", "Requests", ("operation", "status"))
+    monkeypatch.setattr(metrics, "REQUESTS", requests)
+    monkeypatch.setattr(metrics, "REQUEST_LATENCY", metrics.Histogram("latency", "Latency", ("operation",)))
+
+    @metrics.track("search")
+    def handler(fail=False):
+        if fail:
+            raise RuntimeError("boom")
+        return "ok"
+    assert handler() == "ok"
+    with pytest.raises(RuntimeError):
+        handler(fail=True)
+    assert requests._values == {("search", "ok"): 1.0, ("search", "error"): 1.0}
+
+def test_server_exports_stage_metrics(monkeypatch):
+    monkeypatch.setattr(profiling, "_listeners", [])
+    monkeypatch.setattr(profiling, "_active", False)
+    monkeypatch.setattr(profiling, "_enabled", False)
+    stage = metrics.Histogram("assistant_stage_duration_seconds", "Stages", ("stage",))
+    monkeypatch.setattr(metrics, "STAGE_LATENCY", stage)
+    registry = metrics.Registry()
+    registry._metrics[stage.name] = stage
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+
+    # 端口 0 由系统分配空闲端口
+    monkeypatch.setattr(config, "METRICS_PORT", 0)
+    server = metrics.start_server(host="127.0.0.1")
+    try:
+        # 页面计时开关关闭时阶段耗时照样汇入指标
+        with profiling.span("db.query"):
+            pass
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert 'assistant_stage_duration_seconds_count{stage="db.query"} 1.0' in body
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,54 @@
+# tests/test_model_registry.py
+import sys
+import types
+
+import pytest
+
+import config
+from modules import model_registry, onnx_backend
+
+class _TorchModel:
+    def __init__(self, name):
+        self.name = name
+        self.device = "cpu"
+
+    def to(self, device):
+        self.device = device
+        return self
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    model_registry.clear()
+    yield
+    model_registry.clear()
+
+@pytest.fixture
+def onnx_backend_enabled(monkeypatch):
+    monkeypatch.setattr(config, "INFERENCE_BACKEND", "onnx")
+    monkeypatch.setitem(sys.modules, "sentence_transformers",
+                        types.SimpleNamespace(SentenceTransformer=_TorchModel))
+
+def test_failed_onnx_export_falls_back_to_torch(onnx_backend_enabled, monkeypatch, capsys):
+    calls = []
+
+    def failing_export(name):
+        calls.append(name)
+        raise RuntimeError("exporter crashed")
+    monkeypatch.setattr(onnx_backend, "load_text_encoder", failing_export)
+
+    model = model_registry.get_text_model("mini", device="cuda")
+    assert isinstance(model, _TorchModel)
+    assert "exporter crashed" in capsys.readouterr().out
+    assert model_registry.backend_name(model) == "torch"
+    # 设备取实际加载的 PyTorch 模型，而不是因 INFERENCE_BACKEND=onnx 固定为 CPU
+    assert model_registry.model_device(model) == "cuda"
+    # 失败结果被缓存，不会每次都重新导出
+    assert model_registry.get_text_model("mini", device="cuda") is model
+    assert calls == ["mini"]
+
+def test_loaded_onnx_model_runs_on_cpu(onnx_backend_enabled, monkeypatch):
+    encoder = types.SimpleNamespace(backend="onnx-int8")
+    monkeypatch.setattr(onnx_backend, "load_text_encoder", lambda name: encoder)
+    model = model_registry.get_text_model("mini", device="cuda")
+    assert model is encoder
+    assert model_registry.model_device(model) == "cpu"
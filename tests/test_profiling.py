@@ -0,0 +1,61 @@
+# tests/test_profiling.py
+import time
+
+import pytest
+
+from modules import profiling
+
+@pytest.fixture(autouse=True)
+def isolated_profiling(monkeypatch):
+    monkeypatch.setattr(profiling, "_enabled", False)
+    monkeypatch.setattr(profiling, "_active", False)
+    monkeypatch.setattr(profiling, "_stats", {})
+    monkeypatch.setattr(profiling, "_listeners", [])
+
+def test_disabled_span_is_shared_noop():
+    assert profiling.span("a") is profiling.span("b")
+    with profiling.span("a"):
+        pass
+    assert profiling.snapshot() == {}
+
+def test_nested_spans_record_both_stages():
+    profiling.enable()
+
+    @profiling.timed("outer")
+    def outer():
+        for _ in range(3):
+            with profiling.span("inner"):
+                time.sleep(0.002)
+    outer()
+    stats = profiling.snapshot()
+    assert stats["outer"]["calls"] == 1 and stats["inner"]["calls"] == 3
+    assert stats["outer"]["total_s"] >= stats["inner"]["total_s"] > 0
+    assert "outer" in profiling.format_report(wall_seconds=1.0)
+
+def test_listener_receives_spans_without_stats():
+    events = []
+    profiling.add_listener(lambda name, seconds: events.append((name, seconds)))
+    with pytest.raises(ValueError):
+        with profiling.span("outer"):
+            with profiling.span("inner"):
+                raise ValueError("boom")
+    # 内层先结束；异常退出同样通知；统计未开启时不累计
+    assert [name for name, _ in events] == ["inner", "outer"]
+    assert all(seconds >= 0 for _, seconds in events)
+    assert profiling.snapshot() == {}
+
+    profiling.enable(False)
+    with profiling.span("after-disable"):
+        pass
+    assert events[-1][0] == "after-disable"
+
+def test_listener_registered_once():
+    events = []
+
+    def listener(name, seconds):
+        events.append(name)
+    profiling.add_listener(listener)
+    profiling.add_listener(listener)
+    with profiling.span("stage"):
+        pass
+    assert events == ["stage"]
@@ -0,0 +1,46 @@
+# tests/test_quantization.py
+import numpy as np
+import pytest
+
+from modules.quantization import (bytes_per_vector, dequantize_int8, quantize_int8, roundtrip,
+                                  topk_overlap_report)
+
+def _unit_vectors(n, dim=64, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_int8_roundtrip_error_is_bounded_per_row():
+    matrix = _unit_vectors(50)
+    quantized, scales = quantize_int8(matrix)
+    assert quantized.dtype == np.int8 and scales.dtype == np.float32
+    assert np.abs(quantized).max() == 127
+    restored = dequantize_int8(quantized, scales)
+    # 每个元素的误差不超过半个量化步长
+    assert np.all(np.abs(restored - matrix) <= scales[:, np.newaxis] / 2 + 1e-7)
+
+def test_int8_handles_zero_rows_and_single_vector():
+    quantized, scales = quantize_int8(np.zeros((2, 4)))
+    assert np.all(quantized == 0) and np.all(scales == 1.0)
+    single, _ = quantize_int8(np.array([0.5, -1.0, 0.25]))
+    assert single.shape == (1, 3)
+    assert single[0].tolist() == [64, -127, 32]
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_roundtrip_preserves_scores(dtype):
+    matrix = _unit_vectors(100)
+    stored = roundtrip(matrix, dtype)
+    assert stored.dtype == np.float32
+    assert np.abs(matrix @ matrix[0] - stored @ matrix[0]).max() < 0.02
+
+def test_bytes_per_vector():
+    assert bytes_per_vector("float32", 512) == 2048
+    assert bytes_per_vector("float16", 512) == 1024
+    assert bytes_per_vector("int8", 512) == 516
+
+def test_topk_overlap_report():
+    report = {entry["dtype"]: entry for entry in topk_overlap_report(_unit_vectors(300), k=10,
+                                                                     n_queries=50)}
+    assert report["float32"]["overlap_mean"] == 1.0
+    assert report["float32"]["max_score_error"] == 0.0
+    assert report["int8"]["overlap_mean"] > 0.9
+    assert report["int8"]["compression"] == pytest.approx(256 / 68)
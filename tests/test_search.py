@@ -0,0 +1,152 @@
+# tests/test_search.py
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+
+from modules.vector_db import VectorDB
+
+DIM = 8
+
+def _paper_vectors(rng, center, n):
+    vectors = center + 0.05 * rng.normal(size=(n, DIM))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+@pytest.fixture
+def corpus():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(4, DIM))
+    return rng, centers / np.linalg.norm(centers, axis=1, keepdims=True)
+
+def _write_legacy_paper(db, source, vectors):
+    """模拟旧版本入库：chunk 只有 source，没有 content_hash，也没有清单记录"""
+    db.text_collection.upsert(
+        ids=[f"{source}:{i}" for i in range(len(vectors))],
+        embeddings=vectors.tolist(),
+        metadatas=[{"source": source, "topic": "ML"} for _ in vectors],
+        documents=[f"{source} chunk {i}" for i in range(len(vectors))]
+    )
+
+def test_legacy_papers_survive_rebuild_and_hierarchical_search(isolated_storage, corpus):
+    rng, centers = corpus
+    old = VectorDB()
+    for p in range(3):
+        _write_legacy_paper(old, f"legacy{p}.pdf", _paper_vectors(rng, centers[p], 4))
+    # 旧版本的清单没有中心向量状态标记，升级后首次打开时统计一次
+    old.manifest._conn.execute("DROP TABLE settings")
+    old.manifest._conn.commit()
+    db = VectorDB()
+
+    # 新入库一篇论文：有中心向量，但旧论文还没有
+    db.add_paper_chunks("new.pdf", ["a", "b"], _paper_vectors(rng, centers[3], 2),
+                        {"topic": "CV"}, "hash-new")
+    db.mark_paper_indexed("hash-new", "new.pdf", 2)
+    assert db.count_papers() == 4
+    assert not db.centroids_ready()
+
+    # 未重建前退回全量扫描，旧论文仍可检索
+    hits = db.search_papers(centers[1], k=1, mode="hierarchical")
+    assert hits[0][2]["source"] == "legacy1.pdf"
+
+    assert db.rebuild_paper_centroids() == 4
+    assert db.centroids_ready()
+    for p in range(3):
+        hits = db.search_papers(centers[p], k=1, mode="hierarchical")
+        assert hits[0][2]["source"] == f"legacy{p}.pdf"
+
+    # 旧论文的中心向量不伪造 content_hash
+    legacy = db.centroid_collection.get(where={"source": "legacy0.pdf"}, include=["metadatas"])
+    assert "content_hash" not in legacy["metadatas"][0]
+
+def test_centroids_ready_is_persisted_without_scanning(isolated_storage, corpus, monkeypatch):
+    rng, centers = corpus
+    db = VectorDB()
+    db.add_paper_chunks("p0.pdf", ["a", "b"], _paper_vectors(rng, centers[0], 2), {}, "h0")
+    db.mark_paper_indexed("h0", "p0.pdf", 2)
+    reopened = VectorDB()
+
+    def no_scan(*args, **kwargs):
+        raise AssertionError("查询路径不应扫描chunk元数据")
+    monkeypatch.setattr(reopened.text_collection, "get", no_scan)
+    assert reopened.centroids_ready()
+    reopened.search_papers(centers[0], k=1, mode="hierarchical")
+
+    def failing_upsert(*args, **kwargs):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(reopened.centroid_collection, "upsert", failing_upsert)
+    reopened._accumulate_centroid("h1", "p1.pdf", {}, _paper_vectors(rng, centers[1], 2))
+    reopened._write_centroid("h1")
+    assert not reopened.centroids_ready()
+    # 清空后重新入库的论文都有中心向量
+    assert reopened.clear_database()
+    reopened.add_paper_chunks("p2.pdf", ["c"], _paper_vectors(rng, centers[2], 1), {}, "h2")
+    reopened.mark_paper_indexed("h2", "p2.pdf", 1)
+    assert VectorDB().centroids_ready()
+
+def test_hierarchical_matches_flat_ranking(isolated_storage, corpus):
+    rng, centers = corpus
+    db = VectorDB()
+    for p in range(4):
+        vectors = _paper_vectors(rng, centers[p], 3)
+        db.add_paper_chunks(f"p{p}.pdf", [f"c{i}" for i in range(3)], vectors, {}, f"h{p}")
+        db.mark_paper_indexed(f"h{p}", f"p{p}.pdf", 3)
+    assert db.centroids_ready()
+
+    queries = centers[[0, 2]]
+    flat = db.search_papers_batch(queries, k=2, mode="flat")
+    hierarchical = db.search_papers_batch(queries, k=2, mode="hierarchical")
+    assert [[m["source"] for _, _, m in r] for r in hierarchical] == \
+           [[m["source"] for _, _, m in r] for r in flat]
+
+def test_next_window_grows_and_terminates():
+    # 找够论文、候选耗尽（返回数少于请求数）或到达上限时停止
+    assert VectorDB._next_window(30, 30, 10, 10, 1000) is None
+    assert VectorDB._next_window(30, 12, 2, 10, 1000) is None
+    assert VectorDB._next_window(1000, 1000, 2, 10, 1000) is None
+    # 按每篇论文平均占用的chunk数估算，至少翻倍，不超过上限
+    assert VectorDB._next_window(30, 30, 5, 6, 1000) == 60
+    assert VectorDB._next_window(30, 30, 5, 10, 1000) == 90
+    assert VectorDB._next_window(30, 30, 1, 10, 1000) == 450
+    assert VectorDB._next_window(30, 30, 1, 10, 200) == 200
+    window, steps = 6, 0
+    while window is not None:
+        window, steps = VectorDB._next_window(window, window, 1, 5, 500), steps + 1
+    assert steps < 10
+
+def test_window_expands_until_enough_papers(isolated_storage, corpus, monkeypatch):
+    rng, centers = corpus
+    db = VectorDB()
+    # 一篇论文的chunk占满首轮窗口，需要扩大窗口才能凑满 k 篇
+    db.add_paper_chunks("big.pdf", [f"b{i}" for i in range(20)],
+                        _paper_vectors(rng, centers[0], 20), {}, "big")
+    for p in (1, 2):
+        db.add_paper_chunks(f"p{p}.pdf", ["c"], _paper_vectors(rng, centers[p], 1), {}, f"h{p}")
+    windows = []
+    original = db.text_collection.query
+
+    def counting(**kwargs):
+        windows.append(kwargs["n_results"])
+        return original(**kwargs)
+    monkeypatch.setattr(db.text_collection, "query", counting)
+
+    hits = db.search_papers(centers[0], k=3, mode="flat")
+    assert sorted(m["source"] for _, _, m in hits) == ["big.pdf", "p1.pdf", "p2.pdf"]
+    assert windows[0] == 9 and windows == sorted(windows) and windows[-1] <= 22
+    # 候选不足 k 篇时不会无限重查
+    windows.clear()
+    assert len(db.search_papers(centers[0], k=5, mode="flat")) == 3
+    assert len(windows) <= 3
+
+def test_max_and_mean_aggregation_rank_differently():
+    papers = {
+        "spiky.pdf": {"scores": [0.95, 0.2, 0.1, 0.1], "document": "s", "metadata": {"source": "spiky.pdf"}},
+        "steady.pdf": {"scores": [0.8, 0.75, 0.7], "document": "t", "metadata": {"source": "steady.pdf"}},
+    }
+    db = VectorDB.__new__(VectorDB)
+
+    def order(aggregate):
+        return [m["source"] for _, _, m in db._rank_papers(papers, 2, aggregate, 2)]
+    assert order("max") == ["spiky.pdf", "steady.pdf"]
+    assert order("mean") == ["steady.pdf", "spiky.pdf"]
+    assert order("topm") == ["steady.pdf", "spiky.pdf"]
+    assert db._rank_papers(papers, 1, "mean", 2)[0][0] == pytest.approx(0.75)
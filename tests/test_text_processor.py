@@ -0,0 +1,70 @@
+# tests/test_text_processor.py
+import re
+
+import pytest
+
+from modules.text_processor import TextProcessor
+
+class _WhitespaceTokenizer:
+    """按空白分词的快速分词器替身（提供字符偏移）"""
+    is_fast = True
+
+    def __call__(self, text, **kwargs):
+        return {"offset_mapping": [match.span() for match in re.finditer(r"\S+", text)]}
+
+class _Model:
+    tokenizer = _WhitespaceTokenizer()
+    max_seq_length = 8
+
+@pytest.fixture
+def processor():
+    # 不加载真实模型，只测试切块逻辑
+    processor = TextProcessor.__new__(TextProcessor)
+    processor.model = _Model()
+    return processor
+
+def _pages(words_per_page, page_count):
+    return [" ".join(f"p{p}w{i}" for i in range(words_per_page)) + "\n"
+            for p in range(1, page_count + 1)]
+
+def test_chunks_are_exact_slices_of_full_text(processor):
+    pages = _pages(5, 4)
+    full_text = "".join(pages)
+    chunks = list(processor.iter_token_chunks(pages, max_tokens=6, overlap=2))
+    assert chunks
+    for text, metadata in chunks:
+        assert text == full_text[metadata["char_start"]:metadata["char_end"]]
+        assert len(text.split()) == metadata["token_count"] <= 6
+
+def test_overlap_and_full_coverage(processor):
+    pages = _pages(5, 4)
+    chunks = list(processor.iter_token_chunks(pages, max_tokens=6, overlap=2))
+    token_lists = [text.split() for text, _ in chunks]
+    for previous, current in zip(token_lists, token_lists[1:]):
+        assert previous[-2:] == current[:2]
+    covered = [token for tokens in token_lists for token in tokens]
+    assert set(covered) == set("".join(pages).split())
+    assert token_lists[-1][-1] == "p4w4"
+
+def test_page_mapping(processor):
+    pages = _pages(5, 3)
+    chunks = list(processor.iter_token_chunks(pages, max_tokens=4, overlap=0))
+    first, second = chunks[0][1], chunks[1][1]
+    assert (first["page_start"], first["page_end"]) == (1, 1)
+    # 第二个chunk 包含第1页最后一个词与第2页前三个词
+    assert (second["page_start"], second["page_end"]) == (1, 2)
+    assert chunks[1][0] == "p1w4\np2w0 p2w1 p2w2"
+
+def test_empty_pages_between_tokens_are_kept(processor):
+    pages = ["a b c\n", "   \n", "", "d e f\n"]
+    full_text = "".join(pages)
+    chunks = list(processor.iter_token_chunks(pages, max_tokens=4, overlap=0))
+    text, metadata = chunks[0]
+    assert (metadata["page_start"], metadata["page_end"]) == (1, 4)
+    assert text == full_text[metadata["char_start"]:metadata["char_end"]] == "a b c\n   \nd"
+
+def test_short_document_is_one_chunk(processor):
+    chunks = list(processor.iter_token_chunks(["only three words"], max_tokens=8, overlap=2))
+    assert chunks == [("only three words", {"char_start": 0, "char_end": 16, "page_start": 1,
+                                            "page_end": 1, "token_count": 3})]
+    assert list(processor.iter_token_chunks(["", "  "])) == []
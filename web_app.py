@@ -10,22 +10,33 @@ from modules.image_processor import ImageProcessor
 from modules.vector_db import VectorDB
 from modules.classifier import Classifier
 from modules.file_utils import FileUtils
+from modules.ingest_queue import IngestQueue
+from modules import metrics, profiling
 import config
 
 class WebAssistant:
     def __init__(self):
         print("正在初始化AI助手...")
-        self.text_processor = TextProcessor()
-        self.image_processor = ImageProcessor()
+        # 多个用户同时搜索时，查询编码合并为批量前向计算
+        self.text_processor = TextProcessor(micro_batching=config.QUERY_MICRO_BATCHING)
+        self.image_processor = ImageProcessor(micro_batching=config.QUERY_MICRO_BATCHING)
         self.vector_db = VectorDB()
         self.classifier = Classifier()
+        # 上传在后台线程中入库，页面立即返回任务编号
+        self.ingest_queue = IngestQueue(self.text_processor, self.image_processor,
+                                        self.vector_db, self.classifier)
+        # 页面上的阶段耗时表；指标导出的阶段耗时不受此开关影响（见 metrics.start_server）
+        profiling.enable(config.WEB_PROFILING_ENABLED)
         print("✅ 初始化完成")
     
+    @metrics.track("search_papers")
     def search_papers(self, query, top_k=5):
         """搜索论文"""
         try:
-            query_embedding = self.text_processor.encode_text(query)
-            results = self.vector_db.search_text(query_embedding, k=top_k)
+            # 检索期间后台入库在批次之间暂停，保证检索延迟
+            with self.ingest_queue.foreground():
+                query_embedding = self.text_processor.encode_text(query)
+                results = self.vector_db.search_text(query_embedding, k=top_k)
             
             if not results:
                 return "没有找到相关论文"
@@ -44,11 +55,13 @@ class WebAssistant:
         except Exception as e:
             return f"搜索失败: {str(e)}"
     
+    @metrics.track("search_images")
     def search_images(self, query, top_k=5):
         """搜索图片"""
         try:
-            query_embedding = self.image_processor.encode_text_for_image_search(query)
-            results = self.vector_db.search_images(query_embedding, k=top_k)
+            with self.ingest_queue.foreground():
+                query_embedding = self.image_processor.encode_text_for_image_search(query)
+                results = self.vector_db.search_images(query_embedding, k=top_k)
             
             if not results:
                 return "没有找到相关图片", []
@@ -84,92 +97,38 @@ class WebAssistant:
         except Exception as e:
             return f"搜索失败: {str(e)}", []
     
+    @metrics.track("enqueue_paper")
     def add_paper(self, file):
-        """添加论文"""
+        """添加论文（后台入库）"""
         try:
             if not file:
                 return "请选择PDF文件"
             
-            # 保存上传的文件
-            upload_dir = Path("data/uploads")
-            upload_dir.mkdir(exist_ok=True)
-            file_path = upload_dir / Path(file.name).name
-            
-            with open(file_path, "wb") as f:
-                f.write(file.read())
-            
-            # 处理论文
-            chunks, embeddings = self.text_processor.process_pdf(str(file_path))
-            if not chunks:
-                return "无法提取文本内容"
-            
-            # 分类
-            topic = self.classifier.classify_pdf(str(file_path))
-            
-            # 整理文件
-            target_path = FileUtils.organize_file(str(file_path), topic)
-            
-            # 添加到数据库
-            metadata = {
-                "title": file_path.stem,
-                "topic": topic,
-                "original_path": str(file_path),
-                "organized_path": target_path
-            }
-            
-            success = self.vector_db.add_paper(target_path, chunks, embeddings, metadata)
-            
-            if success:
-                return f"✅ 论文添加成功！\n分类: {topic}\n保存到: {target_path}"
-            else:
-                return "❌ 添加到数据库失败"
+            # 上传文件流式保存后加入队列，提取、分类、编码在后台完成
+            job = self.ingest_queue.submit_paper(file)
+            return f"📥 已加入入库队列（任务 #{job.job_id}）: {job.name}\n进度见下方“入库任务”"
                 
         except Exception as e:
             return f"处理失败: {str(e)}"
     
+    @metrics.track("enqueue_images")
     def add_images(self, files):
-        """添加图片"""
+        """添加图片（后台入库）"""
         try:
             if not files:
                 return "请选择图片文件"
             
-            success_count = 0
-            total_count = len(files)
-            
-            output_messages = []
-            for file_info in files:
-                file_path = file_info.name
-                filename = Path(file_path).name
-                print(f"[上传] 处理: {filename}")
-                
-                try:
-                    # 编码图片
-                    embedding = self.image_processor.encode_image(file_path)
-                    
-                    # 添加到数据库
-                    metadata = {
-                        "filename": filename,
-                        "path": file_path,
-                        "size": Path(file_path).stat().st_size
-                    }
-                    
-                    if self.vector_db.add_image(file_path, embedding, metadata):
-                        success_count += 1
-                        output_messages.append(f"✅ {filename}: 添加成功")
-                    else:
-                        output_messages.append(f"❌ {filename}: 添加到数据库失败")
-                        
-                except Exception as e:
-                    output_messages.append(f"❌ {filename}: 处理失败 - {str(e)}")
-            
-            summary = f"### 上传完成\n成功: {success_count}/{total_count} 张\n\n"
-            summary += "\n".join(output_messages)
-            
-            return summary
+            print(f"[上传] {len(files)} 张图片加入入库队列")
+            job = self.ingest_queue.submit_images(files)
+            return f"📥 已加入入库队列（任务 #{job.job_id}）: {job.name}\n进度见下方“入库任务”"
             
         except Exception as e:
             return f"❌ 上传失败: {str(e)}"
     
+    def get_ingest_jobs(self):
+        """后台入库任务列表"""
+        return "### 📥 入库任务\n\n" + self.ingest_queue.format_status()
+    
     def get_database_stats(self):
         """获取数据库统计信息"""
         try:
@@ -199,8 +158,26 @@ class WebAssistant:
         except Exception as e:
             return f"获取统计信息失败: {str(e)}"
 
+    def get_stage_timings(self):
+        """获取各阶段累计耗时"""
+        return "## ⏱️ 阶段耗时\n\n" + profiling.format_markdown()
+    
+    def set_profiling(self, enabled):
+        """开启/关闭阶段计时"""
+        profiling.enable(bool(enabled))
+        return self.get_stage_timings()
+    
+    def reset_stage_timings(self):
+        """清空阶段计时"""
+        profiling.reset()
+        return self.get_stage_timings()
+
 def create_interface():
     assistant = WebAssistant()
+    if config.METRICS_ENABLED:
+        metrics.register_app_gauges(assistant.vector_db)
+        metrics.register_ingest_gauges(assistant.ingest_queue)
+        metrics.start_server()
     
     with gr.Blocks(title="本地AI智能助手", theme=gr.themes.Soft()) as demo:
         gr.Markdown("""
@@ -304,6 +281,24 @@ def create_interface():
                             update_stats,
                             outputs=stats_output
                         )
+                        
+                        # 分阶段计时（提取、切块、编码、分类、写库、检索）
+                        with gr.Row():
+                            profiling_toggle = gr.Checkbox(
+                                value=profiling.is_enabled(), label="启用阶段计时"
+                            )
+                            timings_btn = gr.Button("🔄 刷新耗时", variant="secondary")
+                            timings_reset_btn = gr.Button("🗑️ 清空耗时", variant="secondary")
+                        timings_output = gr.Markdown(value=assistant.get_stage_timings())
+                        
+                        profiling_toggle.change(
+                            assistant.set_profiling,
+                            inputs=profiling_toggle,
+                            outputs=timings_output
+                        )
+                        timings_btn.click(assistant.get_stage_timings, outputs=timings_output)
+                        timings_reset_btn.click(assistant.reset_stage_timings,
+                                                outputs=timings_output)
                     
                     with gr.Column(scale=1):
                         gr.Markdown("### 📝 使用说明")
@@ -323,6 +318,18 @@ def create_interface():
                         - 支持批量上传
                         """)
         
+        # 后台入库任务（定时刷新）
+        with gr.Row():
+            jobs_output = gr.Markdown(value=assistant.get_ingest_jobs())
+        jobs_btn = gr.Button("🔄 刷新任务", variant="secondary", size="sm")
+        jobs_btn.click(assistant.get_ingest_jobs, outputs=jobs_output)
+        if hasattr(gr, "Timer"):
+            gr.Timer(config.INGEST_POLL_SECONDS).tick(assistant.get_ingest_jobs, outputs=jobs_output)
+        else:
+            # 旧版 Gradio 没有 gr.Timer，用 load(every=...) 轮询
+            demo.load(assistant.get_ingest_jobs, outputs=jobs_output,
+                      every=config.INGEST_POLL_SECONDS)
+        
         # 绑定事件 - 论文管理
         paper_search_btn.click(
             assistant.search_papers,